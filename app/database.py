@@ -1,42 +1,296 @@
+import asyncio
 import os
+import time
+from sqlalchemy import event, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import InterfaceError, OperationalError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from dotenv import load_dotenv
 
 load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
 
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable is not set")
+SQLITE_MEMORY_URL = "sqlite+aiosqlite:///:memory:"
 
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+asyncpg://", 1)
-elif DATABASE_URL.startswith("postgresql://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
 
-if "?" in DATABASE_URL and "sslmode=" in DATABASE_URL:
-    parts = DATABASE_URL.split("?")
-    params = [p for p in parts[1].split("&") if not p.startswith("sslmode=")]
-    DATABASE_URL = parts[0] + ("?" + "&".join(params) if params else "")
+def normalize_database_url(url: str) -> str:
+    if url in ("memory://", "sqlite://", "sqlite:///:memory:"):
+        return SQLITE_MEMORY_URL
 
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql+asyncpg://", 1)
+    elif url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    elif url.startswith("sqlite://"):
+        url = url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+    if "?" in url and "sslmode=" in url:
+        parts = url.split("?")
+        params = [p for p in parts[1].split("&") if not p.startswith("sslmode=")]
+        url = parts[0] + ("?" + "&".join(params) if params else "")
+
+    return url
+
+
+def create_engine_for(url: str):
+    if not url.startswith("sqlite"):
+        return create_async_engine(url, echo=False, future=True)
+
+    sqlite_engine = create_async_engine(
+        url, echo=False, future=True, connect_args={"timeout": 30}
+    )
+
+    if url != SQLITE_MEMORY_URL:
+        @event.listens_for(sqlite_engine.sync_engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.close()
+
+    return sqlite_engine
 
-AsyncSessionLocal = async_sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False
-)
 
 Base = declarative_base()
 
+# Dialects with INSERT ... ON CONFLICT, which upsert() and the ingest paths rely on.
+UPSERT_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+def _check_dialect(engine):
+    if engine.dialect.name not in UPSERT_INSERTS:
+        raise ValueError(
+            f"Unsupported database dialect {engine.dialect.name!r}; "
+            f"use one of: {', '.join(UPSERT_INSERTS)}"
+        )
+
+# Engines and session factories are built on first use rather than at
+# import, so importing the app (or a model) never touches the database.
+_engine = None
+_session_factory = None
+_read_session_factory = None
+_replica_router = None
+
+
+def _configure():
+    global _engine, _session_factory, _read_session_factory, _replica_router
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise ValueError(
+            "DATABASE_URL environment variable is not set "
+            "(use sqlite:///dhikr.db or memory:// to run without Postgres)"
+        )
+
+    engine = create_engine_for(normalize_database_url(database_url))
+    _check_dialect(engine)
+
+    # Writes queue up in the session and go out in a single flush on commit.
+    session_factory = async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
+    )
+
+    # Read-only sessions run in autocommit mode, so queries skip the
+    # BEGIN/ROLLBACK round trips. Sessions connect lazily on first execute.
+    primary_read_factory = async_sessionmaker(
+        engine.execution_options(isolation_level="AUTOCOMMIT"),
+        class_=AsyncSession, expire_on_commit=False, autoflush=False
+    )
+
+    read_url = os.getenv("DATABASE_READ_URL")
+    read_engine = create_engine_for(normalize_database_url(read_url)) if read_url else None
+    if read_engine is not None:
+        _check_dialect(read_engine)
+    replica_read_factory = (
+        async_sessionmaker(
+            read_engine.execution_options(isolation_level="AUTOCOMMIT"),
+            class_=AsyncSession, expire_on_commit=False, autoflush=False
+        )
+        if read_engine is not None else None
+    )
+
+    _engine = engine
+    _session_factory = session_factory
+    _read_session_factory = (primary_read_factory, replica_read_factory)
+    _replica_router = ReplicaRouter(
+        read_engine,
+        max_lag=float(os.getenv("DATABASE_READ_MAX_LAG_SECONDS", "5")),
+        check_interval=float(os.getenv("DATABASE_READ_CHECK_INTERVAL", "10"))
+    )
+
+
+def get_engine():
+    if _engine is None:
+        _configure()
+    return _engine
+
+
+def get_sessionmaker():
+    if _session_factory is None:
+        _configure()
+    return _session_factory
+
+
+def get_replica_router():
+    if _replica_router is None:
+        _configure()
+    return _replica_router
+
+
+async def dispose_engines():
+    """Close pooled connections and forget the engines; the next use rebuilds them."""
+    global _engine, _session_factory, _read_session_factory, _replica_router
+
+    if _engine is not None:
+        await _engine.dispose()
+    if _replica_router is not None and _replica_router.read_engine is not None:
+        await _replica_router.read_engine.dispose()
+
+    _engine = None
+    _session_factory = None
+    _read_session_factory = None
+    _replica_router = None
+
+
+_PG_REPLICATION_LAG = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "END"
+)
+
 
-async def get_db():
-    async with AsyncSessionLocal() as session:
+async def _replication_lag(conn) -> float:
+    if conn.dialect.name == "postgresql":
+        result = await conn.execute(_PG_REPLICATION_LAG)
+        return float(result.scalar() or 0)
+
+    await conn.execute(text("SELECT 1"))
+    return 0.0
+
+
+class ReplicaRouter:
+    """Decides whether read-only sessions may use the replica.
+
+    Lag is sampled at most once per ``check_interval`` seconds; a replica
+    that is unreachable or further behind than ``max_lag`` is skipped and
+    reads fall back to the primary until the next successful check.
+    """
+
+    def __init__(self, read_engine, max_lag: float, check_interval: float):
+        self.read_engine = read_engine
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.healthy = read_engine is not None
+        self.last_lag: float | None = None
+        self._checked_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    def _is_stale(self) -> bool:
+        return (
+            self._checked_at is None
+            or time.monotonic() - self._checked_at >= self.check_interval
+        )
+
+    async def use_replica(self) -> bool:
+        if self.read_engine is None:
+            return False
+
+        if self._is_stale():
+            async with self._lock:
+                if self._is_stale():
+                    await self.check()
+
+        return self.healthy
+
+    async def check(self):
+        try:
+            async with self.read_engine.connect() as conn:
+                lag = await _replication_lag(conn)
+            self.last_lag = lag
+            self.healthy = lag <= self.max_lag
+        except Exception as e:
+            print(f"Read replica check failed: {e}")
+            self.last_lag = None
+            self.healthy = False
+        self._checked_at = time.monotonic()
+
+    def mark_failed(self):
+        self.healthy = False
+        self._checked_at = time.monotonic()
+
+
+def dialect_name(db: AsyncSession) -> str:
+    return db.get_bind().dialect.name
+
+
+def upsert(
+    db: AsyncSession,
+    model,
+    values: dict | list[dict],
+    index_elements: list[str],
+    update_columns: list[str] | None = None,
+    increment_columns: list[str] | None = None
+):
+    """Build an INSERT ... ON CONFLICT DO UPDATE for the session's dialect.
+
+    ``update_columns`` defaults to every inserted column outside the
+    conflict target; pass an empty list for ON CONFLICT DO NOTHING.
+    ``increment_columns`` are added to the stored value instead of
+    replacing it (``col = col + excluded.col``).
+    """
+    # _configure() only builds engines for dialects listed here.
+    stmt = UPSERT_INSERTS[dialect_name(db)](model).values(values)
+
+    increment_columns = increment_columns or []
+    if update_columns is None:
+        first = values[0] if isinstance(values, list) else values
+        update_columns = [
+            c for c in first if c not in index_elements and c not in increment_columns
+        ]
+
+    if not update_columns and not increment_columns:
+        return stmt.on_conflict_do_nothing(index_elements=index_elements)
+
+    set_ = {c: stmt.excluded[c] for c in update_columns}
+    for c in increment_columns:
+        set_[c] = getattr(model, c) + stmt.excluded[c]
+
+    return stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+
+
+_ON_REPLICA = "on_replica"
+
+
+def on_replica(db: AsyncSession) -> bool:
+    """Whether ``db`` reads from the replica, which may lag the primary."""
+    return db.info.get(_ON_REPLICA, False)
+
+
+async def get_write_db():
+    async with get_sessionmaker()() as session:
         try:
             yield session
         finally:
             await session.close()
 
 
-async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+async def get_read_db():
+    replica_router = get_replica_router()
+    primary_read_factory, replica_read_factory = _read_session_factory
+    use_replica = await replica_router.use_replica()
+    session_factory = replica_read_factory if use_replica else primary_read_factory
+
+    async with session_factory() as session:
+        session.info[_ON_REPLICA] = use_replica
+        try:
+            yield session
+        except (OperationalError, InterfaceError, OSError):
+            if use_replica:
+                replica_router.mark_failed()
+            raise
+        finally:
+            await session.close()
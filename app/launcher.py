@@ -0,0 +1,274 @@
+"""Production launcher: preload once, then fork uvicorn workers.
+
+    python -m app.launcher
+
+The master process imports the app, applies pending migrations and warms
+the per-process caches (the /rules snapshot, the compiled rule bundle and
+the shared-memory snapshot mapping) once. Then it freezes the garbage
+collector and forks ``WEB_CONCURRENCY`` workers that serve from one
+listening socket. Forked workers share the preloaded heap copy-on-write;
+``gc.freeze()`` moves it out of the collector's generations, so collections
+in the workers don't write to (and so copy) those pages.
+
+Database engines are disposed before forking, and each worker opens its
+own connections on first use.
+
+Signals to the master:
+
+    SIGHUP            rolling reload: re-warm the caches, then replace the
+                      workers one at a time, each only after its
+                      replacement is accepting connections
+    SIGTERM, SIGINT   graceful shutdown; workers finish in-flight requests
+
+Workers that exit unexpectedly are restarted. Code changes need a restart
+of the master, since workers are forked from its already imported modules.
+
+uvloop and httptools are used when installed.
+"""
+import asyncio
+import gc
+import importlib.util
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import time
+import uvicorn
+from app.database import dispose_engines, get_sessionmaker
+from app.migrations import ensure_schema
+from app.services.rule_bundle import rule_bundle
+from app.services.rules_cache import current_rules_version, rules_snapshot
+from app.services.shared_cache import shared_cache
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "5001"))
+BACKLOG = int(os.getenv("LISTEN_BACKLOG", "2048"))
+READY_TIMEOUT = float(os.getenv("WORKER_READY_TIMEOUT", "30"))
+GRACEFUL_TIMEOUT = float(os.getenv("WORKER_GRACEFUL_TIMEOUT", "30"))
+
+
+def worker_count() -> int:
+    return max(int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1), 1)
+
+
+def event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+async def warm_caches():
+    """Load everything workers would otherwise each build on first request."""
+    try:
+        await ensure_schema()
+        async with get_sessionmaker()() as db:
+            version = await current_rules_version(db)
+            await rules_snapshot.get(db, version)
+            await rule_bundle.get(db, version)
+    except RuntimeError:
+        # A schema behind the code with AUTO_MIGRATE off must stop the boot.
+        raise
+    except Exception as e:
+        # Database, upstream or HTTP errors only cost the preload: workers
+        # still build the caches lazily.
+        print(f"Cache preload failed: {e}")
+    finally:
+        # Pooled connections must not be shared across fork.
+        await dispose_engines()
+
+    shared_cache.snapshot()
+
+
+def preload():
+    from app.main import app
+
+    asyncio.run(warm_caches())
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def bind_socket() -> socket.socket:
+    family = socket.AF_INET6 if ":" in HOST else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((HOST, PORT))
+    sock.listen(BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+class WorkerServer(uvicorn.Server):
+    """Reports readiness to the master once the lifespan has started."""
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        try:
+            if self.started:
+                os.write(self.ready_fd, b"1")
+        except BrokenPipeError:
+            pass    # Spawned without anyone waiting for readiness.
+        finally:
+            os.close(self.ready_fd)
+
+
+def _run_worker(app, sock: socket.socket, ready_fd: int):
+    for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+        signal.signal(signum, signal.SIG_DFL)
+    # Forked workers would otherwise share the master's random state (span sampling).
+    random.seed()
+
+    config = uvicorn.Config(
+        app,
+        loop=event_loop(),
+        http=http_protocol(),
+        lifespan="on",
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT
+    )
+    WorkerServer(config, ready_fd).run(sockets=[sock])
+
+
+class Master:
+    def __init__(self, app, sock: socket.socket, workers: int):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.pids: set[int] = set()
+        self.stopping = False
+        self.reload_requested = False
+
+    def spawn(self, wait_ready: bool = False) -> int | None:
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            code = 0
+            try:
+                _run_worker(self.app, self.sock, ready_write)
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed: {e}", file=sys.stderr)
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+
+        os.close(ready_write)
+        self.pids.add(pid)
+        try:
+            if wait_ready:
+                readable, _, _ = select.select([ready_read], [], [], READY_TIMEOUT)
+                if not readable or os.read(ready_read, 1) != b"1":
+                    print(f"Worker {pid} did not become ready", file=sys.stderr)
+                    return None
+        finally:
+            os.close(ready_read)
+        return pid
+
+    def reap(self) -> list[int]:
+        exited = []
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            self.pids.discard(pid)
+            exited.append(pid)
+        return exited
+
+    def stop_worker(self, pid: int):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            self.pids.discard(pid)
+            return
+
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT + 5
+        while pid in self.pids and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        if pid in self.pids:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self.pids.discard(pid)
+
+    def rolling_reload(self):
+        print("Reloading workers")
+        gc.unfreeze()
+        asyncio.run(warm_caches())
+        gc.collect()
+        gc.freeze()
+
+        for old in list(self.pids):
+            if self.stopping:
+                return
+            if self.spawn(wait_ready=True) is None:
+                # Keep the old worker rather than shrink the pool.
+                continue
+            self.stop_worker(old)
+
+    def shutdown(self):
+        self.stopping = True
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT + 5
+        while self.pids and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        for pid in self.pids:
+            os.kill(pid, signal.SIGKILL)
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_reload(self, signum, frame):
+        self.reload_requested = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+
+        for _ in range(self.workers):
+            self.spawn()
+        print(
+            f"Serving on http://{HOST}:{PORT} with {self.workers} workers "
+            f"({event_loop()}, {http_protocol()})"
+        )
+
+        while not self.stopping:
+            for pid in self.reap():
+                if not self.stopping:
+                    print(f"Worker {pid} exited; starting a replacement", file=sys.stderr)
+            while not self.stopping and len(self.pids) < self.workers:
+                self.spawn()
+            if self.reload_requested:
+                self.reload_requested = False
+                self.rolling_reload()
+            time.sleep(0.2)
+
+        self.shutdown()
+
+
+def main():
+    app = preload()
+    sock = bind_socket()
+    Master(app, sock, worker_count()).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,37 @@
 import os
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
-from app.database import init_db
-from app.routers import reminder, rules, analytics, logging, privacy
+from app.database import dispose_engines
+from app.migrations import ensure_schema
+from app.routers import reminder, rules, analytics, logging, privacy, audio
+from app.services.audio_cache import audio_cache
+from app.services.change_listener import change_listener
+from app.services.circuit_breaker import circuit_states
+from app.services.quran_service import wait_for_refreshes
+from app.services.shared_cache import shared_cache
+from app.utils import metrics
+from app.utils.compression import CompressResponseMiddleware, DecompressRequestMiddleware
+from app.utils.load_shedding import LoadSheddingMiddleware
+from app.utils.metrics import MetricsMiddleware
+from app.utils.responses import FastJSONResponse, StaticJSON
 
 load_dotenv()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init_db()
+    await ensure_schema()
+    shared_cache.start()
+    change_listener.start()
     yield
+    await change_listener.stop()
+    await shared_cache.stop()
+    await audio_cache.close()
+    await wait_for_refreshes()
+    await dispose_engines()
 
 
 app = FastAPI(
@@ -23,6 +41,10 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Middleware added first runs innermost. Shed responses still carry CORS
+# headers and are measured; bodies are only decoded for admitted requests.
+app.add_middleware(DecompressRequestMiddleware)
+app.add_middleware(LoadSheddingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origin_regex=r"(http://localhost(:\d+)?|https://.*\.replit\.(dev|app)|chrome-extension://.*|moz-extension://.*)",
@@ -31,37 +53,66 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"]
 )
+app.add_middleware(CompressResponseMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(reminder.router)
 app.include_router(rules.router)
 app.include_router(analytics.router)
 app.include_router(logging.router)
 app.include_router(privacy.router)
+app.include_router(audio.router)
+
+
+ROOT = StaticJSON({
+    "status": "success",
+    "message": "Dhikr Extension API is running",
+    "data": {
+        "version": "1.0.0",
+        "endpoints": [
+            "/reminder - Get Quran reminder for a domain/path",
+            "/reminder/batch - Get reminders for several pages at once",
+            "/rules - Get all reminder rules",
+            "/analytics/log - Log anonymized browsing event",
+            "/analytics/aggregates - Log pre-aggregated visit counts and durations",
+            "/analytics/summary - Get analytics summary",
+            "/analytics/triggers - Trigger counts and trigger-to-browsing ratios",
+            "/log-trigger - Log reminder trigger event",
+            "/privacy - View privacy policy",
+            "/audio/{sha256}.mp3 - Cached recitation audio",
+            "/health/upstreams - Circuit breaker state per upstream API",
+            "/metrics - Prometheus metrics"
+        ]
+    }
+})
+
+HEALTH = StaticJSON({
+    "status": "success",
+    "message": "API is healthy",
+    "data": {"healthy": True}
+})
 
 
 @app.get("/")
 async def root():
-    return {
-        "status": "success",
-        "message": "Dhikr Extension API is running",
-        "data": {
-            "version": "1.0.0",
-            "endpoints": [
-                "/reminder - Get Quran reminder for a domain/path",
-                "/rules - Get all reminder rules",
-                "/analytics/log - Log anonymized browsing event",
-                "/analytics/summary - Get analytics summary",
-                "/log-trigger - Log reminder trigger event",
-                "/privacy - View privacy policy"
-            ]
-        }
-    }
+    return ROOT.response()
 
 
 @app.get("/health")
 async def health_check():
-    return {
+    return HEALTH.response()
+
+
+@app.get("/health/upstreams")
+async def upstream_health():
+    # Breakers are per worker process, so this reports the worker that answered.
+    return FastJSONResponse({
         "status": "success",
-        "message": "API is healthy",
-        "data": {"healthy": True}
-    }
+        "message": "Upstream circuit states",
+        "data": circuit_states()
+    }, headers={"Cache-Control": "no-store"})
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,603 @@
+"""Versioned schema migrations.
+
+Each migration is a synchronous function taking a SQLAlchemy ``Connection``
+and runs in its own transaction together with the ``schema_version`` row
+that records it. Worker boot only runs ``ensure_schema``, which costs a
+single ``SELECT max(version)`` when the schema is already current.
+
+Migrations describe the schema as it was at their version, so they never
+read column lists from ``app.models``: the initial tables and every table
+added later are frozen below as they were created, and later migrations
+alter them explicitly.
+
+Apply pending migrations explicitly with::
+
+    python -m app.migrations
+"""
+import asyncio
+import os
+from sqlalchemy import (
+    JSON, Column, Date, DateTime, ForeignKey, Index, Integer, LargeBinary, MetaData,
+    String, Table, Text, UniqueConstraint, bindparam, cast, column, func, inspect, literal,
+    select, table, text, union_all, update
+)
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from app.database import dispose_engines, get_engine
+
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+
+# Arbitrary key for pg_advisory_xact_lock so concurrent boots migrate serially.
+_MIGRATION_LOCK_KEY = 0x64686B72
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now())
+)
+
+
+_v1 = MetaData()
+
+Table(
+    "reminder_rules", _v1,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("domain_pattern", String(255), nullable=False, index=True),
+    Column("path_pattern", String(255), nullable=True),
+    Column("category_key", String(50), nullable=False, index=True),
+    Column("reference", String(50), nullable=False)
+)
+
+Table(
+    "reminder_cache", _v1,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("reference", String(50), nullable=False, unique=True, index=True),
+    Column("verse_text", Text, nullable=False),
+    Column("translation", Text, nullable=True),
+    Column("audio_url", String(500), nullable=True),
+    Column("lang", String(10), nullable=False),
+    Column("last_fetched", DateTime(timezone=True), server_default=func.now())
+)
+
+Table(
+    "analytics_events", _v1,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("url_id", String(64), nullable=False, index=True),
+    Column("domain", String(255), nullable=False, index=True),
+    Column("category_key", String(50), nullable=True, index=True),
+    Column("duration_seconds", Integer, nullable=False),
+    Column("region", String(100), nullable=True),
+    Column("day", String(10), nullable=False, index=True),
+    Column("timestamp", DateTime(timezone=True), server_default=func.now())
+)
+
+Table(
+    "requests_log", _v1,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("timestamp", DateTime(timezone=True), server_default=func.now(), index=True),
+    Column("domain", String(255), nullable=False, index=True),
+    Column("path", String(500), nullable=True),
+    Column("category_key", String(50), nullable=True),
+    Column("duration_seconds", Integer, nullable=True)
+)
+
+
+_v2 = MetaData()
+
+Table(
+    "rule_tombstones", _v2,
+    Column("id", Integer, primary_key=True),
+    Column("rule_id", Integer, nullable=False),
+    Column("version", Integer, nullable=False, index=True),
+    Column("deleted_at", DateTime(timezone=True), server_default=func.now())
+)
+
+Table(
+    "rules_state", _v2,
+    Column("id", Integer, primary_key=True),
+    Column("version", Integer, nullable=False)
+)
+
+
+def _has_column(conn, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def _initial_schema(conn):
+    # checkfirst adopts databases created by the old create_all() boot path.
+    _v1.create_all(conn, checkfirst=True)
+
+
+def _rule_versions(conn):
+    if not _has_column(conn, "reminder_rules", "version"):
+        conn.execute(text(
+            "ALTER TABLE reminder_rules ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+        ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_reminder_rules_version ON reminder_rules (version)"
+    ))
+
+    _v2.create_all(conn, checkfirst=True)
+    rules_state = _v2.tables["rules_state"]
+    if conn.execute(select(rules_state.c.id)).first() is None:
+        conn.execute(rules_state.insert().values(id=1, version=0))
+
+
+def _ayah_translations(conn):
+    # One row per ayah holding every configured translation, replacing the
+    # per-language ``translation``/``lang`` columns. Quran.com and
+    # AlQuran.cloud were always queried for English editions, so existing
+    # text is kept as the English translation; other languages fill in on
+    # the next fetch of each ayah.
+    if not _has_column(conn, "reminder_cache", "translations"):
+        json_type = JSON().compile(dialect=conn.dialect)
+        conn.execute(text(
+            f"ALTER TABLE reminder_cache ADD COLUMN translations {json_type} NOT NULL DEFAULT '{{}}'"
+        ))
+
+    if _has_column(conn, "reminder_cache", "translation"):
+        rows = conn.execute(text(
+            "SELECT id, translation FROM reminder_cache "
+            "WHERE translation IS NOT NULL AND translation <> ''"
+        )).all()
+        if rows:
+            cache = table("reminder_cache", column("id"), column("translations", JSON))
+            conn.execute(
+                update(cache)
+                .where(cache.c.id == bindparam("row_id"))
+                .values(translations=bindparam("backfill")),
+                [{"row_id": row.id, "backfill": {"en": row.translation}} for row in rows]
+            )
+        conn.execute(text("ALTER TABLE reminder_cache DROP COLUMN translation"))
+
+    if _has_column(conn, "reminder_cache", "lang"):
+        conn.execute(text("ALTER TABLE reminder_cache DROP COLUMN lang"))
+
+
+# Channel the change listener (app.services.change_listener) LISTENs on.
+CHANGE_CHANNEL = "dhikr_cache_changes"
+
+_NOTIFY_FUNCTIONS = [
+    f"""
+CREATE OR REPLACE FUNCTION dhikr_notify_table() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{CHANGE_CHANNEL}', json_build_object(
+        'table', TG_TABLE_NAME, 'op', TG_OP
+    )::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+""",
+    f"""
+CREATE OR REPLACE FUNCTION dhikr_notify_rules_state() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{CHANGE_CHANNEL}', json_build_object(
+        'table', TG_TABLE_NAME, 'op', TG_OP, 'version', NEW.version
+    )::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+""",
+    f"""
+CREATE OR REPLACE FUNCTION dhikr_notify_reminder_cache() RETURNS trigger AS $$
+DECLARE
+    ref text;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        ref := OLD.reference;
+    ELSE
+        ref := NEW.reference;
+    END IF;
+    PERFORM pg_notify('{CHANGE_CHANNEL}', json_build_object(
+        'table', TG_TABLE_NAME, 'op', TG_OP, 'reference', ref
+    )::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+""",
+]
+
+_NOTIFY_TRIGGERS = [
+    # Rule writes touch thousands of rows per statement during an import,
+    # so rules notify once per statement (identical payloads in one
+    # transaction are folded by Postgres) and rules_state carries the version.
+    ("reminder_rules_notify", "reminder_rules",
+     "AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE", "FOR EACH STATEMENT", "dhikr_notify_table"),
+    ("rules_state_notify", "rules_state",
+     "AFTER INSERT OR UPDATE", "FOR EACH ROW", "dhikr_notify_rules_state"),
+    ("reminder_cache_notify", "reminder_cache",
+     "AFTER INSERT OR UPDATE OR DELETE", "FOR EACH ROW", "dhikr_notify_reminder_cache"),
+    ("reminder_cache_truncate_notify", "reminder_cache",
+     "AFTER TRUNCATE", "FOR EACH STATEMENT", "dhikr_notify_table"),
+]
+
+
+def _change_notifications(conn):
+    # LISTEN/NOTIFY is Postgres-only; SQLite deployments are single-process
+    # or share a snapshot, so they keep relying on version checks and polling.
+    if conn.dialect.name != "postgresql":
+        return
+
+    for function in _NOTIFY_FUNCTIONS:
+        conn.exec_driver_sql(function)
+    for name, table_name, events, level, function in _NOTIFY_TRIGGERS:
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name} ON {table_name}")
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {name} {events} ON {table_name} {level} EXECUTE FUNCTION {function}()"
+        )
+
+
+def _analytics_event_ids(conn):
+    if not _has_column(conn, "analytics_events", "event_id"):
+        conn.execute(text("ALTER TABLE analytics_events ADD COLUMN event_id VARCHAR(64)"))
+    # NULLs never conflict, so events logged without an id are unaffected.
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS analytics_events_event_id_key "
+        "ON analytics_events (event_id)"
+    ))
+
+
+_v6 = MetaData()
+
+Table(
+    "analytics_daily", _v6,
+    Column("id", Integer, primary_key=True),
+    Column("day", String(10), nullable=False, index=True),
+    Column("domain", String(255), nullable=False),
+    Column("url_id", String(64), nullable=False),
+    Column("region", String(100), nullable=False),
+    Column("category_key", String(50), nullable=True, index=True),
+    Column("event_count", Integer, nullable=False),
+    Column("duration_seconds", Integer, nullable=False),
+    UniqueConstraint("day", "domain", "url_id", "region")
+)
+
+Table(
+    "analytics_batches", _v6,
+    Column("batch_id", String(64), primary_key=True),
+    Column("received_at", DateTime(timezone=True), server_default=func.now(), index=True)
+)
+
+
+def _analytics_daily(conn):
+    _v6.create_all(conn, checkfirst=True)
+
+
+def _utc_hour(conn, timestamp):
+    """``YYYY-MM-DDTHH`` of a timestamptz column in UTC, whatever the session TimeZone."""
+    if conn.dialect.name == "postgresql":
+        utc = cast(timestamp, DateTime(timezone=True)).op("AT TIME ZONE")(literal("UTC"))
+        return func.to_char(utc, literal('YYYY-MM-DD"T"HH24'))
+    # SQLite applies any UTC offset stored with the value before formatting.
+    return func.strftime("%Y-%m-%dT%H", timestamp)
+
+
+def _decoded_events():
+    encoded = table(
+        "analytics_events", column("timestamp"), column("domain_id"),
+        column("category_id"), column("duration_seconds")
+    )
+    domains = table("analytics_domains", column("id"), column("name"))
+    categories = table("analytics_categories", column("id"), column("name"))
+    return select(
+        encoded.c.timestamp,
+        domains.c.name.label("domain"),
+        categories.c.name.label("category_key"),
+        encoded.c.duration_seconds
+    ).join(
+        domains, domains.c.id == encoded.c.domain_id
+    ).outerjoin(
+        categories, categories.c.id == encoded.c.category_id
+    ).subquery()
+
+
+_v7 = MetaData()
+
+Table(
+    "activity_hourly", _v7,
+    Column("id", Integer, primary_key=True),
+    Column("hour", String(13), nullable=False),
+    Column("domain", String(255), nullable=False),
+    Column("category_key", String(50), nullable=False),
+    Column("trigger_count", Integer, nullable=False),
+    Column("trigger_seconds", Integer, nullable=False),
+    Column("visit_count", Integer, nullable=False),
+    Column("visit_seconds", Integer, nullable=False),
+    UniqueConstraint("hour", "domain", "category_key")
+)
+
+
+def _activity_hourly(conn):
+    activity_hourly = _v7.tables["activity_hourly"]
+    activity_hourly.create(conn, checkfirst=True)
+
+    # Backfill from the raw tables in one INSERT ... SELECT; ingest keeps
+    # the rollup current after this.
+    requests_log = table(
+        "requests_log", column("timestamp"), column("domain"),
+        column("category_key"), column("duration_seconds")
+    )
+    events = table(
+        "analytics_events", column("timestamp"), column("domain"),
+        column("category_key"), column("duration_seconds")
+    )
+    if not _has_column(conn, "analytics_events", "domain"):
+        # Adopted create_all() schema, already dictionary-encoded (version 8).
+        events = _decoded_events()
+    daily = table(
+        "analytics_daily", column("day"), column("domain"),
+        column("category_key"), column("event_count"), column("duration_seconds")
+    )
+    zero = literal(0)
+
+    def _source(hour, source, count, seconds, trigger):
+        counts = (count, seconds, zero, zero) if trigger else (zero, zero, count, seconds)
+        return select(
+            hour.label("hour"),
+            source.c.domain.label("domain"),
+            func.coalesce(source.c.category_key, "").label("category_key"),
+            *(value.label(name) for value, name in zip(counts, (
+                "trigger_count", "trigger_seconds", "visit_count", "visit_seconds"
+            )))
+        ).where(hour.is_not(None))
+
+    combined = union_all(
+        _source(_utc_hour(conn, requests_log.c.timestamp), requests_log, literal(1),
+                func.coalesce(requests_log.c.duration_seconds, 0), trigger=True),
+        _source(_utc_hour(conn, events.c.timestamp), events, literal(1),
+                func.coalesce(events.c.duration_seconds, 0), trigger=False),
+        _source(daily.c.day.concat("T00"), daily, daily.c.event_count,
+                daily.c.duration_seconds, trigger=False),
+    ).subquery()
+
+    key = [combined.c.hour, combined.c.domain, combined.c.category_key]
+    counts = ["trigger_count", "trigger_seconds", "visit_count", "visit_seconds"]
+    conn.execute(activity_hourly.insert().from_select(
+        ["hour", "domain", "category_key", *counts],
+        select(*key, *(func.sum(combined.c[name]) for name in counts)).group_by(*key)
+    ))
+
+
+_v8 = MetaData()
+
+Table(
+    "analytics_domains", _v8,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(255), nullable=False, unique=True)
+)
+
+Table(
+    "analytics_regions", _v8,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(100), nullable=False, unique=True)
+)
+
+Table(
+    "analytics_categories", _v8,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(50), nullable=False, unique=True)
+)
+
+_v8_events = Table(
+    "analytics_events", _v8,
+    Column("id", Integer, primary_key=True),
+    Column("url_id", LargeBinary(32), nullable=False),
+    Column("domain_id", Integer, ForeignKey("analytics_domains.id"), nullable=False, index=True),
+    Column("category_id", Integer, ForeignKey("analytics_categories.id"), nullable=True),
+    Column("region_id", Integer, ForeignKey("analytics_regions.id"), nullable=True),
+    Column("duration_seconds", Integer, nullable=False),
+    Column("day", Date, nullable=False, index=True),
+    Column("timestamp", DateTime(timezone=True), server_default=func.now()),
+    Column("event_id", String(64), nullable=True),
+    Index("analytics_events_event_id_key", "event_id", unique=True)
+)
+
+# (dictionary table, text column it replaces in analytics_events)
+_DICTIONARIES = [
+    ("analytics_domains", "domain"),
+    ("analytics_regions", "region"),
+    ("analytics_categories", "category_key"),
+]
+
+
+def _dictionary_encoded_analytics(conn):
+    # Rebuilds analytics_events with ids into dictionary tables, a DATE day
+    # and the raw 32-byte url_id, and copies existing rows across.
+    dictionaries = [_v8.tables[name] for name, _ in _DICTIONARIES]
+    for dictionary in dictionaries:
+        dictionary.create(conn, checkfirst=True)
+    if _has_column(conn, "analytics_events", "domain_id"):
+        return
+
+    postgres = conn.dialect.name == "postgresql"
+    # Index, primary key and sequence names are per schema, not per table,
+    # and the rebuilt table needs the same ones.
+    for index in inspect(conn).get_indexes("analytics_events"):
+        conn.execute(text(f"DROP INDEX {index['name']}"))
+    conn.execute(text("ALTER TABLE analytics_events RENAME TO analytics_events_legacy"))
+    if postgres:
+        conn.execute(text(
+            "ALTER TABLE analytics_events_legacy "
+            "RENAME CONSTRAINT analytics_events_pkey TO analytics_events_legacy_pkey"
+        ))
+        conn.execute(text(
+            "ALTER SEQUENCE IF EXISTS analytics_events_id_seq "
+            "RENAME TO analytics_events_legacy_id_seq"
+        ))
+    _v8_events.create(conn)
+
+    legacy = table(
+        "analytics_events_legacy", column("id"), column("url_id"), column("domain"),
+        column("category_key"), column("duration_seconds"), column("region"), column("day"),
+        column("timestamp"), column("event_id")
+    )
+    for dictionary, (_, source) in zip(dictionaries, _DICTIONARIES):
+        conn.execute(dictionary.insert().from_select(
+            ["name"],
+            select(legacy.c[source]).where(legacy.c[source].is_not(None)).distinct()
+        ))
+
+    domains, regions, categories = dictionaries
+    conn.execute(_v8_events.insert().from_select(
+        ["id", "url_id", "domain_id", "category_id", "region_id", "duration_seconds",
+         "day", "timestamp", "event_id"],
+        select(
+            legacy.c.id,
+            func.decode(legacy.c.url_id, literal("hex")) if postgres else legacy.c.url_id,
+            domains.c.id,
+            categories.c.id,
+            regions.c.id,
+            legacy.c.duration_seconds,
+            cast(legacy.c.day, Date) if postgres else legacy.c.day,
+            legacy.c.timestamp,
+            legacy.c.event_id
+        )
+        .join(domains, domains.c.name == legacy.c.domain)
+        .outerjoin(categories, categories.c.name == legacy.c.category_key)
+        .outerjoin(regions, regions.c.name == legacy.c.region)
+    ))
+    conn.execute(text("DROP TABLE analytics_events_legacy"))
+
+    if postgres:
+        conn.execute(text(
+            "SELECT setval(pg_get_serial_sequence('analytics_events', 'id'), "
+            "COALESCE(MAX(id), 0) + 1, false) FROM analytics_events"
+        ))
+        return
+
+    # SQLite has no hex decoding before 3.41: convert the copied ids here.
+    events = table("analytics_events", column("id"), column("url_id", LargeBinary))
+    hex_ids = table("analytics_events", column("id"), column("url_id", String))
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(hex_ids.c.id, hex_ids.c.url_id)
+            .where(hex_ids.c.id > last_id, func.typeof(hex_ids.c.url_id) == "text")
+            .order_by(hex_ids.c.id)
+            .limit(1000)
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            update(events).where(events.c.id == bindparam("row_id"))
+            .values(url_id=bindparam("raw")),
+            [{"row_id": row.id, "raw": bytes.fromhex(row.url_id)} for row in rows]
+        )
+        last_id = rows[-1].id
+
+
+def _unique_rule_keys(conn):
+    # Bulk imports used to COPY rules without checking for a concurrent
+    # writer, so keys may repeat. The oldest rule for a key is the one
+    # imports updated; later copies are deleted and tombstoned for delta
+    # clients before the key becomes unique.
+    duplicates = [row.id for row in conn.execute(text(
+        "SELECT r.id FROM reminder_rules r WHERE EXISTS ("
+        "SELECT 1 FROM reminder_rules o "
+        "WHERE o.domain_pattern = r.domain_pattern "
+        "AND COALESCE(o.path_pattern, '') = COALESCE(r.path_pattern, '') "
+        "AND o.id < r.id)"
+    ))]
+    if duplicates:
+        version = conn.execute(text(
+            "UPDATE rules_state SET version = version + 1 WHERE id = 1 RETURNING version"
+        )).scalar_one()
+        conn.execute(
+            text("INSERT INTO rule_tombstones (rule_id, version) VALUES (:rule_id, :version)"),
+            [{"rule_id": rule_id, "version": version} for rule_id in duplicates]
+        )
+        conn.execute(
+            text("DELETE FROM reminder_rules WHERE id IN :ids").bindparams(
+                bindparam("ids", expanding=True)
+            ),
+            {"ids": duplicates}
+        )
+
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS reminder_rules_domain_path_key "
+        "ON reminder_rules (domain_pattern, (COALESCE(path_pattern, '')))"
+    ))
+
+
+MIGRATIONS = [
+    (1, "Initial schema", _initial_schema),
+    (2, "Rule versions and tombstones", _rule_versions),
+    (3, "Per-ayah translations", _ayah_translations),
+    (4, "Change notifications for cache invalidation", _change_notifications),
+    (5, "Analytics event ids", _analytics_event_ids),
+    (6, "Pre-aggregated analytics", _analytics_daily),
+    (7, "Hourly trigger and browsing rollup", _activity_hourly),
+    (8, "Dictionary-encoded analytics events", _dictionary_encoded_analytics),
+    (9, "Unique rule keys", _unique_rule_keys),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+async def current_version(engine=None) -> int:
+    engine = engine or get_engine()
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(select(func.max(schema_version.c.version)))
+            return result.scalar() or 0
+    except (OperationalError, ProgrammingError):
+        return 0
+
+
+async def migrate(engine=None) -> list[int]:
+    """Apply pending migrations in order and return the versions applied."""
+    engine = engine or get_engine()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda c: schema_version.create(c, checkfirst=True))
+
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        async with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                await conn.execute(
+                    text("SELECT pg_advisory_xact_lock(:key)"),
+                    {"key": _MIGRATION_LOCK_KEY}
+                )
+
+            result = await conn.execute(
+                select(schema_version.c.version).where(schema_version.c.version == version)
+            )
+            if result.first():
+                continue
+
+            await conn.run_sync(upgrade)
+            await conn.execute(
+                schema_version.insert().values(version=version, description=description)
+            )
+            applied.append(version)
+
+    return applied
+
+
+async def ensure_schema(engine=None, auto_migrate: bool = AUTO_MIGRATE):
+    version = await current_version(engine)
+    if version >= LATEST_VERSION:
+        return
+
+    if not auto_migrate:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {LATEST_VERSION}. "
+            "Run `python -m app.migrations` before starting the API."
+        )
+
+    await migrate(engine)
+
+
+async def _main():
+    applied = await migrate()
+    await dispose_engines()
+    if applied:
+        print(f"✓ Applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        print(f"✓ Schema already at version {LATEST_VERSION}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -1,5 +1,8 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float
-from sqlalchemy.sql import func
+from sqlalchemy import (
+    Column, Integer, String, Text, Date, DateTime, Float, ForeignKey, Index, JSON,
+    LargeBinary, UniqueConstraint
+)
+from sqlalchemy.sql import func, literal_column
 from app.database import Base
 
 
@@ -11,6 +14,29 @@ class ReminderRule(Base):
     path_pattern = Column(String(255), nullable=True)
     category_key = Column(String(50), nullable=False, index=True)
     reference = Column(String(50), nullable=False)
+    version = Column(Integer, nullable=False, default=0, server_default="0", index=True)
+
+
+# Rules are keyed by domain and path. A domain-wide rule has no path, and
+# NULLs never conflict, so the key indexes the path as ''.
+RULE_KEY = [ReminderRule.domain_pattern, func.coalesce(ReminderRule.path_pattern, literal_column("''"))]
+Index("reminder_rules_domain_path_key", *RULE_KEY, unique=True)
+
+
+class RuleTombstone(Base):
+    __tablename__ = "rule_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    rule_id = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, index=True)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class RulesState(Base):
+    __tablename__ = "rules_state"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
 
 
 class ReminderCache(Base):
@@ -19,23 +45,81 @@ class ReminderCache(Base):
     id = Column(Integer, primary_key=True, index=True)
     reference = Column(String(50), nullable=False, unique=True, index=True)
     verse_text = Column(Text, nullable=False)
-    translation = Column(Text, nullable=True)
+    translations = Column(JSON, nullable=False, default=dict, server_default="{}")
     audio_url = Column(String(500), nullable=True)
-    lang = Column(String(10), nullable=False, default="en")
     last_fetched = Column(DateTime(timezone=True), server_default=func.now())
 
 
+class AnalyticsDomain(Base):
+    """Dictionary of domains referenced by ``AnalyticsEvent.domain_id``."""
+    __tablename__ = "analytics_domains"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), nullable=False, unique=True)
+
+
+class AnalyticsRegion(Base):
+    """Dictionary of regions referenced by ``AnalyticsEvent.region_id``."""
+    __tablename__ = "analytics_regions"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False, unique=True)
+
+
+class AnalyticsCategory(Base):
+    """Dictionary of category keys referenced by ``AnalyticsEvent.category_id``."""
+    __tablename__ = "analytics_categories"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), nullable=False, unique=True)
+
+
 class AnalyticsEvent(Base):
+    """One logged visit, with repeated text dictionary-encoded.
+
+    Domains, regions and categories are ids into their dictionary tables
+    (see ``app.services.interning``), ``url_id`` is the raw 32-byte HMAC
+    and ``day`` a ``DATE``.
+    """
     __tablename__ = "analytics_events"
 
-    id = Column(Integer, primary_key=True, index=True)
-    url_id = Column(String(64), nullable=False, index=True)
-    domain = Column(String(255), nullable=False, index=True)
-    category_key = Column(String(50), nullable=True, index=True)
+    id = Column(Integer, primary_key=True)
+    url_id = Column(LargeBinary(32), nullable=False)
+    domain_id = Column(Integer, ForeignKey("analytics_domains.id"), nullable=False, index=True)
+    category_id = Column(Integer, ForeignKey("analytics_categories.id"), nullable=True)
+    region_id = Column(Integer, ForeignKey("analytics_regions.id"), nullable=True)
     duration_seconds = Column(Integer, nullable=False)
-    region = Column(String(100), nullable=True)
-    day = Column(String(10), nullable=False, index=True)
+    day = Column(Date, nullable=False, index=True)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    # Client-supplied id that makes retried uploads idempotent.
+    event_id = Column(String(64), nullable=True, unique=True)
+
+
+class AnalyticsDaily(Base):
+    """Visits merged per day, URL and region from pre-aggregated uploads.
+
+    One row stands for ``event_count`` ``AnalyticsEvent`` rows with the same
+    day, domain, url_id and region, and their summed duration.
+    """
+    __tablename__ = "analytics_daily"
+    __table_args__ = (UniqueConstraint("day", "domain", "url_id", "region"),)
+
+    id = Column(Integer, primary_key=True)
+    day = Column(String(10), nullable=False, index=True)
+    domain = Column(String(255), nullable=False)
+    url_id = Column(String(64), nullable=False)
+    region = Column(String(100), nullable=False)
+    category_key = Column(String(50), nullable=True, index=True)
+    event_count = Column(Integer, nullable=False)
+    duration_seconds = Column(Integer, nullable=False)
+
+
+class AnalyticsBatch(Base):
+    """Ids of applied aggregate uploads, so a retried upload is not added twice."""
+    __tablename__ = "analytics_batches"
+
+    batch_id = Column(String(64), primary_key=True)
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
 
 class RequestLog(Base):
@@ -47,3 +131,25 @@ class RequestLog(Base):
     path = Column(String(500), nullable=True)
     category_key = Column(String(50), nullable=True)
     duration_seconds = Column(Integer, nullable=True)
+
+
+class ActivityHourly(Base):
+    """Reminder triggers and browsing per UTC hour, domain and category.
+
+    Maintained at ingest by ``/log-trigger``, ``/analytics/log`` and
+    ``/analytics/aggregates``, so ``/analytics/triggers`` can report counts
+    and trigger-to-browsing ratios without reading the raw tables.
+    ``category_key`` is ``""`` for unclassified sites, since NULLs would
+    never conflict on the unique key.
+    """
+    __tablename__ = "activity_hourly"
+    __table_args__ = (UniqueConstraint("hour", "domain", "category_key"),)
+
+    id = Column(Integer, primary_key=True)
+    hour = Column(String(13), nullable=False)   # "YYYY-MM-DDTHH", UTC
+    domain = Column(String(255), nullable=False)
+    category_key = Column(String(50), nullable=False)
+    trigger_count = Column(Integer, nullable=False, default=0)
+    trigger_seconds = Column(Integer, nullable=False, default=0)
+    visit_count = Column(Integer, nullable=False, default=0)
+    visit_seconds = Column(Integer, nullable=False, default=0)
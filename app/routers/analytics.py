@@ -1,16 +1,27 @@
-from fastapi import APIRouter, Depends, Request, HTTPException
-from pydantic import BaseModel
+import asyncio
+from fastapi import APIRouter, Depends, Query, Request, HTTPException
+from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_
-from datetime import datetime, timedelta
-from app.database import get_db
-from app.models import AnalyticsEvent, ReminderRule
+from sqlalchemy import select, func, union_all
+from datetime import date, datetime, timedelta, timezone
+from app.database import get_write_db, get_read_db, upsert
+from app.models import (
+    ActivityHourly, AnalyticsBatch, AnalyticsCategory, AnalyticsDaily, AnalyticsEvent,
+    AnalyticsRegion
+)
+from app.services import activity_rollup, interning
+from app.services.analytics_archive import analytics_archive
+from app.services.event_dedup import seen_events
 from app.services.pii_utils import redact_url, redact_title
 from app.services.geo_utils import get_location_from_ip
+from app.services.rule_matcher import match_rule, match_rules
 from app.utils.hashing import hash_url
+from app.utils.metrics import span
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
+MAX_AGGREGATES = 1000
+
 
 class AnalyticsLogRequest(BaseModel):
     url: str
@@ -18,18 +29,67 @@ class AnalyticsLogRequest(BaseModel):
     domain: str
     path: str | None = None
     duration_seconds: int
+    event_id: str | None = Field(
+        None, min_length=1, max_length=64,
+        description="Client-generated id (e.g. a UUID); retries with the same id are logged once"
+    )
+
+
+class AnalyticsAggregate(BaseModel):
+    day: date
+    url: str
+    domain: str
+    path: str | None = None
+    count: int = Field(..., ge=1)
+    total_seconds: int = Field(..., ge=0)
+
+
+class AnalyticsAggregateRequest(BaseModel):
+    aggregates: list[AnalyticsAggregate] = Field(..., min_length=1, max_length=MAX_AGGREGATES)
+    batch_id: str | None = Field(
+        None, min_length=1, max_length=64,
+        description="Client-generated id of this upload; a retried upload is only counted once"
+    )
+
+
+def _log_response(url_id: str, category_key: str | None, region: str | None, duplicate: bool) -> dict:
+    return {
+        "status": "success",
+        "message": "Analytics event already logged" if duplicate else "Analytics logged successfully",
+        "data": {
+            "url_id": url_id,
+            "category": category_key,
+            "region": region,
+            "duplicate": duplicate
+        }
+    }
 
 
 @router.post("/log")
 async def log_analytics(
     data: AnalyticsLogRequest,
     request: Request,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
-    redacted_url = redact_url(data.url)
-    redacted_title = redact_title(data.title) if data.title else None
+    if data.event_id is not None and data.event_id in seen_events:
+        # Probably a retry; the filter can be wrong, so confirm before skipping.
+        result = await db.execute(
+            select(AnalyticsEvent.url_id, AnalyticsCategory.name, AnalyticsRegion.name)
+            .outerjoin(AnalyticsCategory, AnalyticsEvent.category_id == AnalyticsCategory.id)
+            .outerjoin(AnalyticsRegion, AnalyticsEvent.region_id == AnalyticsRegion.id)
+            .where(AnalyticsEvent.event_id == data.event_id)
+        )
+        existing = result.first()
+        if existing is not None:
+            url_id, category_key, region = existing
+            return _log_response(url_id.hex(), category_key, region, True)
+    
+    with span("pii_redaction"):
+        redacted_url = redact_url(data.url)
+        redacted_title = redact_title(data.title) if data.title else None
     
-    url_id = hash_url(redacted_url)
+    with span("url_hash"):
+        url_id = hash_url(redacted_url)
     
     client_ip = request.client.host if request.client else "127.0.0.1"
     location = await get_location_from_ip(client_ip)
@@ -37,27 +97,124 @@ async def log_analytics(
     
     category_key = await _classify_site(data.domain, data.path, db)
     
-    today = datetime.now().strftime("%Y-%m-%d")
+    values = {
+        "url_id": bytes.fromhex(url_id),
+        "domain_id": await interning.domains.id_for(db, data.domain),
+        "category_id": await interning.categories.id_for(db, category_key),
+        "duration_seconds": data.duration_seconds,
+        "region_id": await interning.regions.id_for(db, region),
+        "day": date.today()
+    }
+    
+    duplicate = False
+    if data.event_id is None:
+        db.add(AnalyticsEvent(**values))
+    else:
+        # The unique index settles retries that reach another worker or
+        # arrive after a restart, in the same single INSERT.
+        result = await db.execute(
+            upsert(db, AnalyticsEvent, {**values, "event_id": data.event_id},
+                   index_elements=["event_id"], update_columns=[])
+            .returning(AnalyticsEvent.id)
+        )
+        duplicate = result.first() is None
+        seen_events.add(data.event_id)
     
-    event = AnalyticsEvent(
-        url_id=url_id,
-        domain=data.domain,
-        category_key=category_key,
-        duration_seconds=data.duration_seconds,
-        region=region,
-        day=today
-    )
+    if not duplicate:
+        await activity_rollup.record(db, activity_rollup.visit_row(
+            data.domain, category_key, 1, data.duration_seconds
+        ))
     
-    db.add(event)
-    await db.commit()
+    with span("db_commit"):
+        await db.commit()
     
+    return _log_response(url_id, category_key, region, duplicate)
+
+
+@router.post("/aggregates")
+async def log_aggregates(
+    data: AnalyticsAggregateRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_write_db)
+):
+    """Merge per-(day, URL) visit counts and durations collected by the extension."""
+    batch_key = f"batch:{data.batch_id}" if data.batch_id is not None else None
+    if batch_key is not None and batch_key in seen_events:
+        result = await db.execute(
+            select(AnalyticsBatch.batch_id).where(AnalyticsBatch.batch_id == data.batch_id)
+        )
+        if result.first() is not None:
+            return _aggregates_response(0, 0, True)
+    
+    client_ip = request.client.host if request.client else "127.0.0.1"
+    location = await get_location_from_ip(client_ip)
+    region = location.get("region", "Unknown")
+    
+    categories = await _classify_sites([(a.domain, a.path) for a in data.aggregates], db)
+    
+    # Rows sharing a key must be merged here: one ON CONFLICT statement
+    # cannot update the same row twice.
+    rows = {}
+    with span("url_hash"):
+        for aggregate, category_key in zip(data.aggregates, categories):
+            url_id = hash_url(redact_url(aggregate.url))
+            key = (aggregate.day.isoformat(), aggregate.domain, url_id)
+            row = rows.get(key)
+            if row is None:
+                rows[key] = {
+                    "day": key[0],
+                    "domain": aggregate.domain,
+                    "url_id": url_id,
+                    "region": region,
+                    "category_key": category_key,
+                    "event_count": aggregate.count,
+                    "duration_seconds": aggregate.total_seconds
+                }
+            else:
+                row["event_count"] += aggregate.count
+                row["duration_seconds"] += aggregate.total_seconds
+    
+    if data.batch_id is not None:
+        result = await db.execute(
+            upsert(db, AnalyticsBatch, {"batch_id": data.batch_id},
+                   index_elements=["batch_id"], update_columns=[])
+            .returning(AnalyticsBatch.batch_id)
+        )
+        if result.first() is None:
+            await db.rollback()
+            seen_events.add(batch_key)
+            return _aggregates_response(0, 0, True)
+    
+    await db.execute(upsert(
+        db, AnalyticsDaily, list(rows.values()),
+        index_elements=["day", "domain", "url_id", "region"],
+        update_columns=["category_key"],
+        increment_columns=["event_count", "duration_seconds"]
+    ))
+    await activity_rollup.record(db, [
+        activity_rollup.visit_row(
+            aggregate.domain, category_key, aggregate.count, aggregate.total_seconds,
+            hour=activity_rollup.day_bucket(aggregate.day)
+        )
+        for aggregate, category_key in zip(data.aggregates, categories)
+    ])
+    with span("db_commit"):
+        await db.commit()
+    
+    if batch_key is not None:
+        seen_events.add(batch_key)
+    
+    return _aggregates_response(len(rows), sum(a.count for a in data.aggregates), False)
+
+
+def _aggregates_response(rows: int, events: int, duplicate: bool) -> dict:
     return {
         "status": "success",
-        "message": "Analytics logged successfully",
+        "message": "Aggregates already logged" if duplicate else f"Merged {events} events into {rows} rows",
         "data": {
-            "url_id": url_id,
-            "category": category_key,
-            "region": region
+            "rows": rows,
+            "events": events,
+            "duplicate": duplicate
         }
     }
 
@@ -65,32 +222,69 @@ async def log_analytics(
 @router.get("/summary")
 async def get_analytics_summary(
     period: str = "7d",
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     days = int(period.replace("d", ""))
-    start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    start_day = date.today() - timedelta(days=days)
+    start_date = start_day.isoformat()
     
-    stmt = select(
-        AnalyticsEvent.category_key,
+    # Days up to the newest archived one are read from the archive instead.
+    archived_through = analytics_archive.latest_day()
+    live_events = AnalyticsEvent.day >= start_day
+    if archived_through is not None:
+        live_events = live_events & (AnalyticsEvent.day > archived_through)
+    
+    # Individually logged events and pre-aggregated rows, counted alike.
+    events = select(
+        AnalyticsCategory.name.label("category_key"),
         func.count(AnalyticsEvent.id).label("count"),
         func.sum(AnalyticsEvent.duration_seconds).label("total_seconds")
+    ).select_from(
+        AnalyticsEvent
+    ).outerjoin(
+        AnalyticsCategory, AnalyticsEvent.category_id == AnalyticsCategory.id
     ).where(
-        AnalyticsEvent.day >= start_date
+        live_events
+    ).group_by(
+        AnalyticsCategory.name
+    )
+    daily = select(
+        AnalyticsDaily.category_key,
+        func.sum(AnalyticsDaily.event_count).label("count"),
+        func.sum(AnalyticsDaily.duration_seconds).label("total_seconds")
+    ).where(
+        AnalyticsDaily.day >= start_date
+    ).group_by(
+        AnalyticsDaily.category_key
+    )
+    combined = union_all(events, daily).subquery()
+    
+    stmt = select(
+        combined.c.category_key,
+        func.sum(combined.c.count).label("count"),
+        func.sum(combined.c.total_seconds).label("total_seconds")
     ).group_by(
-        AnalyticsEvent.category_key
+        combined.c.category_key
     )
     
     result = await db.execute(stmt)
-    rows = result.all()
-    
-    summary = {}
-    for row in rows:
-        category = row.category_key or "uncategorized"
-        total_hours = round((row.total_seconds or 0) / 3600, 2)
-        summary[category] = {
-            "count": row.count,
-            "hours": total_hours
-        }
+    rows = [(row.category_key, int(row.count), int(row.total_seconds or 0)) for row in result.all()]
+    
+    if archived_through is not None and archived_through >= start_day:
+        archived = await asyncio.to_thread(analytics_archive.summarize, start_day)
+        rows.extend((category, count, seconds) for category, (count, seconds) in archived.items())
+    
+    totals = {}
+    for category_key, count, seconds in rows:
+        category = category_key or "uncategorized"
+        merged = totals.setdefault(category, [0, 0])
+        merged[0] += count
+        merged[1] += seconds
+    
+    summary = {
+        category: {"count": count, "hours": round(seconds / 3600, 2)}
+        for category, (count, seconds) in totals.items()
+    }
     
     return {
         "status": "success",
@@ -99,26 +293,118 @@ async def get_analytics_summary(
     }
 
 
-async def _classify_site(domain: str, path: str | None, db: AsyncSession) -> str | None:
+TRIGGER_GROUPS = ("category", "domain", "hour")
+
+
+def _period_start(period: str) -> str:
+    """First hour bucket inside a ``24h`` / ``7d`` style period."""
     try:
-        stmt = select(ReminderRule).where(ReminderRule.domain_pattern == domain)
-        
-        if path:
-            stmt = stmt.where(
-                or_(
-                    ReminderRule.path_pattern == path,
-                    ReminderRule.path_pattern.is_(None)
-                )
-            ).order_by(ReminderRule.path_pattern.desc())
+        if period.endswith("h"):
+            hours = int(period[:-1])
+        elif period.endswith("d"):
+            hours = int(period[:-1]) * 24
         else:
-            stmt = stmt.where(ReminderRule.path_pattern.is_(None))
-        
-        result = await db.execute(stmt)
-        rule = result.first()
+            raise ValueError(period)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="period must look like 24h or 7d")
+    if hours < 1:
+        raise HTTPException(status_code=400, detail="period must be at least 1h")
+    
+    return activity_rollup.hour_bucket(
+        datetime.now(timezone.utc) - timedelta(hours=hours - 1)
+    )
+
+
+def _trigger_stats(triggers: int, trigger_seconds: int, visits: int, visit_seconds: int) -> dict:
+    return {
+        "triggers": triggers,
+        "visits": visits,
+        "trigger_hours": round(trigger_seconds / 3600, 2),
+        "browsing_hours": round(visit_seconds / 3600, 2),
+        # Reminders shown per visit; None when nothing was browsed.
+        "trigger_ratio": round(triggers / visits, 4) if visits else None
+    }
+
+
+@router.get("/triggers")
+async def get_trigger_stats(
+    period: str = "7d",
+    group_by: str = "category",
+    limit: int = Query(50, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Reminder triggers and the browsing they relate to, from the hourly rollup."""
+    if group_by not in TRIGGER_GROUPS:
+        raise HTTPException(
+            status_code=400, detail=f"group_by must be one of {', '.join(TRIGGER_GROUPS)}"
+        )
+    start_hour = _period_start(period)
+    
+    group_column = {
+        "category": ActivityHourly.category_key,
+        "domain": ActivityHourly.domain,
+        "hour": ActivityHourly.hour
+    }[group_by]
+    triggers = func.sum(ActivityHourly.trigger_count)
+    stmt = select(
+        group_column.label("key"),
+        triggers.label("triggers"),
+        func.sum(ActivityHourly.trigger_seconds).label("trigger_seconds"),
+        func.sum(ActivityHourly.visit_count).label("visits"),
+        func.sum(ActivityHourly.visit_seconds).label("visit_seconds")
+    ).where(
+        ActivityHourly.hour >= start_hour
+    ).group_by(
+        group_column
+    )
+    if group_by == "hour":
+        stmt = stmt.order_by(group_column)
+    else:
+        stmt = stmt.order_by(triggers.desc(), group_column)
+    
+    result = await db.execute(stmt)
+    
+    groups = []
+    totals = [0, 0, 0, 0]
+    for row in result.all():
+        counts = [int(row.triggers), int(row.trigger_seconds), int(row.visits), int(row.visit_seconds)]
+        totals = [a + b for a, b in zip(totals, counts)]
+        key = row.key
+        if group_by == "category":
+            key = key or "uncategorized"
+        groups.append({group_by: key, **_trigger_stats(*counts)})
+    
+    # Totals cover every group; only the listing is cut to ``limit``.
+    if group_by != "hour":
+        groups = groups[:limit]
+    
+    return {
+        "status": "success",
+        "message": f"Trigger statistics for the last {period} by {group_by}",
+        "data": {
+            "since": start_hour,
+            "totals": _trigger_stats(*totals),
+            "groups": groups
+        }
+    }
+
+
+async def _classify_site(domain: str, path: str | None, db: AsyncSession) -> str | None:
+    try:
+        rule = await match_rule(db, domain, path)
         
         if rule:
-            return rule[0].category_key
+            return rule.category_key
     except Exception:
         pass
     
     return None
+
+
+async def _classify_sites(pages: list[tuple[str, str | None]], db: AsyncSession) -> list[str | None]:
+    try:
+        rules = await match_rules(db, pages)
+    except Exception:
+        return [None] * len(pages)
+    
+    return [rule.category_key if rule else None for rule in rules]
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from starlette.responses import FileResponse
+from app.services.audio_cache import AUDIO_MEDIA_TYPE, AUDIO_ROUTE, audio_cache
+from app.utils.http_cache import etag_matches
+
+router = APIRouter(prefix=AUDIO_ROUTE, tags=["audio"])
+
+# Paths are content hashes, so a file at a given URL never changes.
+AUDIO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/{digest}.mp3")
+async def get_audio(digest: str, request: Request):
+    path = audio_cache.object_path(digest)
+    if not path:
+        raise HTTPException(status_code=404, detail="Audio not found")
+
+    headers = {"ETag": f'"{digest}"', "Cache-Control": AUDIO_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    # FileResponse answers Range requests itself and hands the path to the
+    # server via the ASGI pathsend extension when it is supported, so the
+    # file is sent without passing through Python.
+    return FileResponse(path, media_type=AUDIO_MEDIA_TYPE, headers=headers)
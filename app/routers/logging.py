@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
+from app.database import get_write_db
 from app.models import RequestLog
+from app.services import activity_rollup
+from app.utils.metrics import span
 
 router = APIRouter(prefix="/log-trigger", tags=["logging"])
 
@@ -17,7 +19,7 @@ class TriggerLogRequest(BaseModel):
 @router.post("")
 async def log_trigger(
     data: TriggerLogRequest,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
     log_entry = RequestLog(
         domain=data.domain,
@@ -27,7 +29,11 @@ async def log_trigger(
     )
     
     db.add(log_entry)
-    await db.commit()
+    await activity_rollup.record(db, activity_rollup.trigger_row(
+        data.domain, data.category_key, data.duration_seconds
+    ))
+    with span("db_commit"):
+        await db.commit()
     
     return {
         "status": "success",
@@ -1,34 +1,38 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
+from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_
-from app.database import get_db
-from app.models import ReminderRule
+from app.database import get_write_db, get_read_db
 from app.services.quran_service import QuranService
+from app.services.rule_matcher import match_rule, match_rules
+from app.services.translations import resolve_lang
+from app.utils.http_cache import REMINDER_CACHE_CONTROL, etag_matches, weak_etag
+from app.utils.responses import FastJSONResponse
 
 router = APIRouter(prefix="/reminder", tags=["reminder"])
 
+MAX_BATCH_SIZE = 50
 
-@router.get("")
+
+class ReminderPage(BaseModel):
+    domain: str
+    path: str | None = None
+
+
+class ReminderBatchRequest(BaseModel):
+    pages: list[ReminderPage] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+    lang: str = "en"
+
+
+@router.get("", response_class=FastJSONResponse)
 async def get_reminder(
+    request: Request,
     domain: str = Query(..., description="Domain to match"),
     path: str = Query(None, description="Path to match"),
     lang: str = Query("en", description="Language code"),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db),
+    read_db: AsyncSession = Depends(get_read_db)
 ):
-    stmt = select(ReminderRule).where(ReminderRule.domain_pattern == domain)
-    
-    if path:
-        stmt = stmt.where(
-            or_(
-                ReminderRule.path_pattern == path,
-                ReminderRule.path_pattern.is_(None)
-            )
-        ).order_by(ReminderRule.path_pattern.desc())
-    else:
-        stmt = stmt.where(ReminderRule.path_pattern.is_(None))
-    
-    result = await db.execute(stmt)
-    rule = result.first()
+    rule = await match_rule(read_db, domain, path)
     
     if not rule:
         raise HTTPException(
@@ -36,10 +40,11 @@ async def get_reminder(
             detail="No reminder rule found for this domain/path"
         )
     
-    rule = rule[0]
-    
+    lang = resolve_lang(lang)
     quran_service = QuranService()
-    ayah_data = await quran_service.get_ayah(rule.reference, lang, db)
+    ayah_data, last_fetched = await quran_service.get_ayah_entry(
+        rule.reference, lang, db, read_db
+    )
     
     if not ayah_data:
         raise HTTPException(
@@ -47,7 +52,22 @@ async def get_reminder(
             detail="Failed to fetch ayah from Quran API"
         )
     
-    return {
+    # An ayah that could not be cached has no stable version to validate against.
+    headers = {}
+    if last_fetched is not None:
+        headers = {
+            "ETag": weak_etag(
+                "reminder", rule.id, rule.version, lang, last_fetched.isoformat(),
+                ayah_data["audio_url"]
+            ),
+            "Cache-Control": REMINDER_CACHE_CONTROL,
+            "Vary": "Accept-Encoding"
+        }
+        
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+    
+    return FastJSONResponse({
         "status": "success",
         "message": "Reminder fetched successfully",
         "data": {
@@ -55,4 +75,50 @@ async def get_reminder(
             "reference": rule.reference,
             **ayah_data
         }
-    }
+    }, headers=headers)
+
+
+@router.post("/batch", response_class=FastJSONResponse)
+async def get_reminders(
+    data: ReminderBatchRequest,
+    db: AsyncSession = Depends(get_write_db),
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    pages = [(page.domain, page.path) for page in data.pages]
+    rules = await match_rules(read_db, pages)
+    
+    quran_service = QuranService()
+    ayahs = await quran_service.get_ayahs(
+        [rule.reference for rule in rules if rule], data.lang, db, read_db
+    )
+    
+    results = []
+    for (domain, path), rule in zip(pages, rules):
+        item = {"domain": domain, "path": path}
+        
+        if not rule:
+            results.append({**item, "status": "not_found", "data": None})
+            continue
+        
+        ayah_data = ayahs.get(rule.reference)
+        if not ayah_data:
+            results.append({**item, "status": "unavailable", "data": None})
+            continue
+        
+        results.append({
+            **item,
+            "status": "success",
+            "data": {
+                "category": rule.category_key,
+                "reference": rule.reference,
+                **ayah_data
+            }
+        })
+    
+    found = sum(1 for r in results if r["status"] == "success")
+    
+    return FastJSONResponse({
+        "status": "success",
+        "message": f"Fetched {found} of {len(results)} reminders",
+        "data": results
+    })
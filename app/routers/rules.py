@@ -1,31 +1,231 @@
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.database import get_db
-from app.models import ReminderRule
+from sqlalchemy import delete, select
+from app.database import get_read_db, get_write_db
+from app.models import ReminderRule, RuleTombstone
+from app.services.rule_bundle import MEDIA_TYPE as BUNDLE_MEDIA_TYPE, rule_bundle
+from app.services.rule_import import import_rules, parse_csv, parse_json
+from app.services.rules_cache import (
+    RULE_COLUMNS,
+    current_rules_version,
+    next_rules_version,
+    rules_etag,
+    rules_snapshot,
+    rules_version
+)
+from app.utils.admin import require_admin
+from app.utils.http_cache import RULES_CACHE_CONTROL, etag_matches
+from app.utils.responses import FastJSONResponse
 
 router = APIRouter(prefix="/rules", tags=["rules"])
 
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 5000
+
+
+def _encode_cursor(rule_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{rule_id}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, _, rule_id = raw.partition(":")
+        if prefix != "id":
+            raise ValueError(cursor)
+        return int(rule_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _json_response(payload: dict, version: int) -> Response:
+    return FastJSONResponse(
+        payload,
+        headers={
+            "ETag": rules_etag(version),
+            "X-Rules-Version": str(version),
+            "Cache-Control": RULES_CACHE_CONTROL
+        }
+    )
+
 
 @router.get("")
-async def get_rules(db: AsyncSession = Depends(get_db)):
-    stmt = select(ReminderRule)
-    result = await db.execute(stmt)
-    rules = result.scalars().all()
-    
-    rules_data = [
-        {
-            "id": rule.id,
-            "domain_pattern": rule.domain_pattern,
-            "path_pattern": rule.path_pattern,
-            "category_key": rule.category_key,
-            "reference": rule.reference
+async def get_rules(
+    request: Request,
+    since_version: int | None = Query(None, ge=0, description="Only return changes after this rules version"),
+    cursor: str | None = Query(None, description="Opaque cursor from a previous page"),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    version = await current_rules_version(db)
+    
+    if etag_matches(request.headers.get("if-none-match"), rules_etag(version)):
+        return Response(
+            status_code=304,
+            headers={
+                "ETag": rules_etag(version),
+                "X-Rules-Version": str(version),
+                "Cache-Control": RULES_CACHE_CONTROL
+            }
+        )
+    
+    if since_version is not None:
+        return await _rules_delta(db, version, since_version)
+    
+    if cursor is not None or limit is not None:
+        return await _rules_page(db, version, cursor, limit or DEFAULT_PAGE_SIZE)
+    
+    snapshot = await rules_snapshot.get(db, version)
+    encoding, body = snapshot.negotiate(request.headers.get("accept-encoding"))
+    
+    headers = {
+        "ETag": snapshot.etag,
+        "X-Rules-Version": str(snapshot.version),
+        "Cache-Control": RULES_CACHE_CONTROL,
+        "Vary": "Accept-Encoding"
+    }
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _rules_delta(db: AsyncSession, version: int, since_version: int) -> Response:
+    changed = []
+    deleted = []
+    
+    if since_version < version:
+        result = await db.execute(
+            select(*RULE_COLUMNS)
+            .where(ReminderRule.version > since_version)
+            .order_by(ReminderRule.id)
+        )
+        changed = [dict(row._mapping) for row in result]
+        
+        result = await db.execute(
+            select(RuleTombstone.rule_id)
+            .where(RuleTombstone.version > since_version)
+            .order_by(RuleTombstone.rule_id)
+        )
+        deleted = list(result.scalars())
+    
+    return _json_response({
+        "status": "success",
+        "message": f"{len(changed)} changed and {len(deleted)} deleted rules since version {since_version}",
+        "data": {
+            "version": version,
+            "changed": changed,
+            "deleted": deleted
         }
-        for rule in rules
-    ]
+    }, version)
+
+
+async def _rules_page(db: AsyncSession, version: int, cursor: str | None, limit: int) -> Response:
+    after_id = _decode_cursor(cursor) if cursor else 0
+    
+    result = await db.execute(
+        select(*RULE_COLUMNS)
+        .where(ReminderRule.id > after_id)
+        .order_by(ReminderRule.id)
+        .limit(limit + 1)
+    )
+    rules = [dict(row._mapping) for row in result]
+    
+    next_cursor = None
+    if len(rules) > limit:
+        rules = rules[:limit]
+        next_cursor = _encode_cursor(rules[-1]["id"])
+    
+    return _json_response({
+        "status": "success",
+        "message": f"Found {len(rules)} reminder rules",
+        "data": {
+            "version": version,
+            "rules": rules,
+            "next_cursor": next_cursor
+        }
+    }, version)
+
+
+@router.get("/bundle")
+async def get_rule_bundle(request: Request, db: AsyncSession = Depends(get_read_db)):
+    version = await current_rules_version(db)
+    bundle = await rule_bundle.get(db, version)
+    
+    encoding, body = bundle.negotiate(request.headers.get("accept-encoding"))
+    headers = {
+        "ETag": bundle.etags[encoding],
+        "X-Rules-Version": str(bundle.version),
+        "X-Bundle-SHA256": bundle.hash,
+        "Cache-Control": RULES_CACHE_CONTROL,
+        "Vary": "Accept-Encoding"
+    }
+    
+    # Any encoding of this bundle is still current for the client.
+    if_none_match = request.headers.get("if-none-match")
+    if any(etag_matches(if_none_match, etag) for etag in bundle.etags.values()):
+        return Response(status_code=304, headers=headers)
+    
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    
+    return Response(content=body, media_type=BUNDLE_MEDIA_TYPE, headers=headers)
+
+
+@router.post("/import", dependencies=[Depends(require_admin)])
+async def import_rules_endpoint(
+    request: Request,
+    fmt: str | None = Query(None, alias="format", description="csv or json (default: from Content-Type)"),
+    category_key: str | None = Query(None, description="Category for rows that omit one"),
+    reference: str | None = Query(None, description="Reference for rows that omit one"),
+    dry_run: bool = Query(False, description="Validate without writing"),
+    db: AsyncSession = Depends(get_write_db)
+):
+    if fmt is None:
+        fmt = "json" if "json" in request.headers.get("content-type", "") else "csv"
+    
+    parsers = {"csv": parse_csv, "json": parse_json}
+    if fmt not in parsers:
+        raise HTTPException(status_code=400, detail="format must be csv or json")
+    
+    try:
+        stats = await import_rules(
+            db,
+            parsers[fmt](request.stream()),
+            defaults={"category_key": category_key, "reference": reference},
+            dry_run=dry_run
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{e} (chunks before this point were already imported)"
+        )
+    
+    return {
+        "status": "success",
+        "message": f"Imported {stats.inserted + stats.updated} reminder rules"
+                   + (" (dry run)" if dry_run else ""),
+        "data": stats.as_dict()
+    }
+
+
+@router.delete("/{rule_id}", dependencies=[Depends(require_admin)])
+async def delete_rule(rule_id: int, db: AsyncSession = Depends(get_write_db)):
+    result = await db.execute(
+        delete(ReminderRule).where(ReminderRule.id == rule_id).returning(ReminderRule.id)
+    )
+    if result.first() is None:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Reminder rule not found")
+    
+    version = await next_rules_version(db)
+    db.add(RuleTombstone(rule_id=rule_id, version=version))
+    await db.commit()
+    rules_version.observe(version)
     
     return {
         "status": "success",
-        "message": f"Found {len(rules_data)} reminder rules",
-        "data": rules_data
+        "message": "Reminder rule deleted",
+        "data": {"id": rule_id, "version": version}
     }
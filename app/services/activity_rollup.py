@@ -0,0 +1,73 @@
+"""Hourly rollup of reminder triggers and browsing, kept up to date at ingest.
+
+Each write to ``requests_log``, ``analytics_events`` or ``analytics_daily``
+also adds to one ``activity_hourly`` row per (hour, domain, category) in the
+same transaction. Triggers and visits share the row, so the
+trigger-to-browsing ratio is a sum over the rollup rather than a join of
+the raw tables.
+
+Pre-aggregated uploads only say which day their visits fell on; they are
+counted in that day's first hour (``T00``).
+"""
+from datetime import date, datetime, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import upsert
+from app.models import ActivityHourly
+
+UNCATEGORIZED = ""
+
+_KEY = ["hour", "domain", "category_key"]
+_COUNTS = ["trigger_count", "trigger_seconds", "visit_count", "visit_seconds"]
+
+
+def hour_bucket(moment: datetime | None = None) -> str:
+    """``YYYY-MM-DDTHH`` of ``moment`` (default: now) in UTC."""
+    moment = moment or datetime.now(timezone.utc)
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H")
+
+
+def day_bucket(day: date) -> str:
+    return f"{day.isoformat()}T00"
+
+
+def _row(hour: str, domain: str, category_key: str | None, **counts) -> dict:
+    row = {"hour": hour, "domain": domain, "category_key": category_key or UNCATEGORIZED}
+    for column in _COUNTS:
+        row[column] = counts.get(column, 0)
+    return row
+
+
+def trigger_row(domain: str, category_key: str | None, seconds: int | None,
+                hour: str | None = None) -> dict:
+    return _row(hour or hour_bucket(), domain, category_key,
+                trigger_count=1, trigger_seconds=seconds or 0)
+
+
+def visit_row(domain: str, category_key: str | None, count: int, seconds: int,
+              hour: str | None = None) -> dict:
+    return _row(hour or hour_bucket(), domain, category_key,
+                visit_count=count, visit_seconds=seconds)
+
+
+def merge_rows(rows: list[dict]) -> list[dict]:
+    """Sum rows sharing a key; one ON CONFLICT statement can't update a row twice."""
+    merged = {}
+    for row in rows:
+        key = (row["hour"], row["domain"], row["category_key"])
+        existing = merged.get(key)
+        if existing is None:
+            merged[key] = dict(row)
+        else:
+            for column in _COUNTS:
+                existing[column] += row[column]
+    return list(merged.values())
+
+
+async def record(db: AsyncSession, rows: dict | list[dict]):
+    """Add ``rows`` to the rollup; committed with the caller's transaction."""
+    if isinstance(rows, list):
+        rows = merge_rows(rows)
+        if not rows:
+            return
+    await db.execute(upsert(db, ActivityHourly, rows, index_elements=_KEY,
+                            update_columns=[], increment_columns=_COUNTS))
@@ -0,0 +1,296 @@
+"""Cold-tier archive of closed analytics days.
+
+Enabled by setting ``ANALYTICS_ARCHIVE_DIR``. The archive job::
+
+    python -m app.services.analytics_archive
+
+moves every day older than ``ANALYTICS_HOT_DAYS`` out of
+``analytics_events``. Each day goes into one column-oriented file, and
+``/analytics/summary`` reads those files together with the live table.
+
+File layout (little-endian)::
+
+    magic        4s   b"DHKA"
+    version      H
+    pad          H
+    meta offset  Q
+    meta length  I
+    columns           one block per column, each starting on an 8-byte boundary
+    meta         JSON {"day", "rows", "columns": {...}, "dictionaries": {...}}
+
+Every column entry records ``dtype``, ``shape`` and ``offset``, and the
+numeric columns also record ``min`` and ``max``. Domains, regions and
+categories are codes into the file's own dictionaries, which are stored
+in the metadata and are independent of the database ids. Codes and
+durations use the narrowest integer type that holds them. Blocks are
+stored uncompressed so that readers can ``mmap`` the file and scan
+columns in place with NumPy. That narrowing, rather than a general
+purpose codec, is where the space saving comes from.
+
+Archived days always form a prefix. The job works through days in
+order, writes a day's file (via rename) before deleting its rows, and
+readers only count live rows after the newest archived day. If the job
+dies between the two steps, the rows are ignored until the next run
+deletes them.
+"""
+import asyncio
+import mmap
+import os
+import struct
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+from sqlalchemy import delete, distinct, select
+from app.database import dispose_engines, get_sessionmaker
+from app.models import (
+    AnalyticsCategory, AnalyticsDomain, AnalyticsEvent, AnalyticsRegion
+)
+from app.utils.responses import dump_json, load_json
+
+HOT_DAYS = int(os.getenv("ANALYTICS_HOT_DAYS", "90"))
+
+MAGIC = b"DHKA"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHQI")
+_ALIGN = 8
+_SUFFIX = ".dhka"
+
+
+def _code_dtype(size: int) -> np.dtype:
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if size <= np.iinfo(dtype).max + 1:
+            return np.dtype(dtype).newbyteorder("<")
+    return np.dtype("<u8")
+
+
+def _int_dtype(values: np.ndarray) -> np.dtype:
+    if values.size == 0:
+        return np.dtype("<i4")
+    low, high = int(values.min()), int(values.max())
+    for dtype in (np.uint8, np.uint16, np.uint32, np.int32, np.int64):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype).newbyteorder("<")
+    return np.dtype("<i8")
+
+
+def _encode(values: list) -> tuple[list, np.ndarray]:
+    """(dictionary, codes) with codes indexing the dictionary."""
+    dictionary = {}
+    codes = [dictionary.setdefault(value, len(dictionary)) for value in values]
+    return list(dictionary), np.array(codes, dtype=_code_dtype(len(dictionary)))
+
+
+def _epoch(moment: datetime | None) -> int:
+    if moment is None:
+        return 0
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+def encode_day(day: date, rows: list) -> bytes:
+    """Columnar file for one day of ``(url_id, domain, category, region,
+    duration_seconds, timestamp)`` rows."""
+    domains, domain_codes = _encode([row[1] for row in rows])
+    categories, category_codes = _encode([row[2] for row in rows])
+    regions, region_codes = _encode([row[3] for row in rows])
+    durations = np.array([row[4] for row in rows], dtype=np.int64)
+    timestamps = np.array([_epoch(row[5]) for row in rows], dtype="<i8")
+    url_ids = np.frombuffer(b"".join(bytes(row[0]) for row in rows), dtype=np.uint8)
+
+    columns = {
+        "url_id": url_ids.reshape(len(rows), 32),
+        "domain": domain_codes,
+        "category": category_codes,
+        "region": region_codes,
+        "duration_seconds": durations.astype(_int_dtype(durations)),
+        "timestamp": timestamps,
+    }
+
+    meta = {
+        "day": day.isoformat(),
+        "rows": len(rows),
+        "columns": {},
+        "dictionaries": {"domain": domains, "category": categories, "region": regions},
+    }
+    out = bytearray(_HEADER.size)
+    out.extend(b"\0" * (-len(out) % _ALIGN))
+    for name, values in columns.items():
+        entry = {"dtype": values.dtype.str, "shape": list(values.shape), "offset": len(out)}
+        if name in ("duration_seconds", "timestamp") and values.size:
+            entry["min"], entry["max"] = int(values.min()), int(values.max())
+        meta["columns"][name] = entry
+        out.extend(values.tobytes())
+        out.extend(b"\0" * (-len(out) % _ALIGN))
+
+    meta_bytes = dump_json(meta)
+    _HEADER.pack_into(out, 0, MAGIC, VERSION, 0, len(out), len(meta_bytes))
+    out.extend(meta_bytes)
+    return bytes(out)
+
+
+def read_meta(buffer) -> dict:
+    magic, version, _, meta_offset, meta_length = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not an analytics archive file")
+    return load_json(bytes(buffer[meta_offset:meta_offset + meta_length]))
+
+
+def column(buffer, meta: dict, name: str) -> np.ndarray:
+    """Zero-copy view of one column."""
+    entry = meta["columns"][name]
+    count = int(np.prod(entry["shape"])) if entry["shape"] else 0
+    values = np.frombuffer(buffer, dtype=np.dtype(entry["dtype"]), count=count,
+                           offset=entry["offset"])
+    return values.reshape(entry["shape"])
+
+
+def summarize_buffer(buffer) -> dict[str | None, tuple[int, int]]:
+    """``{category: (events, seconds)}`` for one archived day."""
+    meta = read_meta(buffer)
+    categories = meta["dictionaries"]["category"]
+    if not meta["rows"]:
+        return {}
+    codes = column(buffer, meta, "category")
+    durations = column(buffer, meta, "duration_seconds")
+    counts = np.bincount(codes, minlength=len(categories))
+    seconds = np.bincount(codes, weights=durations, minlength=len(categories))
+    totals = {
+        category: (int(counts[code]), int(seconds[code]))
+        for code, category in enumerate(categories) if counts[code]
+    }
+    del codes, durations    # Views must go before the mapping is closed.
+    return totals
+
+
+class AnalyticsArchive:
+    def __init__(self, directory: str | None, hot_days: int = HOT_DAYS):
+        self.directory = directory
+        self.hot_days = hot_days
+        # Files are immutable once renamed into place, so per-day totals
+        # are cached by (size, mtime) and each file is scanned once.
+        self._totals: dict[str, tuple[tuple[int, int], dict]] = {}
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "AnalyticsArchive":
+        return cls(os.getenv("ANALYTICS_ARCHIVE_DIR") or None)
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def path_for(self, day: date) -> str:
+        return os.path.join(self.directory, f"events-{day.isoformat()}{_SUFFIX}")
+
+    def days(self) -> list[date]:
+        if not self.enabled:
+            return []
+        days = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith("events-") and entry.name.endswith(_SUFFIX):
+                try:
+                    days.append(date.fromisoformat(entry.name[len("events-"):-len(_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(days)
+
+    def latest_day(self) -> date | None:
+        days = self.days()
+        return days[-1] if days else None
+
+    def write_day(self, day: date, rows: list):
+        path = self.path_for(day)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(encode_day(day, rows))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def day_totals(self, day: date) -> dict[str | None, tuple[int, int]]:
+        path = self.path_for(day)
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = self._totals.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            totals = summarize_buffer(mapped)
+        self._totals[path] = (signature, totals)
+        return totals
+
+    def summarize(self, start: date, end: date | None = None) -> dict[str | None, tuple[int, int]]:
+        """Summed ``{category: (events, seconds)}`` over archived days in ``[start, end]``."""
+        summary: dict[str | None, list[int]] = {}
+        for day in self.days():
+            if day < start or (end is not None and day > end):
+                continue
+            for category, (count, seconds) in self.day_totals(day).items():
+                totals = summary.setdefault(category, [0, 0])
+                totals[0] += count
+                totals[1] += seconds
+        return {category: (count, seconds) for category, (count, seconds) in summary.items()}
+
+    async def archive_closed_days(self, today: date | None = None) -> list[date]:
+        """Move every day older than ``hot_days`` into the archive."""
+        if not self.enabled:
+            return []
+        cutoff = (today or date.today()) - timedelta(days=self.hot_days)
+
+        async with get_sessionmaker()() as db:
+            result = await db.execute(
+                select(distinct(AnalyticsEvent.day))
+                .where(AnalyticsEvent.day < cutoff)
+                .order_by(AnalyticsEvent.day)
+            )
+            days = [row[0] for row in result.all()]
+
+            archived = []
+            for day in days:
+                if not os.path.exists(self.path_for(day)):
+                    result = await db.execute(
+                        select(
+                            AnalyticsEvent.url_id,
+                            AnalyticsDomain.name,
+                            AnalyticsCategory.name,
+                            AnalyticsRegion.name,
+                            AnalyticsEvent.duration_seconds,
+                            AnalyticsEvent.timestamp
+                        )
+                        .join(AnalyticsDomain, AnalyticsEvent.domain_id == AnalyticsDomain.id)
+                        .outerjoin(AnalyticsCategory, AnalyticsEvent.category_id == AnalyticsCategory.id)
+                        .outerjoin(AnalyticsRegion, AnalyticsEvent.region_id == AnalyticsRegion.id)
+                        .where(AnalyticsEvent.day == day)
+                        .order_by(AnalyticsEvent.id)
+                    )
+                    rows = result.all()
+                    await asyncio.to_thread(self.write_day, day, rows)
+
+                await db.execute(delete(AnalyticsEvent).where(AnalyticsEvent.day == day))
+                await db.commit()
+                archived.append(day)
+        return archived
+
+
+analytics_archive = AnalyticsArchive.from_env()
+
+
+async def _main():
+    if not analytics_archive.enabled:
+        raise SystemExit("Set ANALYTICS_ARCHIVE_DIR to run the analytics archive job")
+    try:
+        archived = await analytics_archive.archive_closed_days()
+    finally:
+        await dispose_engines()
+    if archived:
+        print(f"✓ Archived {len(archived)} days: {archived[0]} to {archived[-1]}")
+    else:
+        print(f"✓ Nothing older than {analytics_archive.hot_days} days to archive")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
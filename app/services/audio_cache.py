@@ -0,0 +1,190 @@
+"""Local, content-addressed cache of recitation audio.
+
+Enabled by setting ``AUDIO_CACHE_DIR``. The first time an ayah's upstream
+audio URL is served, a background task downloads it; once stored, responses
+point ``audio_url`` at ``/audio/<sha256>.mp3`` instead of the third-party
+host. Until then (or when the cache is disabled) the upstream URL is passed
+through unchanged. Layout under the cache directory::
+
+    objects/ab/<sha256>    file contents, named by their SHA-256
+    refs/<sha256 of url>   the content hash an upstream URL resolved to
+    tmp/                   partial downloads, renamed into objects/ when done
+
+Every step is a rename, so workers sharing the directory never see a
+partial file, and identical recitations behind different URLs are stored
+once.
+
+A failed download is not retried on the next request. The URL is left
+alone for ``AUDIO_CACHE_RETRY_SECONDS``, doubling with each further
+failure, and downloads as a whole go through the ``audio`` circuit
+breaker so an upstream outage stops them until it recovers.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import time
+import httpx
+from app.services.circuit_breaker import CircuitOpenError, circuit_breaker
+
+AUDIO_MEDIA_TYPE = "audio/mpeg"
+AUDIO_ROUTE = "/audio"
+MAX_CONCURRENT_DOWNLOADS = 4
+MAX_AUDIO_BYTES = int(os.getenv("AUDIO_CACHE_MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+RETRY_SECONDS = float(os.getenv("AUDIO_CACHE_RETRY_SECONDS", "300"))
+MAX_RETRY_SECONDS = 24 * 3600
+
+AUDIO_BREAKER = circuit_breaker("audio", max_timeout=30.0)
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _url_key(source_url: str) -> str:
+    return hashlib.sha256(source_url.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """Downloads upstream recitation files and maps their URLs to local copies."""
+
+    def __init__(self, directory: str | None, base_url: str = AUDIO_ROUTE):
+        self.directory = directory
+        self.base_url = base_url.rstrip("/")
+        self._digests: dict[str, str] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        # source_url -> (monotonic time of the next attempt, failures so far)
+        self._failures: dict[str, tuple[float, int]] = {}
+        self._semaphore = None
+
+        if directory:
+            for sub in ("objects", "refs", "tmp"):
+                os.makedirs(os.path.join(directory, sub), exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "AudioCache":
+        return cls(os.getenv("AUDIO_CACHE_DIR") or None)
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def object_path(self, digest: str) -> str | None:
+        """Path of a stored file, or ``None`` for an unknown or malformed digest."""
+        if not self.enabled or not _DIGEST.match(digest):
+            return None
+        path = os.path.join(self.directory, "objects", digest[:2], digest)
+        return path if os.path.isfile(path) else None
+
+    def url_for(self, source_url: str) -> str:
+        """Local URL for ``source_url`` if cached; otherwise queue a download
+        and return ``source_url`` as is."""
+        if not self.enabled or not source_url.startswith(("http://", "https://")):
+            return source_url
+
+        digest = self._digests.get(source_url) or self._read_ref(source_url)
+        if digest:
+            return f"{self.base_url}/{digest}.mp3"
+
+        self.prefetch(source_url)
+        return source_url
+
+    def prefetch(self, source_url: str):
+        """Start a background download unless one is already running or
+        the URL failed recently."""
+        if source_url in self._tasks or self.backing_off(source_url):
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._download(source_url))
+        except RuntimeError:
+            return
+        self._tasks[source_url] = task
+        task.add_done_callback(lambda _: self._tasks.pop(source_url, None))
+
+    def backing_off(self, source_url: str) -> bool:
+        failure = self._failures.get(source_url)
+        return failure is not None and time.monotonic() < failure[0]
+
+    def _record_failure(self, source_url: str):
+        _, failures = self._failures.get(source_url, (0.0, 0))
+        delay = min(RETRY_SECONDS * 2 ** failures, MAX_RETRY_SECONDS)
+        self._failures[source_url] = (time.monotonic() + delay, failures + 1)
+
+    async def wait(self):
+        """Wait for every queued download (used by tests and shutdown)."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def close(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await self.wait()
+
+    def _read_ref(self, source_url: str) -> str | None:
+        try:
+            with open(os.path.join(self.directory, "refs", _url_key(source_url))) as f:
+                digest = f.read().strip()
+        except FileNotFoundError:
+            return None
+
+        if not self.object_path(digest):
+            return None
+        self._digests[source_url] = digest
+        return digest
+
+    def _replace_atomic(self, tmp_path: str, final_path: str):
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(tmp_path, final_path)
+
+    async def _download(self, source_url: str):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+
+        key = _url_key(source_url)
+        tmp_path = os.path.join(self.directory, "tmp", f"{key}.{os.getpid()}")
+        try:
+            async with self._semaphore, AUDIO_BREAKER.guard() as timeout:
+                digest = await self._fetch_to(source_url, tmp_path, timeout)
+
+            self._replace_atomic(
+                tmp_path, os.path.join(self.directory, "objects", digest[:2], digest)
+            )
+            with open(f"{tmp_path}.ref", "w") as f:
+                f.write(digest)
+            self._replace_atomic(f"{tmp_path}.ref", os.path.join(self.directory, "refs", key))
+            self._digests[source_url] = digest
+            self._failures.pop(source_url, None)
+        except CircuitOpenError:
+            # Not this URL's fault; the breaker decides when to try again.
+            pass
+        except Exception as e:
+            self._record_failure(source_url)
+            print(f"Audio cache error for {source_url}: {e}")
+        finally:
+            for path in (tmp_path, f"{tmp_path}.ref"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    async def _fetch_to(self, source_url: str, tmp_path: str, timeout: float = 30.0) -> str:
+        sha = hashlib.sha256()
+        size = 0
+        async with httpx.AsyncClient(follow_redirects=True) as client:
+            async with client.stream("GET", source_url, timeout=timeout) as response:
+                response.raise_for_status()
+                # Disk writes go to a thread: a slow or busy volume must not
+                # stall every request on the event loop.
+                f = await asyncio.to_thread(open, tmp_path, "wb")
+                try:
+                    async for chunk in response.aiter_bytes(64 * 1024):
+                        size += len(chunk)
+                        if size > MAX_AUDIO_BYTES:
+                            raise ValueError(f"larger than {MAX_AUDIO_BYTES} bytes")
+                        sha.update(chunk)
+                        await asyncio.to_thread(f.write, chunk)
+                finally:
+                    await asyncio.to_thread(f.close)
+
+        if size == 0:
+            raise ValueError("empty response")
+        return sha.hexdigest()
+
+
+audio_cache = AudioCache.from_env()
@@ -0,0 +1,147 @@
+"""Push invalidation of local caches through Postgres LISTEN/NOTIFY.
+
+Migration 4 installs triggers that ``NOTIFY`` on the ``dhikr_cache_changes``
+channel whenever ``reminder_rules``, ``rules_state`` or ``reminder_cache``
+change. Each worker holds one dedicated connection (outside the SQLAlchemy
+pool) that ``LISTEN``s there and applies every notification as soon as it
+arrives:
+
+    reminder_rules   drop the /rules snapshot and compiled bundle
+    rules_state      adopt the new rules version (no version query per request)
+    reminder_cache   wake the shared cache publisher
+
+The pushed rules version is only trusted while connected. On a lost
+connection the hint is cleared, so requests read the version from the
+database again. Every (re)connect starts with a full reload, because
+notifications sent while disconnected are gone.
+
+Disabled on SQLite and with ``CACHE_CHANGE_LISTENER=false``.
+"""
+import asyncio
+import os
+import asyncpg
+from app.database import get_engine, get_sessionmaker
+from app.migrations import CHANGE_CHANNEL
+from app.services.rule_bundle import rule_bundle
+from app.services.rules_cache import read_rules_version, rules_snapshot, rules_version
+from app.services.shared_cache import shared_cache
+from app.utils.metrics import CACHE_INVALIDATIONS
+from app.utils.responses import load_json
+
+LISTENER_ENABLED = os.getenv("CACHE_CHANGE_LISTENER", "true").lower() in ("1", "true", "yes")
+
+# A quiet LISTEN connection can die without a FIN (NAT, failover); probe it.
+KEEPALIVE_SECONDS = 30
+MAX_BACKOFF_SECONDS = 30
+
+
+def apply_change(payload: dict):
+    """Apply one change notification to this worker's caches."""
+    table_name = payload.get("table")
+
+    if table_name == "reminder_rules":
+        rules_snapshot.invalidate()
+        rule_bundle.invalidate()
+        shared_cache.request_publish()
+    elif table_name == "rules_state":
+        if payload.get("version") is not None:
+            rules_version.observe(int(payload["version"]))
+        shared_cache.request_publish()
+    elif table_name == "reminder_cache":
+        shared_cache.request_publish()
+    else:
+        return
+
+    CACHE_INVALIDATIONS.inc(table_name)
+
+
+async def full_reload():
+    """Drop everything derived from the database and re-read the rules version."""
+    rules_snapshot.invalidate()
+    rule_bundle.invalidate()
+    async with get_sessionmaker()() as db:
+        version = await read_rules_version(db)
+    rules_version.reset(version)
+    shared_cache.request_publish(force=True)
+    CACHE_INVALIDATIONS.inc("full_reload")
+
+
+def _dsn(engine) -> str:
+    # asyncpg takes a plain postgresql:// URL, without the SQLAlchemy driver.
+    return engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class ChangeListener:
+    def __init__(self, enabled: bool = LISTENER_ENABLED):
+        self.enabled = enabled
+        self.connected = False
+        self._established = False
+        self._task: asyncio.Task | None = None
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            apply_change(load_json(payload))
+        except ValueError as e:
+            print(f"Ignoring malformed change notification {payload!r}: {e}")
+
+    def _disconnected(self):
+        self.connected = False
+        shared_cache.change_feed = False
+        rules_version.reset(None)
+
+    async def _listen(self, dsn: str):
+        lost = asyncio.Event()
+        connection = await asyncpg.connect(dsn)
+        try:
+            connection.add_termination_listener(lambda _: lost.set())
+            # Subscribe before reloading so nothing committed in between is missed.
+            await connection.add_listener(CHANGE_CHANNEL, self._on_notify)
+            await full_reload()
+            self.connected = self._established = True
+            shared_cache.change_feed = True
+            print(f"Listening for cache invalidations on {CHANGE_CHANNEL}")
+
+            while not lost.is_set():
+                try:
+                    await asyncio.wait_for(lost.wait(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    await connection.execute("SELECT 1")
+        finally:
+            self._disconnected()
+            if not connection.is_closed():
+                connection.terminate()
+
+    async def run(self, dsn: str):
+        backoff = 1.0
+        while True:
+            self._established = False
+            try:
+                await self._listen(dsn)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Change listener error: {e}")
+            if self._established:
+                backoff = 1.0
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+    def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        engine = get_engine()
+        if engine.dialect.name != "postgresql":
+            return
+        self._task = asyncio.get_running_loop().create_task(self.run(_dsn(engine)))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+change_listener = ChangeListener()
@@ -0,0 +1,203 @@
+"""Per-upstream circuit breakers with adaptive timeouts.
+
+Each upstream (Quran.com, AlQuran.cloud, ip-api.com) gets one breaker per
+worker process. Calls go through ``guard()``::
+
+    async with QURAN_COM_BREAKER.guard() as timeout:
+        response = await client.get(url, timeout=timeout)
+
+The breaker keeps a rolling window of recent calls. Once the window holds
+at least ``min_calls`` calls and either the failure rate or the slow-call
+rate reaches ``error_threshold``, it opens: ``guard()`` raises
+``CircuitOpenError`` at once, so callers go straight to their fallback.
+After ``open_seconds`` one probe call is let through (half-open). It closes
+the circuit if it succeeds and reopens it if it fails.
+
+The timeout handed out is ``timeout_multiplier`` times the p99 latency of
+recent successful calls, clamped to ``[min_timeout, max_timeout]``. Until
+there are enough samples it is ``max_timeout``.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+import httpx
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit open for {name}")
+        self.name = name
+
+
+def _is_upstream_failure(exc: BaseException) -> bool:
+    # 4xx responses and parse errors mean the upstream answered; only
+    # transport errors, timeouts and 5xx count against its health.
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, (httpx.TransportError, TimeoutError))
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        max_timeout: float,
+        min_timeout: float = 0.5,
+        slow_call_seconds: float | None = None,
+        error_threshold: float = 0.5,
+        min_calls: int = 10,
+        window_seconds: float = 60.0,
+        window_size: int = 200,
+        open_seconds: float = 30.0,
+        timeout_multiplier: float = 2.0
+    ):
+        self.name = name
+        self.max_timeout = max_timeout
+        self.min_timeout = min_timeout
+        self.slow_call_seconds = slow_call_seconds or max_timeout / 2
+        self.error_threshold = error_threshold
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.timeout_multiplier = timeout_multiplier
+
+        # (finished_at, ok, latency) per call, newest last.
+        self._calls: deque[tuple[float, bool, float]] = deque(maxlen=window_size)
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def _prune(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def timeout(self) -> float:
+        """Timeout for the next call, from recent successful latencies."""
+        self._prune(time.monotonic())
+        latencies = [latency for _, ok, latency in self._calls if ok]
+        if len(latencies) < self.min_calls:
+            return self.max_timeout
+        adaptive = _percentile(latencies, 0.99) * self.timeout_multiplier
+        return min(max(adaptive, self.min_timeout), self.max_timeout)
+
+    def before_call(self) -> float:
+        """Admit a call or raise ``CircuitOpenError``; returns its timeout."""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                raise CircuitOpenError(self.name)
+            self._transition(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            if self._probe_in_flight:
+                raise CircuitOpenError(self.name)
+            self._probe_in_flight = True
+            # The probe gets the full budget: the window says nothing about now.
+            return self.max_timeout
+
+        return self.timeout()
+
+    def record(self, ok: bool, latency: float):
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+            if ok:
+                self._calls.clear()
+                self._calls.append((now, True, latency))
+                self._transition(CLOSED)
+            else:
+                self._open(now)
+            return
+
+        self._calls.append((now, ok, latency))
+        self._prune(now)
+        if self.state == CLOSED and self._should_open():
+            self._open(now)
+
+    def _should_open(self) -> bool:
+        if len(self._calls) < self.min_calls:
+            return False
+        failures = sum(1 for _, ok, _ in self._calls if not ok)
+        slow = sum(1 for _, ok, latency in self._calls if ok and latency >= self.slow_call_seconds)
+        return (
+            failures / len(self._calls) >= self.error_threshold
+            or slow / len(self._calls) >= self.error_threshold
+        )
+
+    def _open(self, now: float):
+        self._opened_at = now
+        self._transition(OPEN)
+
+    def _transition(self, state: str):
+        if state != self.state:
+            print(f"Circuit {self.name}: {self.state} -> {state}")
+            self.state = state
+
+    @asynccontextmanager
+    async def guard(self):
+        timeout = self.before_call()
+        started = time.monotonic()
+        try:
+            yield timeout
+        except asyncio.CancelledError:
+            # Says nothing about the upstream; just free the probe slot.
+            self._probe_in_flight = False
+            raise
+        except Exception as e:
+            self.record(not _is_upstream_failure(e), time.monotonic() - started)
+            raise
+        self.record(True, time.monotonic() - started)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        self._prune(now)
+        latencies = [latency for _, ok, latency in self._calls if ok]
+        failures = sum(1 for _, ok, _ in self._calls if not ok)
+        return {
+            "state": self.state,
+            "calls": len(self._calls),
+            "error_rate": round(failures / len(self._calls), 3) if self._calls else 0.0,
+            "p50_ms": round(_percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+            "timeout_seconds": round(self.timeout(), 3),
+            "retry_in_seconds": (
+                round(max(self.open_seconds - (now - self._opened_at), 0.0), 1)
+                if self.state == OPEN else None
+            )
+        }
+
+    def reset(self):
+        self._calls.clear()
+        self.state = CLOSED
+        self._probe_in_flight = False
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def circuit_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """The process-wide breaker for ``name``, created on first use."""
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name, **kwargs)
+    return _breakers[name]
+
+
+def circuit_states() -> dict[str, dict]:
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
+
+
+def reset_circuits():
+    for breaker in _breakers.values():
+        breaker.reset()
@@ -0,0 +1,78 @@
+"""In-memory pre-check for client-supplied analytics event ids.
+
+The unique index on ``analytics_events.event_id`` is what actually keeps
+duplicates out: events are inserted with ``ON CONFLICT DO NOTHING``, so a
+new event costs the same single INSERT as before. This Bloom filter sits
+in front of it and remembers the ids this worker logged over roughly the
+last ``ANALYTICS_DEDUP_WINDOW_SECONDS``. A retry it recognises is
+confirmed with one indexed lookup and answered without repeating the
+geo lookup, PII redaction or write. A false positive only costs that
+lookup, never a dropped event.
+
+The window is covered by two generations of ``window / 2`` seconds each.
+Ids go into the current generation, and lookups check both. When the
+current generation is older than half the window, it becomes the
+previous one and the old previous one is dropped.
+"""
+import hashlib
+import math
+import os
+import time
+
+WINDOW_SECONDS = float(os.getenv("ANALYTICS_DEDUP_WINDOW_SECONDS", "3600"))
+# Expected ids per generation; past it the false positive rate climbs.
+CAPACITY = int(os.getenv("ANALYTICS_DEDUP_CAPACITY", "100000"))
+ERROR_RATE = 0.001
+
+
+class WindowedBloomFilter:
+    def __init__(self, capacity: int = CAPACITY, error_rate: float = ERROR_RATE,
+                 window: float = WINDOW_SECONDS):
+        self.bits = max(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.bits / capacity * math.log(2)), 1)
+        self.window = window
+        self._current = bytearray((self.bits + 7) // 8)
+        self._previous = bytearray(len(self._current))
+        self._rotated_at = time.monotonic()
+
+    def _rotate(self):
+        now = time.monotonic()
+        elapsed = now - self._rotated_at
+        if elapsed < self.window / 2:
+            return
+        if elapsed >= self.window:
+            # Idle for a whole window: both generations have expired.
+            self._previous = bytearray(len(self._current))
+        else:
+            self._previous = self._current
+        self._current = bytearray(len(self._previous))
+        self._rotated_at = now
+
+    def _positions(self, key: str):
+        # Kirsch-Mitzenmacher: k positions from two halves of one digest.
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    @staticmethod
+    def _has(bits: bytearray, positions) -> bool:
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def __contains__(self, key: str) -> bool:
+        self._rotate()
+        positions = self._positions(key)
+        return self._has(self._current, positions) or self._has(self._previous, positions)
+
+    def add(self, key: str):
+        self._rotate()
+        for p in self._positions(key):
+            self._current[p >> 3] |= 1 << (p & 7)
+
+    def clear(self):
+        self._current = bytearray(len(self._current))
+        self._previous = bytearray(len(self._current))
+        self._rotated_at = time.monotonic()
+
+
+seen_events = WindowedBloomFilter()
@@ -1,4 +1,8 @@
 import httpx
+from app.services.circuit_breaker import circuit_breaker
+from app.utils.metrics import span
+
+GEO_BREAKER = circuit_breaker("ip-api.com", max_timeout=5.0, min_timeout=0.3)
 
 
 async def get_location_from_ip(ip_address: str) -> dict:
@@ -6,18 +10,20 @@ async def get_location_from_ip(ip_address: str) -> dict:
         return {"country": "Unknown", "city": "Unknown", "region": "Unknown"}
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"http://ip-api.com/json/{ip_address}", timeout=5.0)
-            
-            if response.status_code == 200:
-                data = response.json()
+        # An open circuit raises straight into the Unknown fallback below.
+        with span("geo_lookup"):
+            async with httpx.AsyncClient() as client, GEO_BREAKER.guard() as timeout:
+                response = await client.get(f"http://ip-api.com/json/{ip_address}", timeout=timeout)
                 
-                if data.get("status") == "success":
-                    return {
-                        "country": data.get("country", "Unknown"),
-                        "city": data.get("city", "Unknown"),
-                        "region": f"{data.get('city', 'Unknown')}, {data.get('country', 'Unknown')}"
-                    }
+                if response.status_code == 200:
+                    data = response.json()
+                    
+                    if data.get("status") == "success":
+                        return {
+                            "country": data.get("country", "Unknown"),
+                            "city": data.get("city", "Unknown"),
+                            "region": f"{data.get('city', 'Unknown')}, {data.get('country', 'Unknown')}"
+                        }
     except Exception as e:
         pass
     
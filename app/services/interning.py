@@ -0,0 +1,77 @@
+"""Per-process cache of dictionary ids for analytics ingest.
+
+``analytics_events`` stores domains, regions and categories as ids into
+small lookup tables. Ingest turns each value into its id with ``id_for``.
+A known value costs nothing. A new one costs an ``INSERT ... ON CONFLICT
+DO NOTHING`` followed by a ``SELECT``, so concurrent workers interning the
+same value agree on one id.
+
+An id is only cached once the transaction that created it has committed.
+If the caller rolls back, a row inserted by that transaction is gone, and
+caching its id would leave later events pointing at nothing.
+"""
+import os
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.database import upsert
+from app.models import AnalyticsCategory, AnalyticsDomain, AnalyticsRegion
+
+CACHE_SIZE = int(os.getenv("ANALYTICS_INTERN_CACHE_SIZE", "50000"))
+
+_PENDING = "interned_ids"
+
+
+class InternCache:
+    def __init__(self, model, max_size: int = CACHE_SIZE):
+        self.model = model
+        self.max_size = max_size
+        self._ids: dict[str, int] = {}
+
+    def get(self, name: str) -> int | None:
+        return self._ids.get(name)
+
+    def remember(self, name: str, id_: int):
+        if name not in self._ids and len(self._ids) >= self.max_size:
+            # Dicts keep insertion order: drop the oldest entry.
+            del self._ids[next(iter(self._ids))]
+        self._ids[name] = id_
+
+    def clear(self):
+        self._ids.clear()
+
+    async def id_for(self, db: AsyncSession, name: str | None) -> int | None:
+        if name is None:
+            return None
+        cached = self._ids.get(name)
+        if cached is not None:
+            return cached
+
+        await db.execute(upsert(
+            db, self.model, {"name": name}, index_elements=["name"], update_columns=[]
+        ))
+        result = await db.execute(select(self.model.id).where(self.model.name == name))
+        id_ = result.scalar_one()
+        db.sync_session.info.setdefault(_PENDING, []).append((self, name, id_))
+        return id_
+
+
+@event.listens_for(Session, "after_commit")
+def _promote(session):
+    for cache, name, id_ in session.info.pop(_PENDING, ()):
+        cache.remember(name, id_)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop(_PENDING, None)
+
+
+domains = InternCache(AnalyticsDomain)
+regions = InternCache(AnalyticsRegion)
+categories = InternCache(AnalyticsCategory)
+
+
+def clear_all():
+    for cache in (domains, regions, categories):
+        cache.clear()
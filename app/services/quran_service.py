@@ -1,8 +1,41 @@
+import asyncio
+import os
 import httpx
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urljoin
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func
+from app.database import get_sessionmaker, upsert
 from app.models import ReminderCache
+from app.services.audio_cache import audio_cache
+from app.services.circuit_breaker import circuit_breaker
+from app.services.shared_cache import shared_cache
+from app.services.translations import (
+    DEFAULT_LANG, LANGS, alquran_cloud_editions, quran_com_ids, resolve_lang
+)
+from app.utils.metrics import CACHE_LOOKUPS, span
+
+
+MAX_CONCURRENT_FETCHES = 8
+ARABIC_EDITION = "quran-uthmani"
+# Mishary Rashid Alafasy on both upstreams.
+QURAN_COM_RECITATION = int(os.getenv("QURAN_RECITATION_ID", "7"))
+QURAN_COM_AUDIO_BASE = "https://verses.quran.com/"
+ALQURAN_CLOUD_RECITATION = "ar.alafasy"
+
+QURAN_COM_BREAKER = circuit_breaker("quran.com", max_timeout=10.0)
+ALQURAN_CLOUD_BREAKER = circuit_breaker("alquran.cloud", max_timeout=10.0)
+
+# Cached ayahs are served as-is until SOFT_TTL, served while a background
+# refresh runs until HARD_TTL, and refetched before serving after that. An
+# entry of any age is still served when the upstreams are down.
+SOFT_TTL = timedelta(seconds=int(os.getenv("AYAH_CACHE_SOFT_TTL", str(7 * 86400))))
+HARD_TTL = timedelta(seconds=int(os.getenv("AYAH_CACHE_HARD_TTL", str(30 * 86400))))
+
+FRESH, STALE, EXPIRED, MISS = "fresh", "stale", "expired", "miss"
+
+_refreshing: set[str] = set()
+_refresh_tasks: set[asyncio.Task] = set()
 
 
 class QuranService:
@@ -14,41 +47,179 @@ class QuranService:
         self, 
         reference: str, 
         lang: str = "en",
-        db: AsyncSession | None = None
+        db: AsyncSession | None = None,
+        read_db: AsyncSession | None = None
     ) -> dict | None:
-        if db:
-            cached = await self._get_from_cache(reference, lang, db)
+        ayah_data, _ = await self.get_ayah_entry(reference, lang, db, read_db)
+        return ayah_data
+    
+    async def get_ayah_entry(
+        self,
+        reference: str,
+        lang: str = "en",
+        db: AsyncSession | None = None,
+        read_db: AsyncSession | None = None
+    ) -> tuple[dict | None, datetime | None]:
+        """Like ``get_ayah``, also returning when the ayah was last fetched upstream.
+
+        The timestamp is ``None`` when the ayah could not be cached.
+        """
+        lang = resolve_lang(lang)
+        
+        cached = None
+        freshness = MISS
+        if read_db or db:
+            cached = await self._get_from_cache(reference, read_db or db)
             if cached:
-                return cached
+                entry, last_fetched = cached
+                freshness = _freshness(entry, last_fetched, lang)
+            CACHE_LOOKUPS.inc("ayah", freshness)
         
-        ayah_data = await self._fetch_from_api(reference, lang)
+        if freshness in (FRESH, STALE):
+            if freshness == STALE:
+                self.refresh_in_background([reference])
+            return _for_lang(entry, lang), last_fetched
         
-        if db and ayah_data:
-            await self._save_to_cache(reference, lang, ayah_data, db)
+        fetched = await self._fetch_from_api(reference)
+        if not fetched:
+            # Upstream outage: an expired copy still beats a 502.
+            if cached:
+                return _for_lang(entry, lang), last_fetched
+            return None, None
         
-        return ayah_data
+        last_fetched = None
+        if db:
+            last_fetched = await self._save_to_cache(reference, fetched, db)
+        
+        return _for_lang(fetched, lang), last_fetched
+    
+    async def get_ayahs(
+        self,
+        references: list[str],
+        lang: str = "en",
+        db: AsyncSession | None = None,
+        read_db: AsyncSession | None = None
+    ) -> dict[str, dict | None]:
+        """Fetch several ayahs: one cache query, then concurrent upstream fills.
+
+        Returns a dict keyed by reference; references the upstream APIs could
+        not supply and that have no cached copy map to ``None``.
+        """
+        lang = resolve_lang(lang)
+        references = list(dict.fromkeys(references))
+        cached = {}
+        if references and (read_db or db):
+            cached = await self._get_many_from_cache(references, read_db or db)
+        
+        ayahs = {}
+        stale = []
+        for reference, (entry, last_fetched) in cached.items():
+            freshness = _freshness(entry, last_fetched, lang)
+            CACHE_LOOKUPS.inc("ayah", freshness)
+            if freshness != EXPIRED:
+                ayahs[reference] = _for_lang(entry, lang)
+                if freshness == STALE:
+                    stale.append(reference)
+        if references and (read_db or db):
+            CACHE_LOOKUPS.inc("ayah", MISS, amount=len(references) - len(cached))
+        if stale:
+            self.refresh_in_background(stale)
+        
+        missing = [r for r in references if r not in ayahs]
+        if missing:
+            fetched = await self._fetch_many_from_api(missing)
+            
+            if db and fetched:
+                await self._save_many_to_cache(fetched, db)
+            
+            ayahs.update({r: _for_lang(entry, lang) for r, entry in fetched.items()})
+            ayahs.update({
+                r: _for_lang(cached[r][0], lang)
+                for r in missing if r not in fetched and r in cached
+            })
+        
+        return {r: ayahs.get(r) for r in references}
+    
+    def refresh_in_background(self, references: list[str]):
+        """Refetch stale cache entries after the response has been sent."""
+        references = [r for r in references if r not in _refreshing]
+        if not references:
+            return
+        _refreshing.update(references)
+        task = asyncio.get_running_loop().create_task(self._refresh(references))
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+    
+    async def _refresh(self, references: list[str]):
+        try:
+            fetched = await self._fetch_many_from_api(references)
+            if fetched:
+                # The request's session is closed by now; use our own.
+                async with get_sessionmaker()() as db:
+                    await self._save_many_to_cache(fetched, db)
+        except Exception as e:
+            print(f"Background refresh error: {e}")
+        finally:
+            _refreshing.difference_update(references)
+    
+    async def _fetch_many_from_api(self, references: list[str]) -> dict[str, dict]:
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+        
+        async def _fetch(reference):
+            async with semaphore:
+                return await self._fetch_from_api(reference)
+        
+        fetched = await asyncio.gather(*(_fetch(r) for r in references))
+        return {r: entry for r, entry in zip(references, fetched) if entry}
+    
+    async def _get_many_from_cache(
+        self,
+        references: list[str],
+        db: AsyncSession
+    ) -> dict[str, tuple[dict, datetime]]:
+        found = {}
+        snapshot = shared_cache.snapshot()
+        if snapshot is not None:
+            for reference in references:
+                shared = snapshot.ayah(reference)
+                if shared:
+                    found[reference] = shared
+            references = [r for r in references if r not in found]
+            if not references:
+                return found
+        
+        try:
+            stmt = select(ReminderCache).where(ReminderCache.reference.in_(references))
+            with span("ayah_cache_lookup"):
+                result = await db.execute(stmt)
+            found.update({
+                cached.reference: (_cached_entry(cached), cached.last_fetched)
+                for cached in result.scalars()
+            })
+        except Exception as e:
+            print(f"Cache retrieval error: {e}")
+        
+        return found
     
     async def _get_from_cache(
         self, 
         reference: str, 
-        lang: str,
         db: AsyncSession
-    ) -> dict | None:
+    ) -> tuple[dict, datetime] | None:
+        snapshot = shared_cache.snapshot()
+        if snapshot is not None:
+            shared = snapshot.ayah(reference)
+            if shared:
+                return shared
+        
         try:
-            stmt = select(ReminderCache).where(
-                ReminderCache.reference == reference,
-                ReminderCache.lang == lang
-            )
-            result = await db.execute(stmt)
+            stmt = select(ReminderCache).where(ReminderCache.reference == reference)
+            with span("ayah_cache_lookup"):
+                result = await db.execute(stmt)
             cached = result.scalar_one_or_none()
             
             if cached:
-                return {
-                    "verse_text": cached.verse_text,
-                    "translation": cached.translation,
-                    "audio_url": cached.audio_url,
-                    "reference": reference
-                }
+                return _cached_entry(cached), cached.last_fetched
         except Exception as e:
             print(f"Cache retrieval error: {e}")
         
@@ -57,49 +228,51 @@ class QuranService:
     async def _save_to_cache(
         self,
         reference: str,
-        lang: str,
-        ayah_data: dict,
+        entry: dict,
+        db: AsyncSession
+    ) -> datetime | None:
+        try:
+            result = await db.execute(upsert(
+                db, ReminderCache, _cache_row(reference, entry), index_elements=["reference"]
+            ).returning(ReminderCache.last_fetched))
+            last_fetched = result.scalar()
+            with span("db_commit"):
+                await db.commit()
+            return last_fetched
+        except Exception as e:
+            print(f"Cache save error: {e}")
+            await db.rollback()
+            return None
+    
+    async def _save_many_to_cache(
+        self,
+        entries: dict[str, dict],
         db: AsyncSession
     ):
         try:
-            stmt = select(ReminderCache).where(
-                ReminderCache.reference == reference,
-                ReminderCache.lang == lang
-            )
-            result = await db.execute(stmt)
-            existing = result.scalar_one_or_none()
-            
-            if existing:
-                existing.verse_text = ayah_data.get("verse_text", "")
-                existing.translation = ayah_data.get("translation", "")
-                existing.audio_url = ayah_data.get("audio_url", "")
-            else:
-                cache_entry = ReminderCache(
-                    reference=reference,
-                    verse_text=ayah_data.get("verse_text", ""),
-                    translation=ayah_data.get("translation", ""),
-                    audio_url=ayah_data.get("audio_url", ""),
-                    lang=lang
-                )
-                db.add(cache_entry)
-            
-            await db.commit()
+            await db.execute(upsert(db, ReminderCache, [
+                _cache_row(reference, entry) for reference, entry in entries.items()
+            ], index_elements=["reference"]))
+            with span("db_commit"):
+                await db.commit()
         except Exception as e:
             print(f"Cache save error: {e}")
             await db.rollback()
     
-    async def _fetch_from_api(self, reference: str, lang: str) -> dict | None:
+    async def _fetch_from_api(self, reference: str) -> dict | None:
         try:
-            return await self._fetch_from_quran_com(reference, lang)
+            with span("upstream.quran_com"):
+                return await self._fetch_from_quran_com(reference)
         except Exception as e:
             print(f"Quran.com API error: {e}")
             try:
-                return await self._fetch_from_alquran_cloud(reference, lang)
+                with span("upstream.alquran_cloud"):
+                    return await self._fetch_from_alquran_cloud(reference)
             except Exception as e2:
                 print(f"AlQuran.cloud API error: {e2}")
                 return None
     
-    async def _fetch_from_quran_com(self, reference: str, lang: str) -> dict:
+    async def _fetch_from_quran_com(self, reference: str) -> dict:
         parts = reference.split(":")
         if len(parts) != 2:
             raise ValueError(f"Invalid reference format: {reference}")
@@ -112,33 +285,40 @@ class QuranService:
         else:
             ayah_number = ayah_range
         
-        async with httpx.AsyncClient() as client:
+        resource_langs = quran_com_ids()
+        
+        async with httpx.AsyncClient() as client, QURAN_COM_BREAKER.guard() as timeout:
             verse_response = await client.get(
                 f"{self.quran_foundation_api}/verses/by_key/{surah}:{ayah_number}",
-                params={"language": lang, "words": "false", "translations": "131"},
-                timeout=10.0
+                params={
+                    "words": "false",
+                    "translations": ",".join(str(i) for i in resource_langs),
+                    "audio": QURAN_COM_RECITATION
+                },
+                timeout=timeout
             )
             verse_response.raise_for_status()
             verse_data = verse_response.json()
             
-            verse_text = verse_data.get("verse", {}).get("text_uthmani", "")
-            translation = ""
-            
-            if "verse" in verse_data and "translations" in verse_data["verse"]:
-                translations = verse_data["verse"]["translations"]
-                if translations and len(translations) > 0:
-                    translation = translations[0].get("text", "")
-            
-            audio_url = verse_data.get("verse", {}).get("audio", {}).get("url", "")
+            verse = verse_data.get("verse", {})
+            # Quran.com returns recitation paths relative to its audio host.
+            audio_url = (verse.get("audio") or {}).get("url") or ""
+            if audio_url:
+                audio_url = urljoin(QURAN_COM_AUDIO_BASE, audio_url)
+            translations = {lang: "" for lang in LANGS}
+            for translation in verse.get("translations") or []:
+                lang = resource_langs.get(translation.get("resource_id"))
+                if lang:
+                    translations[lang] = translation.get("text", "")
             
             return {
-                "verse_text": verse_text,
-                "translation": translation,
+                "verse_text": verse.get("text_uthmani", ""),
+                "translations": translations,
                 "audio_url": audio_url,
                 "reference": reference
             }
     
-    async def _fetch_from_alquran_cloud(self, reference: str, lang: str) -> dict:
+    async def _fetch_from_alquran_cloud(self, reference: str) -> dict:
         parts = reference.split(":")
         if len(parts) != 2:
             raise ValueError(f"Invalid reference format: {reference}")
@@ -151,27 +331,82 @@ class QuranService:
         else:
             ayah_number = ayah_range
         
-        async with httpx.AsyncClient() as client:
-            arabic_response = await client.get(
-                f"{self.fallback_api}/ayah/{surah}:{ayah_number}",
-                timeout=10.0
-            )
-            arabic_response.raise_for_status()
-            arabic_data = arabic_response.json()
-            
-            english_response = await client.get(
-                f"{self.fallback_api}/ayah/{surah}:{ayah_number}/en.asad",
-                timeout=10.0
+        edition_langs = alquran_cloud_editions()
+        editions = [ARABIC_EDITION, ALQURAN_CLOUD_RECITATION, *edition_langs]
+        
+        async with httpx.AsyncClient() as client, ALQURAN_CLOUD_BREAKER.guard() as timeout:
+            response = await client.get(
+                f"{self.fallback_api}/ayah/{surah}:{ayah_number}/editions/{','.join(editions)}",
+                timeout=timeout
             )
-            english_data = english_response.json() if english_response.status_code == 200 else {}
+            response.raise_for_status()
             
-            verse_text = arabic_data.get("data", {}).get("text", "")
-            translation = english_data.get("data", {}).get("text", "")
+            verse_text = ""
             audio_url = ""
+            translations = {lang: "" for lang in LANGS}
+            for edition in response.json().get("data") or []:
+                identifier = edition.get("edition", {}).get("identifier")
+                if identifier == ARABIC_EDITION:
+                    verse_text = edition.get("text", "")
+                elif identifier == ALQURAN_CLOUD_RECITATION:
+                    audio_url = edition.get("audio") or ""
+                elif identifier in edition_langs:
+                    translations[edition_langs[identifier]] = edition.get("text", "")
+            
+            if not verse_text:
+                raise ValueError(f"No Arabic text for {reference}")
             
             return {
                 "verse_text": verse_text,
-                "translation": translation,
+                "translations": translations,
                 "audio_url": audio_url,
                 "reference": reference
             }
+
+
+async def wait_for_refreshes():
+    """Wait for running background refreshes (used by tests and shutdown)."""
+    while _refresh_tasks:
+        await asyncio.gather(*_refresh_tasks, return_exceptions=True)
+
+
+def _freshness(entry: dict, last_fetched: datetime | None, lang: str) -> str:
+    # Rows cached before ``lang`` was configured must be refetched to serve it.
+    if lang not in entry["translations"] or last_fetched is None:
+        return EXPIRED
+    if last_fetched.tzinfo is None:
+        # SQLite hands back CURRENT_TIMESTAMP as naive UTC.
+        last_fetched = last_fetched.replace(tzinfo=timezone.utc)
+    age = datetime.now(timezone.utc) - last_fetched
+    if age < SOFT_TTL:
+        return FRESH
+    return STALE if age < HARD_TTL else EXPIRED
+
+
+def _for_lang(entry: dict, lang: str) -> dict:
+    translations = entry["translations"]
+    return {
+        "verse_text": entry["verse_text"],
+        "translation": translations.get(lang) or translations.get(DEFAULT_LANG, ""),
+        "audio_url": audio_cache.url_for(entry["audio_url"] or ""),
+        "reference": entry["reference"]
+    }
+
+
+def _cached_entry(cached: ReminderCache) -> dict:
+    return {
+        "verse_text": cached.verse_text,
+        "translations": cached.translations or {},
+        "audio_url": cached.audio_url,
+        "reference": cached.reference
+    }
+
+
+def _cache_row(reference: str, entry: dict) -> dict:
+    return {
+        "reference": reference,
+        "verse_text": entry.get("verse_text", ""),
+        "translations": entry.get("translations", {}),
+        "audio_url": entry.get("audio_url", ""),
+        "last_fetched": func.now()
+    }
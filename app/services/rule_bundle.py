@@ -0,0 +1,298 @@
+"""Compact binary rule bundle for client-side matching.
+
+The bundle lets the extension answer "does this page match a rule?" locally
+and only call ``/reminder`` on a hit. All integers are little-endian and
+every section starts on a 4-byte boundary::
+
+    header        HEADER struct (see below)
+    string index  (string_count + 1) x u32 offsets into string data; string
+                  ``i`` spans ``[index[i], index[i + 1])``
+    string data   UTF-8 bytes of every label, path, category and reference
+    nodes         node_count x NODE struct, breadth-first
+    rules         rule_count x RULE struct
+    bloom         ceil(bloom_bits / 8) bytes
+
+Domains are stored in a trie keyed by reversed labels (``com`` ->
+``youtube``), so a lookup walks one node per label. A node's children are
+contiguous and sorted by label bytes for binary search, and its rules are
+contiguous with path rules first (sorted by path) and domain-wide rules
+last. Matching mirrors ``/reminder``: the domain must equal a rule's domain,
+a rule whose path equals the page path wins, and otherwise the domain-wide
+rule applies. ``FLAG_EXACT_PATH`` records that path patterns are compared
+exactly rather than as prefixes.
+
+The Bloom filter holds every rule domain. Bit ``i`` of the filter is
+``bloom[i >> 3] & (1 << (i & 7))``; a domain's bits are
+``(h1 + j * h2) % bloom_bits`` for ``j`` in ``range(bloom_hashes)`` with
+``h1 = mix32(fnv1a32(domain))`` and ``h2 = mix32(fnv1a32(domain + b"\\x01")) | 1``,
+where ``mix32`` is the MurmurHash3 finalizer (FNV-1a alone spreads short,
+similar strings poorly across the low bits).
+"""
+import asyncio
+import gzip
+import hashlib
+import math
+import struct
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.rules_cache import RULE_COLUMNS
+from app.utils.http_cache import choose_encoding
+
+MAGIC = b"DHRB"
+FORMAT_VERSION = 1
+FLAG_EXACT_PATH = 0x1
+NO_PATH = 0xFFFFFFFF
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+
+HEADER = struct.Struct("<4sHHIIIIIIIIIII")
+NODE = struct.Struct("<IIIII")    # label, first_child, child_count, rule_start, rule_count
+RULE = struct.Struct("<IIII")     # rule_id, path (or NO_PATH), category, reference
+U32 = struct.Struct("<I")
+
+MEDIA_TYPE = "application/vnd.dhikr.rule-bundle"
+
+
+def fnv1a32(data: bytes) -> int:
+    h = 0x811C9DC5
+    for byte in data:
+        h = ((h ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return h
+
+
+def mix32(h: int) -> int:
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & 0xFFFFFFFF
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & 0xFFFFFFFF
+    h ^= h >> 16
+    return h
+
+
+def _bloom_positions(domain: bytes, bits: int, hashes: int):
+    h1 = mix32(fnv1a32(domain))
+    h2 = mix32(fnv1a32(domain + b"\x01")) | 1
+    return [(h1 + j * h2) % bits for j in range(hashes)]
+
+
+def _align(buffer: bytearray):
+    buffer.extend(b"\x00" * (-len(buffer) % 4))
+
+
+def compile_bundle(rules: list[dict], rules_version: int) -> bytes:
+    """Compile rule dicts (as returned by /rules) into bundle bytes."""
+    strings = {}
+
+    def intern(value: str) -> int:
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    root = {"children": {}, "rules": []}
+    domains = set()
+    for rule in rules:
+        node = root
+        for label in reversed(rule["domain_pattern"].split(".")):
+            node = node["children"].setdefault(label, {"children": {}, "rules": []})
+        node["rules"].append(rule)
+        domains.add(rule["domain_pattern"])
+
+    nodes = []
+    ordered_rules = []
+    queue = [("", root)]
+    while queue:
+        next_queue = []
+        for label, node in queue:
+            children = sorted(node["children"].items(), key=lambda item: item[0].encode("utf-8"))
+            node_rules = sorted(
+                node["rules"],
+                key=lambda r: (r["path_pattern"] is None, r["path_pattern"] or "", r["id"])
+            )
+            nodes.append([intern(label), 0, len(children), len(ordered_rules), len(node_rules)])
+            ordered_rules.extend(node_rules)
+            next_queue.extend(children)
+        queue = next_queue
+
+    # Breadth-first order makes each node's children a contiguous run; fill
+    # in where each run starts now that every node has an index.
+    next_index = 1
+    for node in nodes:
+        node[1] = next_index
+        next_index += node[2]
+
+    rule_records = [
+        (
+            rule["id"],
+            intern(rule["path_pattern"]) if rule["path_pattern"] is not None else NO_PATH,
+            intern(rule["category_key"]),
+            intern(rule["reference"])
+        )
+        for rule in ordered_rules
+    ]
+
+    bloom_bits = max(64, math.ceil(-len(domains) * math.log(BLOOM_FALSE_POSITIVE_RATE) / math.log(2) ** 2))
+    bloom_bits += -bloom_bits % 8
+    bloom_hashes = max(1, min(16, round(bloom_bits / max(len(domains), 1) * math.log(2))))
+    bloom = bytearray(bloom_bits // 8)
+    for domain in domains:
+        for bit in _bloom_positions(domain.encode("utf-8"), bloom_bits, bloom_hashes):
+            bloom[bit >> 3] |= 1 << (bit & 7)
+
+    out = bytearray(HEADER.size)
+
+    string_index_offset = len(out)
+    encoded = [s.encode("utf-8") for s in strings]
+    offset = 0
+    out += U32.pack(offset)
+    for value in encoded:
+        offset += len(value)
+        out += U32.pack(offset)
+
+    string_data_offset = len(out)
+    out += b"".join(encoded)
+    _align(out)
+
+    nodes_offset = len(out)
+    for node in nodes:
+        out += NODE.pack(*node)
+
+    rules_offset = len(out)
+    for record in rule_records:
+        out += RULE.pack(*record)
+
+    bloom_offset = len(out)
+    out += bloom
+
+    HEADER.pack_into(
+        out, 0,
+        MAGIC, FORMAT_VERSION, FLAG_EXACT_PATH, rules_version,
+        len(strings), len(nodes), len(rule_records), bloom_bits, bloom_hashes,
+        string_index_offset, string_data_offset, nodes_offset, rules_offset, bloom_offset
+    )
+    return bytes(out)
+
+
+class RuleBundle:
+    """Reference reader that matches directly against bundle bytes.
+
+    Works on any buffer (bytes, memoryview, mmap) without copying it; the
+    extension's matcher follows the same steps.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        (
+            magic, self.format_version, self.flags, self.rules_version,
+            self.string_count, self.node_count, self.rule_count,
+            self.bloom_bits, self.bloom_hashes,
+            self._string_index, self._string_data, self._nodes, self._rules, self._bloom
+        ) = HEADER.unpack_from(self.buffer, 0)
+
+        if magic != MAGIC:
+            raise ValueError("Not a rule bundle")
+        if self.format_version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported bundle format {self.format_version}")
+
+    def string(self, index: int) -> str:
+        return self._string_bytes(index).decode("utf-8")
+
+    def _string_bytes(self, index: int) -> bytes:
+        start, end = struct.unpack_from("<II", self.buffer, self._string_index + 4 * index)
+        return bytes(self.buffer[self._string_data + start:self._string_data + end])
+
+    def might_contain(self, domain: str) -> bool:
+        for bit in _bloom_positions(domain.encode("utf-8"), self.bloom_bits, self.bloom_hashes):
+            if not self.buffer[self._bloom + (bit >> 3)] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def _node(self, index: int) -> tuple:
+        return NODE.unpack_from(self.buffer, self._nodes + index * NODE.size)
+
+    def _find_child(self, node: tuple, label: bytes) -> tuple | None:
+        lo, hi = node[1], node[1] + node[2]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            child = self._node(mid)
+            child_label = self._string_bytes(child[0])
+            if child_label == label:
+                return child
+            if child_label < label:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def _rule(self, index: int) -> dict:
+        rule_id, path, category, reference = RULE.unpack_from(self.buffer, self._rules + index * RULE.size)
+        return {
+            "id": rule_id,
+            "path_pattern": None if path == NO_PATH else self.string(path),
+            "category_key": self.string(category),
+            "reference": self.string(reference)
+        }
+
+    def match(self, domain: str, path: str | None = None) -> dict | None:
+        if not domain or not self.might_contain(domain):
+            return None
+
+        node = self._node(0)
+        for label in reversed(domain.split(".")):
+            node = self._find_child(node, label.encode("utf-8"))
+            if node is None:
+                return None
+
+        path_bytes = path.encode("utf-8") if path else None
+        for index in range(node[3], node[3] + node[4]):
+            rule_path = RULE.unpack_from(self.buffer, self._rules + index * RULE.size)[1]
+            if rule_path == NO_PATH:
+                return {"domain_pattern": domain, **self._rule(index)}
+            if path_bytes is not None and self._string_bytes(rule_path) == path_bytes:
+                return {"domain_pattern": domain, **self._rule(index)}
+
+        return None
+
+
+class CompiledBundle:
+    def __init__(self, rules_version: int, data: bytes):
+        self.version = rules_version
+        self.data = data
+        self.hash = hashlib.sha256(data).hexdigest()
+        self.bodies = {"identity": data, "gzip": gzip.compress(data, compresslevel=6)}
+        # Each body is a different byte sequence, so each gets its own strong
+        # ETag; the gzip body bypasses the middleware that weakens them.
+        self.etags = {
+            encoding: f'"{self.hash[:32]}"' if encoding == "identity" else f'"{self.hash[:32]}-{encoding}"'
+            for encoding in self.bodies
+        }
+
+    def negotiate(self, accept_encoding: str | None) -> tuple[str, bytes]:
+        encoding = choose_encoding(accept_encoding, ["gzip"])
+        return encoding, self.bodies[encoding]
+
+
+class RuleBundleCache:
+    """Per-process compiled bundle, rebuilt only when the rules version moves."""
+
+    def __init__(self):
+        self.bundle: CompiledBundle | None = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, db: AsyncSession, version: int) -> CompiledBundle:
+        bundle = self.bundle
+        if bundle is not None and bundle.version == version:
+            return bundle
+
+        async with self._lock:
+            if self.bundle is None or self.bundle.version != version:
+                result = await db.execute(select(*RULE_COLUMNS))
+                rules = [dict(row._mapping) for row in result]
+                self.bundle = await asyncio.to_thread(
+                    lambda: CompiledBundle(version, compile_bundle(rules, version))
+                )
+            return self.bundle
+
+    def invalidate(self):
+        self.bundle = None
+
+
+rule_bundle = RuleBundleCache()
@@ -0,0 +1,330 @@
+import codecs
+import csv
+import json
+import re
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable
+from sqlalchemy import column, select, table, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import UPSERT_INSERTS, dialect_name
+from app.models import RULE_KEY, ReminderRule
+from app.services.rules_cache import next_rules_version, rules_version
+
+DEFAULT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+FIELD_ALIASES = {
+    "domain_pattern": "domain_pattern",
+    "domain": "domain_pattern",
+    "path_pattern": "path_pattern",
+    "path": "path_pattern",
+    "category_key": "category_key",
+    "category": "category_key",
+    "reference": "reference",
+}
+CSV_COLUMNS = ["domain_pattern", "path_pattern", "category_key", "reference"]
+COPY_COLUMNS = CSV_COLUMNS + ["version"]
+_STAGE_TABLE = "rule_import_stage"
+
+DOMAIN_RE = re.compile(r"^(?=.{1,253}$)([a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9])?\.)+[a-z0-9-]{2,63}$")
+REFERENCE_RE = re.compile(r"^\d{1,3}:\d{1,3}(?:-\d{1,3})?$")
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    chunks: int = 0
+    version: int | None = None
+    errors: list[dict] = field(default_factory=list)
+
+    def add_error(self, line: int, message: str):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "chunks": self.chunks,
+            "version": self.version,
+            "errors": self.errors,
+        }
+
+
+def validate_rule(row: dict, defaults: dict | None = None) -> dict:
+    """Normalize one imported rule, raising ValueError if it is unusable."""
+    defaults = defaults or {}
+    rule = {}
+    for key, value in row.items():
+        name = FIELD_ALIASES.get(str(key).strip().lower())
+        if name:
+            rule[name] = value.strip() if isinstance(value, str) else value
+
+    domain = (rule.get("domain_pattern") or "").lower().rstrip(".")
+    if not DOMAIN_RE.match(domain):
+        raise ValueError(f"Invalid domain: {rule.get('domain_pattern')!r}")
+
+    path = rule.get("path_pattern") or None
+    if path is not None and (not path.startswith("/") or len(path) > 255):
+        raise ValueError(f"Invalid path: {path!r}")
+
+    category = rule.get("category_key") or defaults.get("category_key")
+    if not category or len(category) > 50:
+        raise ValueError(f"Invalid category: {category!r}")
+
+    reference = rule.get("reference") or defaults.get("reference")
+    if not reference or not REFERENCE_RE.match(reference):
+        raise ValueError(f"Invalid reference: {reference!r}")
+
+    return {
+        "domain_pattern": domain,
+        "path_pattern": path,
+        "category_key": category,
+        "reference": reference,
+    }
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[list[str]]:
+    """Re-split a byte stream into batches of complete text lines."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        if lines:
+            yield lines
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield [pending]
+
+
+async def parse_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, dict]]:
+    """Yield ``(line_number, row)`` from CSV, with or without a header row.
+
+    Headerless files are read positionally as domain, path, category,
+    reference, so a plain one-domain-per-line blocklist is valid input.
+    """
+    columns = None
+    line_number = 0
+    async for lines in _iter_lines(chunks):
+        for values in csv.reader(lines):
+            line_number += 1
+            if not values or not values[0].strip() or values[0].lstrip().startswith("#"):
+                continue
+
+            if columns is None:
+                if values[0].strip().lower() in FIELD_ALIASES:
+                    columns = [v.strip().lower() for v in values]
+                    continue
+                columns = CSV_COLUMNS
+
+            yield line_number, dict(zip(columns, values))
+
+
+async def parse_json(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, dict]]:
+    """Yield ``(item_number, row)`` from a JSON array or newline-delimited JSON.
+
+    Array items are decoded incrementally as they arrive, so the whole
+    document is never held in memory.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    pos = 0
+    mode = None
+    item = 0
+    finished = False
+
+    async def _more() -> bool:
+        nonlocal buffer, pos, finished
+        if finished:
+            return False
+        try:
+            chunk = await chunk_iter.__anext__()
+        except StopAsyncIteration:
+            chunk, finished = b"", True
+        buffer = buffer[pos:] + text_decoder.decode(chunk, final=finished)
+        pos = 0
+        return True
+
+    chunk_iter = chunks.__aiter__()
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            if mode == "ndjson" and buffer[pos] == ",":
+                raise ValueError("Unexpected ',' in newline-delimited JSON")
+            pos += 1
+
+        if pos >= len(buffer):
+            if not await _more():
+                break
+            continue
+
+        if mode is None:
+            if buffer[pos] == "[":
+                mode = "array"
+                pos += 1
+            else:
+                mode = "ndjson"
+            continue
+
+        if mode == "array" and buffer[pos] == "]":
+            break
+
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if not await _more():
+                raise ValueError(f"Malformed JSON at item {item + 1}")
+            continue
+
+        pos = end
+        item += 1
+        if not isinstance(value, dict):
+            raise ValueError(f"Item {item} is not an object")
+        yield item, value
+
+
+async def import_rules(
+    db: AsyncSession,
+    rows: AsyncIterator[tuple[int, dict]],
+    defaults: dict | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    dry_run: bool = False,
+    on_progress: Callable[[ImportStats], None] | None = None
+) -> ImportStats:
+    """Validate, dedupe and upsert rules in chunks.
+
+    Rules are keyed by ``(domain_pattern, path_pattern)``: new keys are
+    inserted, existing keys get their category and reference updated, and
+    repeats of a key later in the same import are skipped. Each chunk is
+    committed on its own and reported through ``on_progress``.
+    """
+    stats = ImportStats()
+
+    existing = {}
+    result = await db.stream(select(
+        ReminderRule.id,
+        ReminderRule.domain_pattern,
+        ReminderRule.path_pattern,
+        ReminderRule.category_key,
+        ReminderRule.reference
+    ).order_by(ReminderRule.id))
+    async for row in result:
+        existing.setdefault(
+            (row.domain_pattern, row.path_pattern),
+            (row.id, row.category_key, row.reference)
+        )
+
+    seen = set()
+    inserts = []
+    updates = []
+
+    async def _flush():
+        if not dry_run and (inserts or updates):
+            stats.version = await _write_chunk(db, inserts, updates)
+        stats.inserted += len(inserts)
+        stats.updated += len(updates)
+        stats.chunks += 1
+        inserts.clear()
+        updates.clear()
+        if on_progress:
+            on_progress(stats)
+
+    async for line, raw in rows:
+        stats.rows += 1
+        try:
+            rule = validate_rule(raw, defaults)
+        except ValueError as e:
+            stats.add_error(line, str(e))
+            continue
+
+        key = (rule["domain_pattern"], rule["path_pattern"])
+        if key in seen:
+            stats.duplicates += 1
+            continue
+        seen.add(key)
+
+        current = existing.get(key)
+        if current is None:
+            inserts.append(rule)
+        elif (current[1], current[2]) != (rule["category_key"], rule["reference"]):
+            updates.append({
+                "id": current[0],
+                "category_key": rule["category_key"],
+                "reference": rule["reference"]
+            })
+        else:
+            stats.unchanged += 1
+
+        if len(inserts) + len(updates) >= chunk_size:
+            await _flush()
+
+    if inserts or updates or stats.chunks == 0:
+        await _flush()
+
+    return stats
+
+
+async def _write_chunk(db: AsyncSession, inserts: list[dict], updates: list[dict]) -> int:
+    # Each chunk is its own rules version, so delta clients pick up a
+    # partially applied import as a sequence of consistent versions.
+    version = await next_rules_version(db)
+    for rule in inserts:
+        rule["version"] = version
+    for rule in updates:
+        rule["version"] = version
+
+    if inserts:
+        if dialect_name(db) == "postgresql":
+            await _copy_rules(db, inserts)
+        else:
+            await db.execute(_merge_rules(db), inserts)
+
+    if updates:
+        await db.execute(update(ReminderRule), updates)
+
+    await db.commit()
+    rules_version.observe(version)
+    return version
+
+
+def _merge_rules(db: AsyncSession, source=None):
+    """INSERT of new rules that updates a key written since the import read it."""
+    stmt = UPSERT_INSERTS[dialect_name(db)](ReminderRule)
+    if source is not None:
+        stmt = stmt.from_select(COPY_COLUMNS, source)
+    return stmt.on_conflict_do_update(
+        index_elements=RULE_KEY,
+        set_={c: stmt.excluded[c] for c in ("category_key", "reference", "version")}
+    )
+
+
+async def _copy_rules(db: AsyncSession, inserts: list[dict]):
+    # COPY can't resolve conflicts, so it fills a staging table that is
+    # merged into reminder_rules on the unique rule key.
+    await db.execute(text(
+        f"CREATE TEMP TABLE IF NOT EXISTS {_STAGE_TABLE} "
+        "(LIKE reminder_rules INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+    ))
+    conn = await db.connection()
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        _STAGE_TABLE,
+        records=[tuple(rule[c] for c in COPY_COLUMNS) for rule in inserts],
+        columns=COPY_COLUMNS
+    )
+    stage = table(_STAGE_TABLE, *(column(c) for c in COPY_COLUMNS))
+    await db.execute(_merge_rules(db, select(*(stage.c[c] for c in COPY_COLUMNS))))
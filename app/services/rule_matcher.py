@@ -0,0 +1,66 @@
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import ReminderRule
+from app.services.shared_cache import SharedRule, shared_cache
+from app.utils.metrics import span
+
+
+def _match_stmt(domains: list[str], paths: list[str]):
+    stmt = select(ReminderRule).where(ReminderRule.domain_pattern.in_(domains))
+
+    if paths:
+        stmt = stmt.where(
+            or_(
+                ReminderRule.path_pattern.in_(paths),
+                ReminderRule.path_pattern.is_(None)
+            )
+        )
+    else:
+        stmt = stmt.where(ReminderRule.path_pattern.is_(None))
+
+    # Path rules sort before domain-wide rules on every backend (Postgres
+    # would otherwise put the NULL domain-wide rule first).
+    return stmt.order_by(ReminderRule.path_pattern.is_(None), ReminderRule.id)
+
+
+async def match_rule(
+    db: AsyncSession,
+    domain: str,
+    path: str | None = None
+) -> ReminderRule | SharedRule | None:
+    """Return the rule for a page: an exact path rule, else the domain-wide rule."""
+    with span("rule_match"):
+        snapshot = shared_cache.snapshot()
+        if snapshot is not None:
+            return snapshot.match_rule(domain, path)
+        
+        result = await db.execute(_match_stmt([domain], [path] if path else []).limit(1))
+        return result.scalar_one_or_none()
+
+
+async def match_rules(
+    db: AsyncSession,
+    pages: list[tuple[str, str | None]]
+) -> list[ReminderRule | SharedRule | None]:
+    """Match many ``(domain, path)`` pairs with a single query, in input order."""
+    if not pages:
+        return []
+
+    snapshot = shared_cache.snapshot()
+    if snapshot is not None:
+        with span("rule_match"):
+            return [snapshot.match_rule(domain, path) for domain, path in pages]
+
+    domains = sorted({domain for domain, _ in pages})
+    paths = sorted({path for _, path in pages if path})
+    with span("rule_match"):
+        result = await db.execute(_match_stmt(domains, paths))
+
+    by_key = {}
+    for rule in result.scalars():
+        by_key.setdefault((rule.domain_pattern, rule.path_pattern), rule)
+
+    return [
+        (by_key.get((domain, path)) if path else None) or by_key.get((domain, None))
+        for domain, path in pages
+    ]
@@ -0,0 +1,134 @@
+import asyncio
+import gzip
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import on_replica
+from app.models import ReminderRule, RulesState
+from app.utils.http_cache import choose_encoding
+from app.utils.metrics import CACHE_LOOKUPS
+from app.utils.responses import dump_json
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RULE_COLUMNS = (
+    ReminderRule.id,
+    ReminderRule.domain_pattern,
+    ReminderRule.path_pattern,
+    ReminderRule.category_key,
+    ReminderRule.reference
+)
+
+
+def rules_etag(version: int) -> str:
+    return f'W/"rules-{version}"'
+
+
+class RulesVersionHint:
+    """Rules version pushed by the change listener (``app.services.change_listener``).
+
+    ``None`` whenever the listener is not connected, so callers read the
+    version from the database instead of trusting a value that may have
+    missed a notification.
+    """
+
+    def __init__(self):
+        self.version: int | None = None
+
+    def observe(self, version: int):
+        # Notifications and local writes may arrive out of order; never go back.
+        if self.version is not None and version > self.version:
+            self.version = version
+
+    def reset(self, version: int | None):
+        self.version = version
+
+
+rules_version = RulesVersionHint()
+
+
+async def read_rules_version(db: AsyncSession) -> int:
+    result = await db.execute(select(RulesState.version).where(RulesState.id == 1))
+    return result.scalar() or 0
+
+
+async def current_rules_version(db: AsyncSession) -> int:
+    """Version to serve rules from ``db`` under.
+
+    The pushed hint follows the primary, which a replica may not have
+    caught up with yet, so replica sessions read the version themselves.
+    Callers read it before the rule rows, so the rows are never older
+    than the version they are served (and cached) under.
+    """
+    if rules_version.version is not None and not on_replica(db):
+        return rules_version.version
+    return await read_rules_version(db)
+
+
+async def next_rules_version(db: AsyncSession) -> int:
+    """Claim the next rules version inside the caller's transaction.
+
+    The row lock on ``rules_state`` serializes concurrent rule writers, so
+    versions are handed out in commit order.
+    """
+    result = await db.execute(
+        update(RulesState)
+        .where(RulesState.id == 1)
+        .values(version=RulesState.version + 1)
+        .returning(RulesState.version)
+    )
+    return result.scalar_one()
+
+
+class RulesSnapshot:
+    """The full /rules response for one version, pre-serialized and pre-compressed."""
+
+    def __init__(self, version: int, rules: list[dict]):
+        self.version = version
+        self.count = len(rules)
+        self.etag = rules_etag(version)
+
+        body = dump_json({
+            "status": "success",
+            "message": f"Found {len(rules)} reminder rules",
+            "data": rules
+        })
+        self.bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=6)}
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(body, quality=5)
+
+    def negotiate(self, accept_encoding: str | None) -> tuple[str, bytes]:
+        encoding = choose_encoding(accept_encoding, [e for e in ("br", "gzip") if e in self.bodies])
+        return encoding, self.bodies[encoding]
+
+
+class RulesSnapshotCache:
+    """Per-process snapshot, rebuilt only when the rules version moves."""
+
+    def __init__(self):
+        self.snapshot: RulesSnapshot | None = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, db: AsyncSession, version: int) -> RulesSnapshot:
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.version == version:
+            CACHE_LOOKUPS.inc("rules_snapshot", "hit")
+            return snapshot
+        CACHE_LOOKUPS.inc("rules_snapshot", "miss")
+
+        async with self._lock:
+            if self.snapshot is None or self.snapshot.version != version:
+                result = await db.execute(select(*RULE_COLUMNS).order_by(ReminderRule.id))
+                rules = [dict(row._mapping) for row in result]
+                # Serializing and compressing tens of thousands of rules is
+                # CPU-bound; keep it off the event loop.
+                self.snapshot = await asyncio.to_thread(RulesSnapshot, version, rules)
+            return self.snapshot
+
+    def invalidate(self):
+        self.snapshot = None
+
+
+rules_snapshot = RulesSnapshotCache()
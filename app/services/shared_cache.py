@@ -0,0 +1,327 @@
+"""Host-wide, read-mostly snapshot of rules and cached ayahs in shared memory.
+
+Enabled by setting ``SHARED_CACHE_DIR`` (ideally on tmpfs, e.g.
+``/dev/shm/dhikr``). One process per host, the publisher, keeps the
+snapshot in step with the database. It is whichever worker holds
+``publisher.lock``, or a sidecar started with
+``python -m app.services.shared_cache``. Every worker maps the snapshot
+read-only. Rule matches are answered from the compiled rule bundle
+in place, and an ayah lookup decodes only that ayah's record. Anything
+missing from the snapshot falls back to the database as before.
+
+Files under the directory::
+
+    control              GENERATION struct, mapped by every process
+    snapshot-<gen>.bin   SNAPSHOT header, rule bundle, ayah index, ayah data
+
+A snapshot file is written under a temporary name and renamed into place
+before the generation in ``control`` is bumped. Readers compare their
+loaded generation against ``control`` on each lookup and remap when it
+moves, so a swap is atomic for them. Files older than the previous
+generation are unlinked; a reader still mapping one keeps valid memory
+until it remaps.
+
+With the Postgres change listener connected (``app.services.change_listener``)
+the publisher rebuilds as soon as a change is announced and only falls back
+to a slow ``SHARED_CACHE_RESYNC_SECONDS`` check, instead of polling every
+``SHARED_CACHE_POLL_SECONDS``.
+
+Rule matches carry the rules version of the snapshot as their ``version``,
+so reminder ETags change on any rule change while served from here.
+"""
+import asyncio
+import fcntl
+import mmap
+import os
+import struct
+from datetime import datetime
+from typing import NamedTuple
+from sqlalchemy import func, select
+from app.database import dispose_engines, get_sessionmaker
+from app.models import ReminderCache
+from app.services.rule_bundle import RuleBundle, compile_bundle
+from app.services.rules_cache import RULE_COLUMNS, current_rules_version
+from app.utils.responses import dump_json, load_json
+
+MAGIC = b"DHSC"
+FORMAT_VERSION = 1
+
+GENERATION = struct.Struct("<Q")
+# magic, format, rules_version, generation, bundle offset/length,
+# ayah count, ayah index offset, ayah data offset
+SNAPSHOT = struct.Struct("<4sHxxIQIIIII")
+AYAH = struct.Struct("<IIII")     # key offset, key length, value offset, value length
+
+POLL_SECONDS = float(os.getenv("SHARED_CACHE_POLL_SECONDS", "2"))
+RESYNC_SECONDS = float(os.getenv("SHARED_CACHE_RESYNC_SECONDS", "60"))
+
+
+class SharedRule(NamedTuple):
+    id: int
+    domain_pattern: str
+    path_pattern: str | None
+    category_key: str
+    reference: str
+    version: int
+
+
+def _align(buffer: bytearray):
+    buffer.extend(b"\x00" * (-len(buffer) % 8))
+
+
+def build_snapshot(generation: int, rules_version: int, rules: list[dict], ayahs: dict[str, dict]) -> bytes:
+    """Serialize rules and ayah cache entries (``reference -> entry``)."""
+    out = bytearray(SNAPSHOT.size)
+    _align(out)
+
+    bundle = compile_bundle(rules, rules_version)
+    bundle_offset = len(out)
+    out += bundle
+    _align(out)
+
+    keys = sorted(reference.encode("utf-8") for reference in ayahs)
+    data = bytearray()
+    records = []
+    for key in keys:
+        value = dump_json(ayahs[key.decode("utf-8")])
+        records.append((len(data), len(key), len(data) + len(key), len(value)))
+        data += key
+        data += value
+
+    index_offset = len(out)
+    for record in records:
+        out += AYAH.pack(*record)
+    data_offset = len(out)
+    out += data
+
+    SNAPSHOT.pack_into(
+        out, 0, MAGIC, FORMAT_VERSION, rules_version, generation,
+        bundle_offset, len(bundle), len(records), index_offset, data_offset
+    )
+    return bytes(out)
+
+
+class Snapshot:
+    """Read-only view over one snapshot buffer; nothing is copied up front."""
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        (
+            magic, format_version, self.rules_version, self.generation,
+            bundle_offset, bundle_length, self.ayah_count, self._index, self._data
+        ) = SNAPSHOT.unpack_from(self.buffer, 0)
+
+        if magic != MAGIC:
+            raise ValueError("Not a shared cache snapshot")
+        if format_version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {format_version}")
+
+        self.rules = RuleBundle(self.buffer[bundle_offset:bundle_offset + bundle_length])
+
+    def match_rule(self, domain: str, path: str | None = None) -> SharedRule | None:
+        rule = self.rules.match(domain, path)
+        if rule is None:
+            return None
+        return SharedRule(
+            rule["id"], rule["domain_pattern"], rule["path_pattern"],
+            rule["category_key"], rule["reference"], self.rules_version
+        )
+
+    def _key(self, index: int) -> tuple[bytes, tuple]:
+        record = AYAH.unpack_from(self.buffer, self._index + index * AYAH.size)
+        start = self._data + record[0]
+        return bytes(self.buffer[start:start + record[1]]), record
+
+    def ayah(self, reference: str) -> tuple[dict, datetime | None] | None:
+        """Cached entry and its ``last_fetched``, or ``None`` if not in the snapshot."""
+        target = reference.encode("utf-8")
+        lo, hi = 0, self.ayah_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key, record = self._key(mid)
+            if key == target:
+                start = self._data + record[2]
+                entry = load_json(self.buffer[start:start + record[3]])
+                last_fetched = entry.pop("last_fetched", None)
+                return entry, datetime.fromisoformat(last_fetched) if last_fetched else None
+            if key < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+
+class SharedCache:
+    def __init__(self, directory: str | None):
+        self.directory = directory
+        self._control = None
+        self._snapshot: Snapshot | None = None
+        self._lock_file = None
+        self._published_signature = None
+        self._task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+        # Set while change notifications are being received.
+        self.change_feed = False
+
+    @classmethod
+    def from_env(cls) -> "SharedCache":
+        return cls(os.getenv("SHARED_CACHE_DIR") or None)
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    @property
+    def is_publisher(self) -> bool:
+        return self._lock_file is not None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _open_control(self):
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(self._path("control"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < GENERATION.size:
+                os.ftruncate(fd, GENERATION.size)
+            self._control = mmap.mmap(fd, GENERATION.size)
+        finally:
+            os.close(fd)
+
+    def generation(self) -> int:
+        if self._control is None:
+            self._open_control()
+        return GENERATION.unpack_from(self._control, 0)[0]
+
+    def snapshot(self) -> Snapshot | None:
+        """The current snapshot, remapped if a newer generation was published."""
+        if not self.enabled:
+            return None
+
+        generation = self.generation()
+        if self._snapshot is not None and self._snapshot.generation == generation:
+            return self._snapshot
+        if generation == 0:
+            return None
+
+        try:
+            with open(self._path(f"snapshot-{generation}.bin"), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._snapshot = Snapshot(mapped)
+        except (FileNotFoundError, ValueError) as e:
+            # Superseded while we were opening it; the next lookup catches up.
+            print(f"Shared cache load error: {e}")
+        return self._snapshot
+
+    def publish(self, rules_version: int, rules: list[dict], ayahs: dict[str, dict]) -> int:
+        """Write a new snapshot and make it current; returns its generation."""
+        generation = self.generation() + 1
+        data = build_snapshot(generation, rules_version, rules, ayahs)
+
+        final = self._path(f"snapshot-{generation}.bin")
+        with open(f"{final}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{final}.tmp", final)
+        GENERATION.pack_into(self._control, 0, generation)
+
+        for name in os.listdir(self.directory):
+            if name.startswith("snapshot-") and name.endswith(".bin"):
+                old = int(name[len("snapshot-"):-len(".bin")])
+                if old < generation - 1:
+                    os.remove(self._path(name))
+        return generation
+
+    async def publish_from_db(self, force: bool = False) -> int | None:
+        """Rebuild from the database if rules or cached ayahs changed."""
+        async with get_sessionmaker()() as db:
+            rules_version = await current_rules_version(db)
+            result = await db.execute(
+                select(func.count(ReminderCache.id), func.max(ReminderCache.last_fetched))
+            )
+            signature = (rules_version, *result.one())
+            if not force and signature == self._published_signature:
+                return None
+
+            rules = [dict(row._mapping) for row in await db.execute(select(*RULE_COLUMNS))]
+            ayahs = {
+                cached.reference: {
+                    "verse_text": cached.verse_text,
+                    "translations": cached.translations or {},
+                    "audio_url": cached.audio_url,
+                    "reference": cached.reference,
+                    "last_fetched": cached.last_fetched.isoformat() if cached.last_fetched else None
+                }
+                for cached in (await db.execute(select(ReminderCache))).scalars()
+            }
+
+        generation = await asyncio.to_thread(self.publish, rules_version, rules, ayahs)
+        self._published_signature = signature
+        return generation
+
+    def try_become_publisher(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(self._path("publisher.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        self._published_signature = None
+        return True
+
+    def request_publish(self, force: bool = False):
+        """Wake the publisher loop now instead of at its next poll."""
+        if force:
+            self._published_signature = None
+        self._changed.set()
+
+    async def run(self, poll_seconds: float = POLL_SECONDS):
+        """Publish while holding the publisher lock; otherwise wait to take over."""
+        while True:
+            self._changed.clear()
+            try:
+                if self.try_become_publisher():
+                    await self.publish_from_db()
+            except Exception as e:
+                print(f"Shared cache publish error: {e}")
+            timeout = RESYNC_SECONDS if self.change_feed and self.is_publisher else poll_seconds
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+shared_cache = SharedCache.from_env()
+
+
+async def _main():
+    if not shared_cache.enabled:
+        raise SystemExit("Set SHARED_CACHE_DIR to run the shared cache loader")
+    print(f"Shared cache loader for {shared_cache.directory} (polling every {POLL_SECONDS}s)")
+    try:
+        await shared_cache.run()
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,64 @@
+"""Language to translation edition registry.
+
+Every configured translation is fetched in the same upstream request and
+cached together, one row per ayah, so serving a language is a lookup in
+that row rather than another fetch.
+"""
+import os
+from typing import NamedTuple
+
+
+class Edition(NamedTuple):
+    quran_com: int       # Quran.com translation resource id
+    alquran_cloud: str   # AlQuran.cloud edition identifier
+
+
+EDITIONS = {
+    "en": Edition(131, "en.asad"),
+    "ur": Edition(97, "ur.jalandhry"),
+    "id": Edition(33, "id.indonesian"),
+    "fr": Edition(31, "fr.hamidullah"),
+    "tr": Edition(77, "tr.diyanet"),
+    "es": Edition(83, "es.cortes"),
+    "bn": Edition(161, "bn.bengali"),
+    "ms": Edition(39, "ms.basmeih"),
+    "de": Edition(27, "de.bubenheim"),
+    "ru": Edition(79, "ru.kuliev"),
+}
+
+DEFAULT_LANG = "en"
+
+
+def _configured_langs() -> list[str]:
+    requested = os.getenv("QURAN_TRANSLATION_LANGS")
+    if not requested:
+        return list(EDITIONS)
+
+    langs = []
+    for lang in requested.split(","):
+        lang = lang.strip().lower()
+        if lang in EDITIONS:
+            langs.append(lang)
+        elif lang:
+            print(f"Unknown translation language ignored: {lang}")
+
+    if DEFAULT_LANG not in langs:
+        langs.insert(0, DEFAULT_LANG)
+    return langs
+
+
+LANGS = _configured_langs()
+
+
+def resolve_lang(lang: str | None) -> str:
+    """Map a requested language to a configured one, falling back to the default."""
+    lang = (lang or "").strip().lower()
+    return lang if lang in LANGS else DEFAULT_LANG
+
+
+def quran_com_ids() -> dict[int, str]:
+    return {EDITIONS[lang].quran_com: lang for lang in LANGS}
+
+
+def alquran_cloud_editions() -> dict[str, str]:
+    return {EDITIONS[lang].alquran_cloud: lang for lang in LANGS}
@@ -0,0 +1,17 @@
+import hmac
+import os
+from fastapi import Header, HTTPException
+
+
+def require_admin(x_admin_token: str | None = Header(None)):
+    expected = os.getenv("ADMIN_API_TOKEN")
+    if not expected:
+        raise HTTPException(
+            status_code=503,
+            detail="Admin API is disabled; set ADMIN_API_TOKEN to enable it"
+        )
+
+    if not x_admin_token or not hmac.compare_digest(
+        x_admin_token.encode("utf-8"), expected.encode("utf-8")
+    ):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
@@ -0,0 +1,315 @@
+"""Compressed request bodies and negotiated response compression.
+
+``DecompressRequestMiddleware`` accepts request bodies sent with
+``Content-Encoding: gzip``, ``br`` or ``zstd``. The body is decoded as it
+streams in, in slices of ``_INPUT_STEP`` bytes. Once the decoded size
+passes ``REQUEST_MAX_DECOMPRESSED_BYTES`` the request fails with ``413``,
+so a small compressed upload cannot expand into gigabytes in memory.
+A truncated or corrupt body gives ``400``, and an unknown encoding ``415``.
+
+``CompressResponseMiddleware`` compresses text and JSON responses of at
+least ``COMPRESSION_MIN_SIZE`` bytes with the best encoding the client
+accepts (br, then zstd, then gzip). Responses that already carry a
+``Content-Encoding`` (the pre-compressed /rules snapshot and bundle)
+pass through untouched, as do media files and partial responses.
+
+br needs the ``brotli`` package and zstd the ``zstandard`` package. Both
+are in requirements.txt; an install without one of them falls back to the
+remaining encodings rather than failing to start.
+"""
+import os
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+from app.utils.http_cache import choose_encoding
+from app.utils.responses import dump_json
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAX_DECOMPRESSED_BYTES = int(os.getenv("REQUEST_MAX_DECOMPRESSED_BYTES", str(32 * 1024 * 1024)))
+MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Compressed input is fed to the decoder this many bytes at a time, which
+# bounds how far past the limit a single step can expand.
+_INPUT_STEP = 1024
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/javascript", "application/xml",
+    "image/svg+xml", "text/"
+)
+
+
+class _GzipDecoder:
+    def __init__(self):
+        self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decoder.decompress(data)
+
+    @property
+    def finished(self) -> bool:
+        return self._decoder.eof
+
+
+class _BrotliDecoder:
+    def __init__(self):
+        self._decoder = brotli.Decompressor()
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decoder.process(data)
+
+    @property
+    def finished(self) -> bool:
+        return self._decoder.is_finished()
+
+
+class _ZstdDecoder:
+    def __init__(self):
+        self._decoder = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decoder.decompress(data)
+
+    @property
+    def finished(self) -> bool:
+        return self._decoder.eof
+
+
+class _GzipEncoder:
+    def __init__(self):
+        self._encoder = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._encoder.compress(data)
+
+    def finish(self) -> bytes:
+        return self._encoder.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self):
+        # Quality 4 keeps dynamic responses cheap; /rules is pre-compressed at 5.
+        self._encoder = brotli.Compressor(quality=4)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._encoder.process(data)
+
+    def finish(self) -> bytes:
+        return self._encoder.finish()
+
+
+class _ZstdEncoder:
+    def __init__(self):
+        self._encoder = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._encoder.compress(data)
+
+    def finish(self) -> bytes:
+        return self._encoder.flush()
+
+
+DECODERS = {"gzip": _GzipDecoder, "x-gzip": _GzipDecoder}
+ENCODERS = {}
+if brotli is not None:
+    DECODERS["br"], ENCODERS["br"] = _BrotliDecoder, _BrotliEncoder
+if zstandard is not None:
+    DECODERS["zstd"], ENCODERS["zstd"] = _ZstdDecoder, _ZstdEncoder
+ENCODERS["gzip"] = _GzipEncoder
+
+# Server preference order for negotiation.
+RESPONSE_ENCODINGS = [e for e in ("br", "zstd", "gzip") if e in ENCODERS]
+
+
+async def _reject(send, status: int, detail: str):
+    body = dump_json({"detail": detail})
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode())
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class _BodyError(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+class DecompressRequestMiddleware:
+    """Pure ASGI middleware decoding compressed request bodies as they stream."""
+
+    def __init__(self, app, max_size: int = MAX_DECOMPRESSED_BYTES):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = Headers(scope=scope).get("content-encoding", "").strip().lower()
+        if encoding in ("", "identity"):
+            await self.app(scope, receive, send)
+            return
+
+        decoder_class = DECODERS.get(encoding)
+        if decoder_class is None:
+            await _reject(send, 415, f"Unsupported Content-Encoding: {encoding}")
+            return
+
+        # Handlers see a plain body of unknown length.
+        scope = dict(scope)
+        scope["headers"] = [
+            (name, value) for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+
+        decoder = decoder_class()
+        decoded = 0
+        error = None
+        started = False
+
+        def _fail(status: int, detail: str) -> _BodyError:
+            nonlocal error
+            error = _BodyError(status, detail)
+            return error
+
+        async def _receive():
+            nonlocal decoded
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+
+            body = message.get("body", b"")
+            parts = []
+            try:
+                for start in range(0, len(body), _INPUT_STEP):
+                    part = decoder.decompress(body[start:start + _INPUT_STEP])
+                    decoded += len(part)
+                    if decoded > self.max_size:
+                        raise _fail(413, f"Decompressed body exceeds {self.max_size} bytes")
+                    parts.append(part)
+            except _BodyError:
+                raise
+            except Exception:
+                raise _fail(400, f"Invalid {encoding} request body")
+
+            if not message.get("more_body", False) and not decoder.finished:
+                raise _fail(400, f"Truncated {encoding} request body")
+
+            return {**message, "body": b"".join(parts)}
+
+        async def _send(message):
+            nonlocal started
+            if error is not None and not started:
+                # Whatever the app makes of the failed read (FastAPI turns
+                # it into a generic 400) is replaced by our own response.
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, _receive, _send)
+        except Exception:
+            if error is None or started:
+                raise
+
+        if error is not None and not started:
+            await _reject(send, error.status, error.detail)
+
+
+def _compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "")
+    return content_type.startswith(COMPRESSIBLE_TYPES) and "content-encoding" not in headers
+
+
+class CompressResponseMiddleware:
+    """Pure ASGI middleware compressing eligible responses for the client's encoding."""
+
+    def __init__(self, app, min_size: int = MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(
+            Headers(scope=scope).get("accept-encoding"), RESPONSE_ENCODINGS
+        )
+        if encoding == "identity":
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        encoder = None
+        passthrough = False
+
+        async def _send(message):
+            nonlocal start, encoder, passthrough
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if 200 <= message["status"] < 300 and message["status"] not in (204, 206) \
+                        and _compressible(headers):
+                    start = message
+                else:
+                    passthrough = True
+                    await send(message)
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if encoder is None:
+                if not more_body and len(body) < self.min_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                encoder = ENCODERS[encoding]()
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # A different byte representation; keep conditional requests working.
+                    headers["ETag"] = f"W/{etag}"
+
+                if not more_body:
+                    body = encoder.compress(body) + encoder.finish()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+                del headers["Content-Length"]
+                await send(start)
+
+            chunk = encoder.compress(body)
+            if not more_body:
+                chunk += encoder.finish()
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, _send)
@@ -0,0 +1,73 @@
+import hashlib
+import os
+
+
+def cache_control(max_age: int, stale_while_revalidate: int = 0) -> str:
+    """Build a public Cache-Control value; zero for both means always revalidate."""
+    if max_age <= 0 and stale_while_revalidate <= 0:
+        return "no-cache"
+
+    value = f"public, max-age={max(max_age, 0)}"
+    if stale_while_revalidate > 0:
+        value += f", stale-while-revalidate={stale_while_revalidate}"
+    return value
+
+
+def _cache_policy(name: str, max_age: int, stale_while_revalidate: int) -> str:
+    return cache_control(
+        int(os.getenv(f"{name}_CACHE_MAX_AGE", str(max_age))),
+        int(os.getenv(f"{name}_CACHE_STALE_WHILE_REVALIDATE", str(stale_while_revalidate)))
+    )
+
+
+# Overridable per endpoint with e.g. REMINDER_CACHE_MAX_AGE and
+# REMINDER_CACHE_STALE_WHILE_REVALIDATE (seconds).
+REMINDER_CACHE_CONTROL = _cache_policy("REMINDER", 300, 86400)
+RULES_CACHE_CONTROL = _cache_policy("RULES", 60, 600)
+PRIVACY_CACHE_CONTROL = _cache_policy("PRIVACY", 86400, 604800)
+
+
+def weak_etag(prefix: str, *parts) -> str:
+    """Weak ETag from a short hash of ``parts``."""
+    digest = hashlib.sha256(":".join(str(p) for p in parts).encode()).hexdigest()[:16]
+    return f'W/"{prefix}-{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    def _opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    target = _opaque(etag)
+    return any(_opaque(tag) == target for tag in if_none_match.split(","))
+
+
+def choose_encoding(accept_encoding: str | None, available: list[str]) -> str:
+    """Pick the first of ``available`` (in server preference order) the client accepts."""
+    if not accept_encoding:
+        return "identity"
+
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+
+    for encoding in available:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+
+    return "identity"
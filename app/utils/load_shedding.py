@@ -0,0 +1,190 @@
+"""Adaptive concurrency limits with priority classes.
+
+Every worker keeps one concurrency limit per route, so a route that gets
+slow (a backlog of analytics writes, say) only sheds its own traffic.
+Each limit adapts by AIMD. It shrinks by ``DECREASE_FACTOR`` (at most
+once per observed latency) when a request fails or takes much longer
+than the route's baseline, which is the lowest latency recently seen
+for it. It grows by about one slot per round trip while requests finish
+near their baseline. Both only happen while at least half the limit is
+in use.
+
+Requests are admitted while the route's number in flight is below its
+class's share of the route's limit:
+
+    critical   /reminder, /rules, /audio, /health, /metrics   100%
+    normal     everything else                                  80%
+    ingest     /analytics/log, /analytics/aggregates,
+               /log-trigger                                      50%
+
+Ingestion routes therefore run at half the concurrency their latency
+would allow and are turned away first, with a fast ``503`` and
+``Retry-After``, leaving pool connections for reminder reads.
+``LOAD_SHEDDING_ENABLED=false`` turns it off.
+"""
+import os
+import time
+from app.utils.metrics import SHED_REQUESTS
+from app.utils.responses import dump_json
+
+LOAD_SHEDDING_ENABLED = os.getenv("LOAD_SHEDDING_ENABLED", "true").lower() in ("1", "true", "yes")
+INITIAL_LIMIT = float(os.getenv("LOAD_SHED_INITIAL_LIMIT", "20"))
+MIN_LIMIT = float(os.getenv("LOAD_SHED_MIN_LIMIT", "4"))
+MAX_LIMIT = float(os.getenv("LOAD_SHED_MAX_LIMIT", "200"))
+RETRY_AFTER = int(os.getenv("LOAD_SHED_RETRY_AFTER", "2"))
+
+# A sample is congested past TOLERANCE x baseline, but never for less
+# than MIN_SLACK seconds over it, so jitter on sub-millisecond routes
+# doesn't count.
+TOLERANCE = 2.0
+MIN_SLACK = 0.05
+DECREASE_FACTOR = 0.9
+# How fast a route's baseline creeps back up after a lucky fast sample.
+BASELINE_DRIFT = 0.001
+
+CRITICAL = "critical"
+NORMAL = "normal"
+INGEST = "ingest"
+
+SHARES = {CRITICAL: 1.0, NORMAL: 0.8, INGEST: 0.5}
+
+# First matching path prefix wins.
+ROUTE_CLASSES = (
+    ("/analytics/log", INGEST),
+    ("/analytics/aggregates", INGEST),
+    ("/log-trigger", INGEST),
+    ("/rules/import", NORMAL),
+    ("/reminder", CRITICAL),
+    ("/rules", CRITICAL),
+    ("/audio", CRITICAL),
+    ("/health", CRITICAL),
+    ("/metrics", CRITICAL),
+)
+
+
+def classify(path: str) -> tuple[str, str]:
+    """``(route key, priority class)`` for a request path."""
+    for prefix, priority in ROUTE_CLASSES:
+        if path == prefix or path.startswith(prefix + "/"):
+            return prefix, priority
+    return "other", NORMAL
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for one route."""
+
+    def __init__(self, initial: float = INITIAL_LIMIT, minimum: float = MIN_LIMIT,
+                 maximum: float = MAX_LIMIT):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.inflight = 0
+        self.baseline: float | None = None
+        self._decreased_at = 0.0
+
+    def try_acquire(self, priority: str) -> bool:
+        if self.inflight >= self.limit * SHARES[priority]:
+            return False
+        self.inflight += 1
+        return True
+
+    def release(self, latency: float, failed: bool = False):
+        self.inflight -= 1
+
+        baseline = self.baseline
+        if baseline is None or latency < baseline:
+            baseline = latency
+        else:
+            baseline += (latency - baseline) * BASELINE_DRIFT
+        self.baseline = baseline
+
+        # A slow request while the limit is nowhere near reached (an
+        # upstream cache miss, say) is not a concurrency problem.
+        if self.inflight + 1 < self.limit * SHARES[INGEST]:
+            return
+
+        if failed or latency > max(baseline * TOLERANCE, baseline + MIN_SLACK):
+            # Requests that overlapped the slow one would all report it;
+            # back off once per round trip, not once per request.
+            now = time.monotonic()
+            if now - self._decreased_at >= latency:
+                self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+                self._decreased_at = now
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def state(self) -> dict:
+        return {"limit": round(self.limit, 2), "inflight": self.inflight}
+
+
+class RouteLimiters:
+    """One ``AdaptiveLimiter`` per route key from ``classify``."""
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._limiters: dict[str, AdaptiveLimiter] = {}
+
+    def get(self, route: str) -> AdaptiveLimiter:
+        limiter = self._limiters.get(route)
+        if limiter is None:
+            limiter = self._limiters[route] = AdaptiveLimiter(**self._kwargs)
+        return limiter
+
+    def state(self) -> dict[str, dict]:
+        return {route: limiter.state() for route, limiter in self._limiters.items()}
+
+
+limiters = RouteLimiters()
+
+
+_SHED_BODY = dump_json({"detail": "Server is overloaded, retry later"})
+
+
+async def _shed(send):
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(_SHED_BODY)).encode()),
+            (b"retry-after", str(RETRY_AFTER).encode()),
+            (b"cache-control", b"no-store"),
+        ]
+    })
+    await send({"type": "http.response.body", "body": _SHED_BODY})
+
+
+class LoadSheddingMiddleware:
+    """Pure ASGI middleware admitting requests against their route's limiter."""
+
+    def __init__(self, app, limiters: RouteLimiters = limiters):
+        self.app = app
+        self.limiters = limiters
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not LOAD_SHEDDING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        route, priority = classify(scope["path"])
+        limiter = self.limiters.get(route)
+        if not limiter.try_acquire(priority):
+            SHED_REQUESTS.inc(priority)
+            await _shed(send)
+            return
+
+        status = 500
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            # Only unhandled errors (pool timeouts, crashes) count as failures;
+            # 502/503/504 from the upstream Quran APIs say nothing about us.
+            limiter.release(time.perf_counter() - started, failed=status == 500)
@@ -0,0 +1,194 @@
+"""In-process request and span metrics in the Prometheus text format.
+
+``MetricsMiddleware`` records one latency histogram sample per request,
+labelled with the matched route template rather than the raw path so
+label cardinality stays bounded. Inside handlers, ``span("name")`` times
+a named step such as ``rule_match`` or ``db_commit``:
+
+    with span("rule_match"):
+        rule = await match_rule(db, domain, path)
+
+Spans are sampled per request. ``METRICS_SAMPLE_RATE`` (0.0-1.0, default
+1.0) is the fraction of requests whose spans are recorded. The per-request
+histogram and the counters are always kept, because they cost one dict
+lookup and a few additions. ``METRICS_ENABLED=false`` turns everything off.
+
+Metrics are per worker process; scrape each worker or run one worker per
+scrape target.
+"""
+import os
+import random
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+SAMPLE_RATE = min(max(float(os.getenv("METRICS_SAMPLE_RATE", "1.0")), 0.0), 1.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# Spans outside any request (background tasks, tests) are recorded unless
+# sampling is switched off entirely.
+_sampled: ContextVar[bool] = ContextVar("metrics_sampled", default=SAMPLE_RATE > 0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+    def clear(self):
+        self._series.clear()
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        if METRICS_ENABLED:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+    def clear(self):
+        self._values.clear()
+
+
+REQUEST_SECONDS = Histogram(
+    "dhikr_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status")
+)
+SPAN_SECONDS = Histogram(
+    "dhikr_span_duration_seconds",
+    "Latency of named steps inside request handlers (sampled).",
+    ("span",)
+)
+CACHE_LOOKUPS = Counter(
+    "dhikr_cache_lookups_total",
+    "Cache lookups by cache and result.",
+    ("cache", "result")
+)
+CACHE_INVALIDATIONS = Counter(
+    "dhikr_cache_invalidations_total",
+    "Change notifications applied to local caches, by table.",
+    ("table",)
+)
+SHED_REQUESTS = Counter(
+    "dhikr_load_shed_total",
+    "Requests rejected by the adaptive concurrency limit, by priority class.",
+    ("priority",)
+)
+
+REGISTRY = [REQUEST_SECONDS, SPAN_SECONDS, CACHE_LOOKUPS, CACHE_INVALIDATIONS, SHED_REQUESTS]
+
+
+def render() -> bytes:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def reset_metrics():
+    for metric in REGISTRY:
+        metric.clear()
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block as ``name`` if this request is sampled."""
+    if not (METRICS_ENABLED and _sampled.get()):
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_SECONDS.observe(time.perf_counter() - started, name)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware; avoids the per-request task BaseHTTPMiddleware adds."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        token = _sampled.set(SAMPLE_RATE >= 1.0 or random.random() < SAMPLE_RATE)
+        status = 500
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            # The router stores the matched route in the (shared) scope.
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status)
+            )
+            _sampled.reset(token)
@@ -0,0 +1,44 @@
+import json
+from starlette.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dump_json(payload) -> bytes:
+    """Compact UTF-8 JSON, encoded with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def load_json(data):
+    """Parse JSON from bytes or a memoryview, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(bytes(data))
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by ``dump_json``.
+
+    Handlers return it directly instead of a dict, which skips FastAPI's
+    ``jsonable_encoder`` pass, so the content must already be plain JSON
+    types (str keys, no datetimes or models).
+    """
+
+    def render(self, content) -> bytes:
+        return dump_json(content)
+
+
+class StaticJSON:
+    """A constant JSON body encoded once, for endpoints that never change."""
+
+    def __init__(self, payload: dict, headers: dict | None = None):
+        self.body = dump_json(payload)
+        self.headers = headers or {}
+
+    def response(self) -> Response:
+        return Response(content=self.body, media_type="application/json", headers=self.headers)
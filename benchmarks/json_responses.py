@@ -0,0 +1,139 @@
+"""Response encoding benchmark.
+
+Measures in-process requests per second (through the ASGI stack, without a
+network socket) for the constant and hot endpoints. "before" is a copy of
+the app where the same handlers return plain dicts, which FastAPI runs
+through ``jsonable_encoder`` and the stdlib JSON encoder on every request;
+"after" is the real app, serving pre-encoded bytes and ``FastJSONResponse``.
+
+Usage::
+
+    python benchmarks/json_responses.py [--requests 5000] [--database-url ...]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+AYAH = {
+    "verse_text": "وَٱلْعَصْرِ ١ إِنَّ ٱلْإِنسَٰنَ لَفِى خُسْرٍ ٢",
+    "translation": "By time, indeed, mankind is in loss",
+    "audio_url": "https://verses.quran.com/Alafasy/mp3/103001.mp3",
+    "reference": "103:1-3"
+}
+
+
+def _baseline_app():
+    """The app's handlers as they were before pre-encoding: dicts in, encoder per request."""
+    import json
+    from fastapi import Depends, FastAPI, Query
+    from app.database import get_read_db, get_write_db
+    from app.main import ROOT, HEALTH, app
+    from app.routers.privacy import PRIVACY_POLICY
+    from app.services.quran_service import QuranService
+    from app.services.rule_matcher import match_rule
+
+    root, health, privacy = (json.loads(s.body) for s in (ROOT, HEALTH, PRIVACY_POLICY))
+    baseline = FastAPI()
+    # Same middleware stack as the real app, so only the encoding differs.
+    baseline.user_middleware = list(app.user_middleware)
+
+    @baseline.get("/")
+    async def get_root():
+        return root
+
+    @baseline.get("/health")
+    async def get_health():
+        return health
+
+    @baseline.get("/privacy")
+    async def get_privacy():
+        return privacy
+
+    @baseline.get("/reminder")
+    async def get_reminder(
+        domain: str = Query(...),
+        path: str = Query(None),
+        lang: str = Query("en"),
+        db=Depends(get_write_db),
+        read_db=Depends(get_read_db)
+    ):
+        rule = await match_rule(read_db, domain, path)
+        ayah_data = await QuranService().get_ayah(rule.reference, lang, db, read_db)
+        return {
+            "status": "success",
+            "message": "Reminder fetched successfully",
+            "data": {"category": rule.category_key, "reference": rule.reference, **ayah_data}
+        }
+
+    return baseline
+
+
+async def _requests_per_second(app, url: str, count: int) -> float:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(min(count, 100)):
+            await client.get(url)
+
+        started = time.perf_counter()
+        for _ in range(count):
+            response = await client.get(url)
+        elapsed = time.perf_counter() - started
+
+    assert response.status_code == 200, response.text
+    return count / elapsed
+
+
+async def run(count: int):
+    from app.database import dispose_engines, get_sessionmaker
+    from app.main import app
+    from app.migrations import migrate
+    from app.models import ReminderCache, ReminderRule
+
+    try:
+        await migrate()
+        async with get_sessionmaker()() as session:
+            session.add(ReminderRule(
+                domain_pattern="youtube.com", path_pattern="/shorts",
+                category_key="waste", reference="103:1-3"
+            ))
+            session.add(ReminderCache(
+                verse_text=AYAH["verse_text"],
+                translations={"en": AYAH["translation"]},
+                audio_url=AYAH["audio_url"],
+                reference=AYAH["reference"]
+            ))
+            await session.commit()
+
+        baseline = _baseline_app()
+        urls = ["/", "/health", "/privacy", "/reminder?domain=youtube.com&path=/shorts"]
+
+        print(f"{'endpoint':<44} {'before':>10} {'after':>10}  req/s")
+        for url in urls:
+            before = await _requests_per_second(baseline, url, count)
+            after = await _requests_per_second(app, url, count)
+            print(f"{url:<44} {before:>10,.0f} {after:>10,.0f}  ({after / before - 1:+.0%})")
+    finally:
+        # An open aiosqlite connection keeps the process from exiting.
+        await dispose_engines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp}/bench.db"
+        asyncio.run(run(args.requests))
+
+
+if __name__ == "__main__":
+    main()
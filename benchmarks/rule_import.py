@@ -0,0 +1,78 @@
+"""Bulk rule import benchmark.
+
+Imports a synthetic blocklist through ``import_rules`` and compares it with
+adding ``ReminderRule`` objects one by one through the ORM (committing each,
+as an admin tool without a bulk path would). The per-row baseline runs on a
+sample and is extrapolated to the full size.
+
+Usage::
+
+    python benchmarks/rule_import.py [--rules 100000] [--baseline-sample 2000] [--database-url ...]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _blocklist(count: int, chunk_rows: int = 5000):
+    async def chunks():
+        for start in range(0, count, chunk_rows):
+            rows = "".join(
+                f"site{i}.example.com,,waste,103:1-3\n"
+                for i in range(start, min(start + chunk_rows, count))
+            )
+            yield rows.encode("utf-8")
+    return chunks()
+
+
+async def run(rule_count: int, sample: int):
+    from app.database import dispose_engines, get_sessionmaker
+    from app.migrations import migrate
+    from app.models import ReminderRule
+    from app.services.rule_import import import_rules, parse_csv
+
+    await migrate()
+
+    async with get_sessionmaker()() as session:
+        started = time.perf_counter()
+        stats = await import_rules(session, parse_csv(_blocklist(rule_count)))
+        bulk_seconds = time.perf_counter() - started
+
+    async with get_sessionmaker()() as session:
+        started = time.perf_counter()
+        for i in range(sample):
+            session.add(ReminderRule(
+                domain_pattern=f"orm{i}.example.com",
+                category_key="waste",
+                reference="103:1-3"
+            ))
+            await session.commit()
+        orm_seconds = (time.perf_counter() - started) / sample * rule_count
+
+    await dispose_engines()
+
+    print(f"bulk import   {stats.inserted:>7} rules  {bulk_seconds:8.2f} s  "
+          f"({stats.inserted / bulk_seconds:,.0f} rules/s)")
+    print(f"per-row ORM   {rule_count:>7} rules  {orm_seconds:8.2f} s  "
+          f"(extrapolated from {sample})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, default=100_000)
+    parser.add_argument("--baseline-sample", type=int, default=2000)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp}/bench.db"
+        asyncio.run(run(args.rules, args.baseline_sample))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Worker startup benchmark.
+
+Each sample runs in a fresh interpreter so import costs are measured cold.
+Reports the median of several runs, split into import and startup time, for:
+
+- first boot:  lifespan startup on an empty database (migrations run)
+- warm boot:   lifespan startup on a current schema (version check only)
+- create_all:  the old ``Base.metadata.create_all`` boot, for comparison
+
+Usage::
+
+    python benchmarks/startup.py [--runs 7] [--database-url sqlite:///...]
+
+Without ``--database-url`` a temporary SQLite file is used.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LIFESPAN_BOOT = """
+import asyncio, time
+t0 = time.perf_counter()
+from app.main import app
+
+async def boot():
+    async with app.router.lifespan_context(app):
+        pass
+
+t1 = time.perf_counter()
+asyncio.run(boot())
+print(t1 - t0, time.perf_counter() - t1)
+"""
+
+CREATE_ALL_BOOT = """
+import asyncio, time
+t0 = time.perf_counter()
+import app.main
+from app.database import Base, dispose_engines, get_engine
+
+async def boot():
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await dispose_engines()
+
+t1 = time.perf_counter()
+asyncio.run(boot())
+print(t1 - t0, time.perf_counter() - t1)
+"""
+
+
+def _run(code: str, database_url: str) -> tuple[float, float]:
+    env = {**os.environ, "DATABASE_URL": database_url}
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    import_seconds, startup_seconds = result.stdout.strip().splitlines()[-1].split()
+    return float(import_seconds), float(startup_seconds)
+
+
+def _report(label: str, samples: list[tuple[float, float]]):
+    imports = [s[0] * 1000 for s in samples]
+    startups = [s[1] * 1000 for s in samples]
+    print(f"{label:<12} import {statistics.median(imports):7.1f} ms  "
+          f"startup {statistics.median(startups):7.1f} ms  "
+          f"(median of {len(samples)} runs)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.database_url:
+            database_url = args.database_url
+            first_boot = []
+        else:
+            first_boot = []
+            for i in range(args.runs):
+                first_boot.append(_run(LIFESPAN_BOOT, f"sqlite:///{tmp}/first-{i}.db"))
+            database_url = f"sqlite:///{tmp}/warm.db"
+            _run(LIFESPAN_BOOT, database_url)
+
+        warm_boot = [_run(LIFESPAN_BOOT, database_url) for _ in range(args.runs)]
+        create_all = [_run(CREATE_ALL_BOOT, database_url) for _ in range(args.runs)]
+
+    if first_boot:
+        _report("first boot", first_boot)
+    _report("warm boot", warm_boot)
+    _report("create_all", create_all)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import asyncio
+import sys
+import time
+from app.database import dispose_engines, get_sessionmaker
+from app.services.rule_import import DEFAULT_CHUNK_SIZE, import_rules, parse_csv, parse_json
+
+
+async def read_file(path: str, chunk_size: int = 1 << 16):
+    with (sys.stdin.buffer if path == "-" else open(path, "rb")) as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Bulk import reminder rules from CSV or JSON")
+    parser.add_argument("path", help="File to import, or - for stdin")
+    parser.add_argument("--format", choices=["csv", "json"], help="Input format (default: from file extension)")
+    parser.add_argument("--category", help="Category for rows that omit one")
+    parser.add_argument("--reference", help="Reference for rows that omit one")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Validate without writing")
+    args = parser.parse_args()
+
+    fmt = args.format or ("json" if args.path.endswith((".json", ".ndjson", ".jsonl")) else "csv")
+    rows = (parse_json if fmt == "json" else parse_csv)(read_file(args.path))
+    started = time.perf_counter()
+
+    def report(stats):
+        print(
+            f"  chunk {stats.chunks}: {stats.rows} rows read, "
+            f"{stats.inserted} inserted, {stats.updated} updated, "
+            f"{stats.invalid} invalid ({time.perf_counter() - started:.1f}s)"
+        )
+
+    try:
+        async with get_sessionmaker()() as session:
+            stats = await import_rules(
+                session,
+                rows,
+                defaults={"category_key": args.category, "reference": args.reference},
+                chunk_size=args.chunk_size,
+                dry_run=args.dry_run,
+                on_progress=report
+            )
+    finally:
+        await dispose_engines()
+
+    for error in stats.errors:
+        print(f"  line {error['line']}: {error['error']}")
+
+    print(
+        f"✓ {stats.inserted} inserted, {stats.updated} updated, {stats.unchanged} unchanged, "
+        f"{stats.duplicates} duplicates, {stats.invalid} invalid "
+        f"in {time.perf_counter() - started:.1f}s" + (" (dry run)" if args.dry_run else "")
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
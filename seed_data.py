@@ -1,36 +1,15 @@
 import asyncio
-import os
-from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy import select, func
-from app.models import Base, ReminderRule
-
-load_dotenv()
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable is not set")
-
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+asyncpg://", 1)
-elif DATABASE_URL.startswith("postgresql://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
-
-if "?" in DATABASE_URL and "sslmode=" in DATABASE_URL:
-    parts = DATABASE_URL.split("?")
-    params = [p for p in parts[1].split("&") if not p.startswith("sslmode=")]
-    DATABASE_URL = parts[0] + ("?" + "&".join(params) if params else "")
-
-engine = create_async_engine(DATABASE_URL, echo=True)
-AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+from app.database import dispose_engines, get_sessionmaker
+from app.migrations import migrate
+from app.models import ReminderRule
+from app.services.rules_cache import next_rules_version
 
 
 async def seed_database():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await migrate()
     
-    async with AsyncSessionLocal() as session:
+    async with get_sessionmaker()() as session:
         result = await session.execute(select(func.count()).select_from(ReminderRule))
         existing_count = result.scalar() or 0
         
@@ -89,14 +68,23 @@ async def seed_database():
             ),
         ]
         
+        version = await next_rules_version(session)
         for rule in seed_rules:
+            rule.version = version
             session.add(rule)
         
         await session.commit()
         print(f"✓ Seeded {len(seed_rules)} reminder rules")
 
 
+async def main():
+    try:
+        await seed_database()
+    finally:
+        await dispose_engines()
+
+
 if __name__ == "__main__":
     print("Starting database seed...")
-    asyncio.run(seed_database())
+    asyncio.run(main())
     print("Database seeding complete!")
@@ -0,0 +1,84 @@
+import os
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+
+from app.database import dispose_engines, get_sessionmaker
+from app.main import app
+from app.migrations import migrate
+from app.models import ReminderRule
+from app.services import interning
+from app.services.circuit_breaker import reset_circuits
+from app.services.rule_bundle import rule_bundle
+from app.services.rules_cache import rules_snapshot
+
+# Run the suite against an in-memory SQLite database instead of Postgres.
+os.environ.setdefault("DATABASE_URL", "memory://")
+
+
+SEED_RULES = [
+    ("youtube.com", "/shorts", "waste", "103:1-3"),
+    ("x.com", None, "distraction", "29:45"),
+]
+
+
+class RoundTripCounter:
+    """Counts connection checkouts, statements and commits on the engine"""
+
+    def __init__(self, target_engine):
+        self.sync_engine = target_engine.sync_engine
+        self.checkouts = 0
+        self.statements = 0
+        self.commits = 0
+
+    def _on_checkout(self, *args):
+        self.checkouts += 1
+
+    def _on_execute(self, *args):
+        self.statements += 1
+
+    def _on_commit(self, *args):
+        self.commits += 1
+
+    def __enter__(self):
+        event.listen(self.sync_engine.pool, "checkout", self._on_checkout)
+        event.listen(self.sync_engine, "before_cursor_execute", self._on_execute)
+        event.listen(self.sync_engine, "commit", self._on_commit)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.sync_engine.pool, "checkout", self._on_checkout)
+        event.remove(self.sync_engine, "before_cursor_execute", self._on_execute)
+        event.remove(self.sync_engine, "commit", self._on_commit)
+
+
+@pytest.fixture(autouse=True)
+def _reset_circuits():
+    """Circuit breakers are process-wide; start every test with them closed"""
+    reset_circuits()
+
+
+@pytest_asyncio.fixture
+async def client():
+    """HTTP client against the app backed by a fresh in-memory database"""
+    await migrate()
+    interning.clear_all()
+    rules_snapshot.invalidate()
+    rule_bundle.invalidate()
+    async with get_sessionmaker()() as session:
+        for domain, path, category, reference in SEED_RULES:
+            session.add(ReminderRule(
+                domain_pattern=domain,
+                path_pattern=path,
+                category_key=category,
+                reference=reference
+            ))
+        await session.commit()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+
+    # Disposing the static pool drops the in-memory database.
+    await dispose_engines()
@@ -0,0 +1,138 @@
+import os
+import mmap
+import pytest
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import patch
+from sqlalchemy import select
+from app.database import get_sessionmaker
+from app.models import AnalyticsCategory, AnalyticsDomain, AnalyticsEvent
+from app.services import interning
+from app.services.analytics_archive import (
+    AnalyticsArchive, column, encode_day, read_meta, summarize_buffer
+)
+
+TODAY = date.today()
+OLD_DAY = TODAY - timedelta(days=100)
+NOON = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = AnalyticsArchive(str(tmp_path / "archive"), hot_days=90)
+    with patch("app.routers.analytics.analytics_archive", archive):
+        yield archive
+
+
+async def _seed(day: date, events: list[tuple[str | None, int]]):
+    """Insert events on ``day`` as (category, seconds) pairs"""
+    async with get_sessionmaker()() as session:
+        domain_id = await interning.domains.id_for(session, "youtube.com")
+        for name, seconds in events:
+            session.add(AnalyticsEvent(
+                url_id=bytes(32), domain_id=domain_id,
+                category_id=await interning.categories.id_for(session, name),
+                duration_seconds=seconds, day=day
+            ))
+        await session.commit()
+
+
+async def _live_days() -> list[date]:
+    async with get_sessionmaker()() as session:
+        result = await session.execute(select(AnalyticsEvent.day).distinct())
+        return sorted(row[0] for row in result.all())
+
+
+class TestColumnarFormat:
+    """Tests for the per-day columnar archive file format"""
+
+    def test_round_trip(self):
+        """Test that columns come back with dictionaries and narrow types"""
+        rows = [
+            (bytes([i]) * 32, "youtube.com", "waste" if i % 2 else None, "Unknown", 60 * i, NOON)
+            for i in range(1, 5)
+        ]
+        buffer = encode_day(OLD_DAY, rows)
+        meta = read_meta(buffer)
+
+        assert meta["rows"] == 4
+        assert meta["dictionaries"]["category"] == ["waste", None]
+        assert meta["columns"]["category"]["dtype"] == "|u1"
+        assert meta["columns"]["duration_seconds"]["dtype"] == "|u1"
+        assert (meta["columns"]["duration_seconds"]["min"], meta["columns"]["duration_seconds"]["max"]) == (60, 240)
+        assert all(entry["offset"] % 8 == 0 for entry in meta["columns"].values())
+        assert column(buffer, meta, "url_id")[2].tobytes() == bytes([3]) * 32
+        assert column(buffer, meta, "timestamp")[0] == int(NOON.timestamp())
+
+    def test_summarize_from_mmap(self, tmp_path):
+        """Test that category totals are computed over a memory-mapped file"""
+        rows = [(bytes(32), "x.com", "waste", None, 100_000, None)] * 3 + [
+            (bytes(32), "x.com", None, None, 5, None)
+        ]
+        path = tmp_path / "day.dhka"
+        path.write_bytes(encode_day(OLD_DAY, rows))
+
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            totals = summarize_buffer(mapped)
+
+        assert totals == {"waste": (3, 300_000), None: (1, 5)}
+
+
+class TestArchiveJob:
+    """Tests for moving closed days to the archive and summarizing across tiers"""
+
+    @pytest.mark.asyncio
+    async def test_closed_days_moved(self, client, archive):
+        """Test that old days leave the table while the summary still counts them"""
+        await _seed(OLD_DAY, [("waste", 1800), ("waste", 1800), (None, 360)])
+        await _seed(TODAY, [("waste", 3600)])
+
+        archived = await archive.archive_closed_days()
+
+        assert archived == [OLD_DAY]
+        assert os.path.exists(archive.path_for(OLD_DAY))
+        assert await _live_days() == [TODAY]
+
+        response = await client.get("/analytics/summary", params={"period": "365d"})
+        assert response.json()["data"] == {
+            "waste": {"count": 3, "hours": 2.0},
+            "uncategorized": {"count": 1, "hours": 0.1}
+        }
+
+        recent = await client.get("/analytics/summary", params={"period": "7d"})
+        assert recent.json()["data"] == {"waste": {"count": 1, "hours": 1.0}}
+
+    @pytest.mark.asyncio
+    async def test_hot_days_kept(self, client, archive):
+        """Test that days inside the hot window stay in the table"""
+        await _seed(TODAY - timedelta(days=30), [("waste", 60)])
+
+        assert await archive.archive_closed_days() == []
+        assert archive.days() == []
+
+    @pytest.mark.asyncio
+    async def test_interrupted_job_not_double_counted(self, client, archive):
+        """Test that rows left behind after the file was written are ignored, then deleted"""
+        await _seed(OLD_DAY, [("waste", 1800)])
+        async with get_sessionmaker()() as session:
+            rows = (await session.execute(
+                select(AnalyticsEvent.url_id, AnalyticsDomain.name, AnalyticsCategory.name,
+                       AnalyticsEvent.region_id, AnalyticsEvent.duration_seconds,
+                       AnalyticsEvent.timestamp)
+                .join(AnalyticsDomain, AnalyticsEvent.domain_id == AnalyticsDomain.id)
+                .join(AnalyticsCategory, AnalyticsEvent.category_id == AnalyticsCategory.id)
+            )).all()
+        archive.write_day(OLD_DAY, rows)
+
+        response = await client.get("/analytics/summary", params={"period": "365d"})
+        assert response.json()["data"] == {"waste": {"count": 1, "hours": 0.5}}
+
+        assert await archive.archive_closed_days() == [OLD_DAY]
+        assert await _live_days() == []
+
+    @pytest.mark.asyncio
+    async def test_disabled_without_directory(self, client):
+        """Test that the job does nothing unless ANALYTICS_ARCHIVE_DIR is set"""
+        await _seed(OLD_DAY, [("waste", 60)])
+
+        assert await AnalyticsArchive(None).archive_closed_days() == []
+        assert await _live_days() == [OLD_DAY]
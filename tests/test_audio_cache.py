@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import os
+import time
+import httpx
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, patch
+from app.services.audio_cache import AUDIO_BREAKER, AudioCache, RETRY_SECONDS
+
+SOURCE = "https://verses.quran.com/Alafasy/mp3/103001.mp3"
+AUDIO = bytes(range(256)) * 40
+DIGEST = hashlib.sha256(AUDIO).hexdigest()
+
+
+async def _fake_fetch(self, source_url, tmp_path, timeout=None):
+    with open(tmp_path, "wb") as f:
+        f.write(AUDIO)
+    return DIGEST
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AudioCache(str(tmp_path))
+
+
+class TestAudioCache:
+    """Tests for the content-addressed audio store"""
+
+    def test_disabled_passes_urls_through(self):
+        """Test that without a directory the upstream URL is returned"""
+        assert AudioCache(None).url_for(SOURCE) == SOURCE
+
+    def test_non_http_urls_untouched(self, cache):
+        """Test that empty and relative URLs are never downloaded"""
+        assert cache.url_for("") == ""
+        assert cache._tasks == {}
+
+    @pytest.mark.asyncio
+    async def test_download_then_local_url(self, cache):
+        """Test that the first lookup queues a download and later ones are local"""
+        with patch.object(AudioCache, "_fetch_to", _fake_fetch):
+            assert cache.url_for(SOURCE) == SOURCE
+            await cache.wait()
+
+        assert cache.url_for(SOURCE) == f"/audio/{DIGEST}.mp3"
+        with open(cache.object_path(DIGEST), "rb") as f:
+            assert f.read() == AUDIO
+        assert os.listdir(os.path.join(cache.directory, "tmp")) == []
+
+    @pytest.mark.asyncio
+    async def test_refs_shared_between_instances(self, cache):
+        """Test that another worker on the same directory sees stored files"""
+        with patch.object(AudioCache, "_fetch_to", _fake_fetch):
+            cache.prefetch(SOURCE)
+            await cache.wait()
+
+        other = AudioCache(cache.directory)
+        assert other.url_for(SOURCE) == f"/audio/{DIGEST}.mp3"
+
+    @pytest.mark.asyncio
+    async def test_concurrent_lookups_download_once(self, cache):
+        """Test that repeated lookups while downloading share one task"""
+        async def _fetch(source_url, tmp_path):
+            return await _fake_fetch(None, source_url, tmp_path)
+
+        fetch = AsyncMock(side_effect=_fetch)
+        with patch.object(AudioCache, "_fetch_to", fetch):
+            for _ in range(3):
+                cache.url_for(SOURCE)
+            await cache.wait()
+
+        assert fetch.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_download_leaves_no_files(self, cache):
+        """Test that an upstream error keeps serving the source URL"""
+        with patch.object(AudioCache, "_fetch_to", AsyncMock(side_effect=ValueError("boom"))):
+            cache.prefetch(SOURCE)
+            await cache.wait()
+
+        assert cache.url_for(SOURCE) == SOURCE
+        assert os.listdir(os.path.join(cache.directory, "refs")) == []
+
+    @pytest.mark.asyncio
+    async def test_failed_download_backs_off(self, cache):
+        """Test that a failed URL is not fetched again until its backoff expires"""
+        fetch = AsyncMock(side_effect=ValueError("boom"))
+        with patch.object(AudioCache, "_fetch_to", fetch):
+            cache.url_for(SOURCE)
+            await cache.wait()
+            for _ in range(5):
+                assert cache.url_for(SOURCE) == SOURCE
+            await cache.wait()
+            assert fetch.call_count == 1
+            assert cache.backing_off(SOURCE)
+
+            retry_at, failures = cache._failures[SOURCE]
+            cache._failures[SOURCE] = (retry_at - RETRY_SECONDS, failures)
+            cache.url_for(SOURCE)
+            await cache.wait()
+            assert fetch.call_count == 2
+
+        # The second failure waits twice as long.
+        retry_at, failures = cache._failures[SOURCE]
+        assert failures == 2
+        assert retry_at - time.monotonic() > RETRY_SECONDS
+
+    @pytest.mark.asyncio
+    async def test_success_clears_backoff(self, cache):
+        """Test that a download succeeding after a failure forgets the failure"""
+        cache._failures[SOURCE] = (0.0, 3)
+        with patch.object(AudioCache, "_fetch_to", _fake_fetch):
+            cache.prefetch(SOURCE)
+            await cache.wait()
+
+        assert SOURCE not in cache._failures
+        assert cache.url_for(SOURCE) == f"/audio/{DIGEST}.mp3"
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_skips_downloads(self, cache):
+        """Test that an open breaker stops downloads without penalising the URL"""
+        AUDIO_BREAKER._open(time.monotonic())
+        fetch = AsyncMock(return_value=DIGEST)
+        with patch.object(AudioCache, "_fetch_to", fetch):
+            cache.prefetch(SOURCE)
+            await cache.wait()
+
+        assert fetch.call_count == 0
+        assert not cache.backing_off(SOURCE)
+
+    @pytest.mark.asyncio
+    async def test_fetch_streams_to_disk(self, cache, tmp_path):
+        """Test that the real download path writes and hashes the whole body"""
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, content=AUDIO))
+        real_client = httpx.AsyncClient
+
+        def _client(**kwargs):
+            return real_client(transport=transport, **kwargs)
+
+        target = str(tmp_path / "download")
+        with patch("httpx.AsyncClient", _client), \
+                patch("asyncio.to_thread", wraps=asyncio.to_thread) as to_thread:
+            digest = await cache._fetch_to(SOURCE, target)
+
+        assert digest == DIGEST
+        with open(target, "rb") as f:
+            assert f.read() == AUDIO
+        assert to_thread.await_count >= 3    # open, write, close
+
+    def test_object_path_rejects_bad_digests(self, cache):
+        """Test that only well-formed digests resolve to paths"""
+        assert cache.object_path("../../etc/passwd") is None
+        assert cache.object_path("0" * 64) is None
+
+
+class TestAudioRouter:
+    """Tests for serving cached audio"""
+
+    @pytest_asyncio.fixture
+    async def stored(self, cache):
+        with patch.object(AudioCache, "_fetch_to", _fake_fetch):
+            cache.prefetch(SOURCE)
+            await cache.wait()
+        with patch("app.routers.audio.audio_cache", cache):
+            yield cache
+
+    @pytest.mark.asyncio
+    async def test_full_file(self, client, stored):
+        """Test that a stored file is served with immutable caching"""
+        response = await client.get(f"/audio/{DIGEST}.mp3")
+
+        assert response.status_code == 200
+        assert response.content == AUDIO
+        assert response.headers["content-type"] == "audio/mpeg"
+        assert "immutable" in response.headers["cache-control"]
+        assert response.headers["accept-ranges"] == "bytes"
+
+    @pytest.mark.asyncio
+    async def test_range_request(self, client, stored):
+        """Test that a byte range returns 206 with just that slice"""
+        response = await client.get(f"/audio/{DIGEST}.mp3", headers={"Range": "bytes=100-199"})
+
+        assert response.status_code == 206
+        assert response.content == AUDIO[100:200]
+        assert response.headers["content-range"] == f"bytes 100-199/{len(AUDIO)}"
+
+    @pytest.mark.asyncio
+    async def test_not_modified(self, client, stored):
+        """Test that a matching If-None-Match returns 304"""
+        response = await client.get(
+            f"/audio/{DIGEST}.mp3", headers={"If-None-Match": f'"{DIGEST}"'}
+        )
+        assert response.status_code == 304
+
+    @pytest.mark.asyncio
+    async def test_unknown_digest(self, client, stored):
+        """Test that a missing file returns 404"""
+        response = await client.get(f"/audio/{'0' * 64}.mp3")
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_reminder_points_at_cached_copy(self, client, stored):
+        """Test that /reminder rewrites audio_url once the file is cached"""
+        ayah = {
+            "verse_text": "وَٱلْعَصْرِ",
+            "translations": {"en": "By time"},
+            "audio_url": SOURCE,
+            "reference": "103:1-3"
+        }
+        with patch("app.services.quran_service.audio_cache", stored), patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=ayah
+        ):
+            response = await client.get(
+                "/reminder", params={"domain": "youtube.com", "path": "/shorts"}
+            )
+
+        assert response.json()["data"]["audio_url"] == f"/audio/{DIGEST}.mp3"
@@ -0,0 +1,140 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+from app import database
+from app.database import get_engine
+from app.services import change_listener as listener_module
+from app.services.change_listener import ChangeListener, apply_change, full_reload
+from app.services.rule_bundle import rule_bundle
+from app.services.rules_cache import rules_snapshot, rules_version
+from tests.conftest import RoundTripCounter
+
+
+@pytest.fixture(autouse=True)
+def _no_version_hint():
+    """The pushed rules version is process-wide; never leak it between tests"""
+    rules_version.reset(None)
+    yield
+    rules_version.reset(None)
+
+
+class TestApplyChange:
+    """Tests for applying individual change notifications"""
+
+    @pytest.mark.asyncio
+    async def test_rule_change_drops_local_snapshots(self, client):
+        """Test that a reminder_rules notification invalidates /rules caches"""
+        await client.get("/rules")
+        await client.get("/rules/bundle")
+        assert rules_snapshot.snapshot is not None and rule_bundle.bundle is not None
+
+        with patch.object(listener_module.shared_cache, "request_publish") as publish:
+            apply_change({"table": "reminder_rules", "op": "INSERT"})
+
+        assert rules_snapshot.snapshot is None
+        assert rule_bundle.bundle is None
+        publish.assert_called_once_with()
+
+    def test_version_only_moves_forward(self):
+        """Test that rules_state notifications never roll the version back"""
+        rules_version.reset(5)
+
+        apply_change({"table": "rules_state", "op": "UPDATE", "version": 7})
+        apply_change({"table": "rules_state", "op": "UPDATE", "version": 6})
+
+        assert rules_version.version == 7
+
+    def test_version_ignored_while_disconnected(self):
+        """Test that a notification cannot install a hint without a full reload"""
+        apply_change({"table": "rules_state", "op": "UPDATE", "version": 3})
+
+        assert rules_version.version is None
+
+    def test_ayah_change_wakes_publisher(self):
+        """Test that reminder_cache notifications schedule a shared cache rebuild"""
+        with patch.object(listener_module.shared_cache, "request_publish") as publish:
+            apply_change({"table": "reminder_cache", "op": "UPDATE", "reference": "2:255"})
+            apply_change({"table": "unknown"})
+
+        publish.assert_called_once_with()
+
+    def test_malformed_payload_ignored(self):
+        """Test that a bad payload is logged instead of killing the listener"""
+        ChangeListener(enabled=True)._on_notify(None, 1, "dhikr_cache_changes", "{not json")
+
+
+class TestVersionHint:
+    """Tests for serving /rules from the pushed rules version"""
+
+    @pytest.mark.asyncio
+    async def test_full_reload_reads_version(self, client):
+        """Test that a reconnect re-reads the version from the database"""
+        with patch.dict("os.environ", {"ADMIN_API_TOKEN": "secret"}):
+            await client.delete("/rules/1", headers={"X-Admin-Token": "secret"})
+
+        with patch.object(listener_module.shared_cache, "request_publish") as publish:
+            await full_reload()
+
+        assert rules_version.version == 1
+        publish.assert_called_once_with(force=True)
+
+    @pytest.mark.asyncio
+    async def test_rules_served_without_version_query(self, client):
+        """Test that a warm /rules needs no query while the hint is set"""
+        await full_reload()
+        await client.get("/rules")
+
+        with RoundTripCounter(get_engine()) as counter:
+            response = await client.get("/rules")
+
+        assert response.headers["x-rules-version"] == "0"
+        assert counter.statements == 0
+
+    @pytest.mark.asyncio
+    async def test_disconnect_clears_hint(self, client):
+        """Test that losing the connection falls back to reading the database"""
+        await full_reload()
+        await client.get("/rules")
+        ChangeListener(enabled=True)._disconnected()
+
+        assert rules_version.version is None
+        with RoundTripCounter(get_engine()) as counter:
+            await client.get("/rules")
+        assert counter.statements == 1
+
+    @pytest.mark.asyncio
+    async def test_replica_reads_its_own_version(self, client):
+        """Test that a hint ahead of a replica session is not trusted for its rows"""
+        primary_read_factory, _ = database._read_session_factory
+        await client.get("/rules")
+        rules_version.reset(5)
+
+        with patch.object(database, "_read_session_factory", (primary_read_factory, primary_read_factory)), \
+                patch.object(database.get_replica_router(), "use_replica", AsyncMock(return_value=True)):
+            rules = await client.get("/rules")
+            bundle = await client.get("/rules/bundle")
+            delta = await client.get("/rules", params={"since_version": 0})
+
+        assert rules.headers["x-rules-version"] == "0"
+        assert bundle.headers["x-rules-version"] == "0"
+        assert delta.json()["data"]["version"] == 0
+        assert rules_snapshot.snapshot.version == 0
+        assert rule_bundle.bundle.version == 0
+
+    @pytest.mark.asyncio
+    async def test_not_started_on_sqlite(self, client):
+        """Test that LISTEN/NOTIFY is only used against Postgres"""
+        listener = ChangeListener(enabled=True)
+        listener.start()
+
+        assert listener._task is None
+
+
+def test_notification_payload_shape():
+    """Test that trigger payloads are plain JSON objects"""
+    payload = json.dumps({"table": "rules_state", "op": "UPDATE", "version": 2})
+    rules_version.reset(1)
+
+    ChangeListener(enabled=True)._on_notify(None, 1, "dhikr_cache_changes", payload)
+
+    assert rules_version.version == 2
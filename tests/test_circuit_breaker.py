@@ -0,0 +1,190 @@
+import httpx
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+from app.services.circuit_breaker import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+)
+from app.services.geo_utils import GEO_BREAKER, get_location_from_ip
+from app.services.quran_service import QURAN_COM_BREAKER, QuranService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    fake = FakeClock()
+    with patch("app.services.circuit_breaker.time.monotonic", fake):
+        yield fake
+
+
+def _breaker(**kwargs) -> CircuitBreaker:
+    return CircuitBreaker("test", **{"max_timeout": 10.0, "min_calls": 4, **kwargs})
+
+
+async def _fail(breaker):
+    with pytest.raises(httpx.ConnectError):
+        async with breaker.guard():
+            raise httpx.ConnectError("down")
+
+
+async def _succeed(breaker, clock, latency=0.1):
+    async with breaker.guard():
+        clock.now += latency
+
+
+class TestCircuitBreaker:
+    """Tests for circuit state transitions and adaptive timeouts"""
+
+    @pytest.mark.asyncio
+    async def test_opens_on_error_rate(self, clock):
+        """Test that enough failures in the window open the circuit"""
+        breaker = _breaker()
+        await _succeed(breaker, clock)
+        await _succeed(breaker, clock)
+        await _fail(breaker)
+        assert breaker.state == CLOSED
+
+        await _fail(breaker)
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+    @pytest.mark.asyncio
+    async def test_opens_on_slow_calls(self, clock):
+        """Test that mostly-slow successful calls also open the circuit"""
+        breaker = _breaker(slow_call_seconds=2.0)
+        for _ in range(4):
+            await _succeed(breaker, clock, latency=3.0)
+
+        assert breaker.state == OPEN
+
+    @pytest.mark.asyncio
+    async def test_client_errors_do_not_count(self, clock):
+        """Test that 4xx responses and bad input leave the circuit closed"""
+        breaker = _breaker()
+        response = httpx.Response(404, request=httpx.Request("GET", "https://x"))
+        for _ in range(4):
+            with pytest.raises(httpx.HTTPStatusError):
+                async with breaker.guard():
+                    response.raise_for_status()
+
+        assert breaker.state == CLOSED
+
+    @pytest.mark.asyncio
+    async def test_half_open_probe_closes(self, clock):
+        """Test that a successful probe after the cool-down closes the circuit"""
+        breaker = _breaker(open_seconds=30.0)
+        for _ in range(4):
+            await _fail(breaker)
+
+        clock.now += 31
+        assert breaker.before_call() == 10.0
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record(True, 0.1)
+        assert breaker.state == CLOSED
+
+    @pytest.mark.asyncio
+    async def test_half_open_probe_failure_reopens(self, clock):
+        """Test that a failed probe reopens the circuit for another cool-down"""
+        breaker = _breaker(open_seconds=30.0)
+        for _ in range(4):
+            await _fail(breaker)
+
+        clock.now += 31
+        await _fail(breaker)
+
+        assert breaker.state == OPEN
+        clock.now += 10
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+    @pytest.mark.asyncio
+    async def test_window_expires_old_calls(self, clock):
+        """Test that failures older than the window are forgotten"""
+        breaker = _breaker(window_seconds=60.0)
+        for _ in range(3):
+            await _fail(breaker)
+
+        clock.now += 61
+        await _fail(breaker)
+        assert breaker.state == CLOSED
+
+    @pytest.mark.asyncio
+    async def test_adaptive_timeout(self, clock):
+        """Test that the timeout follows observed p99 latency within bounds"""
+        breaker = _breaker(min_timeout=0.5)
+        assert breaker.timeout() == 10.0
+
+        for _ in range(4):
+            await _succeed(breaker, clock, latency=0.8)
+        assert breaker.timeout() == pytest.approx(1.6)
+
+        fast = _breaker(min_timeout=0.5)
+        for _ in range(4):
+            await _succeed(fast, clock, latency=0.01)
+        assert fast.timeout() == 0.5
+
+    @pytest.mark.asyncio
+    async def test_snapshot(self, clock):
+        """Test that the diagnostics snapshot reports state and latency"""
+        breaker = _breaker()
+        await _succeed(breaker, clock, latency=0.2)
+        await _fail(breaker)
+
+        snapshot = breaker.snapshot()
+        assert snapshot["state"] == CLOSED
+        assert snapshot["calls"] == 2
+        assert snapshot["error_rate"] == 0.5
+        assert snapshot["p50_ms"] == pytest.approx(200.0)
+
+
+class TestUpstreamRouting:
+    """Tests for breakers on the Quran and geo upstreams"""
+
+    @pytest.mark.asyncio
+    async def test_open_primary_goes_straight_to_fallback(self):
+        """Test that an open Quran.com circuit skips it without waiting"""
+        QURAN_COM_BREAKER.state = OPEN
+        QURAN_COM_BREAKER._opened_at = float("inf")
+        service = QuranService()
+        fallback = {"verse_text": "a", "translations": {}, "audio_url": "", "reference": "1:1"}
+
+        with patch("httpx.AsyncClient") as mock_client, patch.object(
+            service, "_fetch_from_alquran_cloud", AsyncMock(return_value=fallback)
+        ):
+            result = await service._fetch_from_api("1:1")
+
+        assert result == fallback
+        mock_client.return_value.__aenter__.return_value.get.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_open_geo_circuit_returns_unknown(self):
+        """Test that an open ip-api.com circuit answers Unknown without a request"""
+        GEO_BREAKER.state = OPEN
+        GEO_BREAKER._opened_at = float("inf")
+
+        with patch("httpx.AsyncClient") as mock_client:
+            mock_client.return_value.__aenter__.return_value.get = Mock()
+            result = await get_location_from_ip("8.8.8.8")
+
+        assert result["country"] == "Unknown"
+        mock_client.return_value.__aenter__.return_value.get.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_diagnostics_endpoint(self, client):
+        """Test that /health/upstreams lists every breaker"""
+        response = await client.get("/health/upstreams")
+
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert {"quran.com", "alquran.cloud", "ip-api.com"} <= set(data)
+        assert data["quran.com"]["state"] == CLOSED
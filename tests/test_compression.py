@@ -0,0 +1,278 @@
+import gzip
+import brotli
+import httpx
+import pytest
+import zstandard
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from app.utils.compression import CompressResponseMiddleware, DecompressRequestMiddleware
+
+LARGE = {"domains": ["youtube.com"] * 500}
+
+COMPRESS = {
+    "gzip": gzip.compress,
+    "br": brotli.compress,
+    "zstd": zstandard.ZstdCompressor().compress,
+}
+
+
+async def _echo(request: Request):
+    body = await request.body()
+    return JSONResponse({"size": len(body), "encoding": request.headers.get("content-encoding")})
+
+
+async def _large(request: Request):
+    return JSONResponse(LARGE, headers={"ETag": '"v1"'})
+
+
+async def _stream(request: Request):
+    async def chunks():
+        for _ in range(50):
+            yield b"youtube.com,x.com\n" * 20
+    return StreamingResponse(chunks(), media_type="text/csv")
+
+
+async def _audio(request: Request):
+    return Response(b"\xff" * 4096, media_type="audio/mpeg")
+
+
+def _client(max_size: int = 1 << 20) -> httpx.AsyncClient:
+    app = Starlette(routes=[
+        Route("/echo", _echo, methods=["POST"]),
+        Route("/large", _large),
+        Route("/stream", _stream),
+        Route("/audio", _audio),
+    ])
+    app = CompressResponseMiddleware(DecompressRequestMiddleware(app, max_size=max_size))
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+class TestRequestDecompression:
+    """Tests for decoding compressed request bodies"""
+
+    @pytest.mark.asyncio
+    async def test_gzip_body_decoded(self):
+        """Test that handlers see the decoded body without the encoding header"""
+        payload = b'{"domain": "youtube.com"}' * 100
+        async with _client() as client:
+            response = await client.post(
+                "/echo", content=gzip.compress(payload), headers={"Content-Encoding": "gzip"}
+            )
+
+        assert response.json() == {"size": len(payload), "encoding": None}
+
+    @pytest.mark.asyncio
+    async def test_decompression_bomb_rejected(self):
+        """Test that a body expanding past the limit gets 413"""
+        bomb = gzip.compress(b"\x00" * (10 << 20))
+        async with _client(max_size=1 << 20) as client:
+            response = await client.post(
+                "/echo", content=bomb, headers={"Content-Encoding": "gzip"}
+            )
+
+        assert response.status_code == 413
+        assert response.json() == {"detail": f"Decompressed body exceeds {1 << 20} bytes"}
+
+    @pytest.mark.asyncio
+    async def test_rejected_without_exception_handlers(self):
+        """Test that a raw ASGI app reading a bad body still gets a clean 400"""
+        async def raw_app(scope, receive, send):
+            await receive()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"unreachable"})
+
+        app = DecompressRequestMiddleware(raw_app)
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            response = await client.post(
+                "/", content=b"not gzip at all", headers={"Content-Encoding": "gzip"}
+            )
+
+        assert response.status_code == 400
+        assert response.json() == {"detail": "Invalid gzip request body"}
+
+    @pytest.mark.asyncio
+    async def test_app_response_to_failed_read_replaced(self, client):
+        """Test that FastAPI's generic parse error is replaced by the 413"""
+        bomb = gzip.compress(b"\x00" * (40 << 20))
+        response = await client.post(
+            "/analytics/log", content=bomb,
+            headers={"Content-Encoding": "gzip", "Content-Type": "application/json"}
+        )
+
+        assert response.status_code == 413
+        assert response.json()["detail"].startswith("Decompressed body exceeds")
+
+    @pytest.mark.asyncio
+    async def test_truncated_body_rejected(self):
+        """Test that an incomplete gzip stream gets 400"""
+        data = gzip.compress(b"x" * 5000)[:-8]
+        async with _client() as client:
+            response = await client.post("/echo", content=data, headers={"Content-Encoding": "gzip"})
+
+        assert response.status_code == 400
+        assert response.json() == {"detail": "Truncated gzip request body"}
+
+    @pytest.mark.asyncio
+    async def test_corrupt_body_rejected(self):
+        """Test that data that is not gzip gets 400"""
+        async with _client() as client:
+            response = await client.post(
+                "/echo", content=b"not gzip at all", headers={"Content-Encoding": "gzip"}
+            )
+
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("encoding", ["br", "zstd"])
+    async def test_br_and_zstd_bodies_decoded(self, encoding):
+        """Test that brotli and zstd uploads reach handlers decoded"""
+        payload = b'{"domain": "youtube.com"}' * 100
+        async with _client() as client:
+            response = await client.post(
+                "/echo", content=COMPRESS[encoding](payload), headers={"Content-Encoding": encoding}
+            )
+
+        assert response.json() == {"size": len(payload), "encoding": None}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("encoding", ["br", "zstd"])
+    async def test_br_and_zstd_bombs_rejected(self, encoding):
+        """Test that the decompressed size limit applies to every encoding"""
+        bomb = COMPRESS[encoding](b"\x00" * (10 << 20))
+        async with _client(max_size=1 << 20) as client:
+            response = await client.post("/echo", content=bomb, headers={"Content-Encoding": encoding})
+
+        assert response.status_code == 413
+        assert response.json() == {"detail": f"Decompressed body exceeds {1 << 20} bytes"}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("encoding", ["br", "zstd"])
+    async def test_br_and_zstd_truncated_rejected(self, encoding):
+        """Test that an incomplete brotli or zstd stream gets 400"""
+        data = COMPRESS[encoding](bytes(range(256)) * 200)[:-8]
+        async with _client() as client:
+            response = await client.post("/echo", content=data, headers={"Content-Encoding": encoding})
+
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_unknown_encoding_rejected(self):
+        """Test that unsupported encodings get 415"""
+        async with _client() as client:
+            response = await client.post(
+                "/echo", content=b"data", headers={"Content-Encoding": "compress"}
+            )
+
+        assert response.status_code == 415
+
+    @pytest.mark.asyncio
+    async def test_compressed_trigger_log(self, client):
+        """Test that the ingestion routes accept gzip uploads"""
+        body = b'{"domain": "x.com", "category_key": "distraction", "duration_seconds": 5}'
+        response = await client.post(
+            "/log-trigger",
+            content=gzip.compress(body),
+            headers={"Content-Encoding": "gzip", "Content-Type": "application/json"}
+        )
+
+        assert response.status_code == 200
+
+
+class TestResponseCompression:
+    """Tests for negotiated response compression"""
+
+    @pytest.mark.asyncio
+    async def test_large_json_gzipped(self):
+        """Test that large JSON responses are compressed for gzip clients"""
+        async with _client() as client:
+            response = await client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert int(response.headers["content-length"]) < 1000
+        assert response.json() == LARGE
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("accept, expected", [
+        ("br, zstd, gzip", "br"),
+        ("zstd, gzip", "zstd"),
+        ("gzip;q=0.5, zstd", "zstd"),
+        ("br;q=0, gzip", "gzip"),
+    ])
+    async def test_negotiated_encoding(self, accept, expected):
+        """Test that the preferred encoding the client accepts is chosen"""
+        async with _client() as client:
+            response = await client.get("/large", headers={"Accept-Encoding": accept})
+
+        assert response.headers["content-encoding"] == expected
+        assert response.json() == LARGE
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("encoding, decompress", [
+        ("br", brotli.decompress),
+        ("zstd", lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)),
+    ])
+    async def test_br_and_zstd_streamed(self, encoding, decompress):
+        """Test that streamed bodies decode to the original for br and zstd"""
+        async with _client() as client:
+            async with client.stream(
+                "GET", "/stream", headers={"Accept-Encoding": encoding}
+            ) as response:
+                raw = b"".join([chunk async for chunk in response.aiter_raw()])
+
+        assert response.headers["content-encoding"] == encoding
+        assert decompress(raw) == b"youtube.com,x.com\n" * 1000
+
+    @pytest.mark.asyncio
+    async def test_strong_etag_weakened(self):
+        """Test that a compressed representation does not reuse a strong ETag"""
+        async with _client() as client:
+            response = await client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["etag"] == 'W/"v1"'
+
+    @pytest.mark.asyncio
+    async def test_identity_client_uncompressed(self):
+        """Test that clients without compression get the plain body"""
+        async with _client() as client:
+            response = await client.get("/large", headers={"Accept-Encoding": "identity"})
+
+        assert "content-encoding" not in response.headers
+        assert response.headers["etag"] == '"v1"'
+
+    @pytest.mark.asyncio
+    async def test_streaming_response_compressed(self):
+        """Test that streamed bodies are compressed chunk by chunk"""
+        async with _client() as client:
+            response = await client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        assert response.text == "youtube.com,x.com\n" * 1000
+
+    @pytest.mark.asyncio
+    async def test_media_not_recompressed(self):
+        """Test that audio responses are passed through"""
+        async with _client() as client:
+            response = await client.get("/audio", headers={"Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in response.headers
+
+    @pytest.mark.asyncio
+    async def test_tiny_response_skipped(self, client):
+        """Test that /health is below the size threshold"""
+        response = await client.get("/health", headers={"Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in response.headers
+
+    @pytest.mark.asyncio
+    async def test_precompressed_rules_untouched(self, client):
+        """Test that the pre-compressed /rules snapshot is not compressed twice"""
+        response = await client.get("/rules", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json()["message"] == "Found 2 reminder rules"
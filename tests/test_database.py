@@ -0,0 +1,208 @@
+import pytest
+from unittest.mock import patch
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app.database import (
+    ReplicaRouter,
+    SQLITE_MEMORY_URL,
+    _check_dialect,
+    create_engine_for,
+    normalize_database_url,
+    upsert
+)
+from app.models import AnalyticsDaily, ReminderCache
+
+
+class TestNormalizeDatabaseURL:
+    """Tests for database URL normalization"""
+
+    def test_postgres_scheme_rewritten(self):
+        """Test that postgres:// is rewritten to the asyncpg driver"""
+        result = normalize_database_url("postgres://u:p@host/db")
+        assert result == "postgresql+asyncpg://u:p@host/db"
+
+    def test_postgresql_scheme_rewritten(self):
+        """Test that postgresql:// is rewritten to the asyncpg driver"""
+        result = normalize_database_url("postgresql://u:p@host/db")
+        assert result == "postgresql+asyncpg://u:p@host/db"
+
+    def test_sslmode_stripped(self):
+        """Test that sslmode is removed and other params are kept"""
+        result = normalize_database_url("postgresql://u:p@host/db?sslmode=require&foo=bar")
+        assert result == "postgresql+asyncpg://u:p@host/db?foo=bar"
+
+    def test_sslmode_only_param_stripped(self):
+        """Test that a lone sslmode param leaves no trailing '?'"""
+        result = normalize_database_url("postgresql://u:p@host/db?sslmode=require")
+        assert result == "postgresql+asyncpg://u:p@host/db"
+
+    def test_sqlite_scheme_rewritten(self):
+        """Test that sqlite:// is rewritten to the aiosqlite driver"""
+        result = normalize_database_url("sqlite:///./dhikr.db")
+        assert result == "sqlite+aiosqlite:///./dhikr.db"
+
+    def test_aiosqlite_url_unchanged(self):
+        """Test that an explicit aiosqlite URL is left alone"""
+        result = normalize_database_url("sqlite+aiosqlite:////data/dhikr.db")
+        assert result == "sqlite+aiosqlite:////data/dhikr.db"
+
+    @pytest.mark.parametrize("url", ["memory://", "sqlite://", "sqlite:///:memory:"])
+    def test_memory_aliases(self, url):
+        """Test that in-memory aliases select the in-memory SQLite backend"""
+        assert normalize_database_url(url) == SQLITE_MEMORY_URL
+
+
+class TestReplicaRouter:
+    """Tests for read replica routing and fallback"""
+
+    @pytest.mark.asyncio
+    async def test_no_replica_configured(self):
+        """Test that reads stay on the primary without a replica"""
+        router = ReplicaRouter(None, max_lag=5, check_interval=10)
+        assert await router.use_replica() is False
+
+    @pytest.mark.asyncio
+    async def test_healthy_replica_used(self):
+        """Test that a reachable replica within lag tolerance is used"""
+        read_engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        router = ReplicaRouter(read_engine, max_lag=5, check_interval=10)
+
+        assert await router.use_replica() is True
+        assert router.last_lag == 0.0
+        await read_engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_lagging_replica_skipped(self):
+        """Test that a replica behind the lag tolerance is skipped"""
+        read_engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        router = ReplicaRouter(read_engine, max_lag=5, check_interval=10)
+
+        with patch("app.database._replication_lag", return_value=30.0):
+            assert await router.use_replica() is False
+
+        assert router.last_lag == 30.0
+        await read_engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_unreachable_replica_falls_back(self):
+        """Test that connection errors route reads back to the primary"""
+        read_engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        router = ReplicaRouter(read_engine, max_lag=5, check_interval=10)
+
+        with patch("app.database._replication_lag", side_effect=OSError("connection refused")):
+            assert await router.use_replica() is False
+        assert router.last_lag is None
+        await read_engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_check_is_rate_limited(self):
+        """Test that lag is sampled at most once per check interval"""
+        read_engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        router = ReplicaRouter(read_engine, max_lag=5, check_interval=60)
+
+        with patch("app.database._replication_lag", return_value=0.0) as lag:
+            await router.use_replica()
+            await router.use_replica()
+            await router.use_replica()
+
+        assert lag.call_count == 1
+        await read_engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_mark_failed_disables_replica(self):
+        """Test that a failed replica query disables it until the next check"""
+        read_engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        router = ReplicaRouter(read_engine, max_lag=5, check_interval=60)
+
+        assert await router.use_replica() is True
+        router.mark_failed()
+        assert await router.use_replica() is False
+        await read_engine.dispose()
+
+
+class TestSQLiteBackend:
+    """Tests for the SQLite storage backend"""
+
+    @pytest.mark.asyncio
+    async def test_file_database_uses_wal(self, tmp_path):
+        """Test that file-backed SQLite databases are switched to WAL"""
+        file_engine = create_engine_for(f"sqlite+aiosqlite:///{tmp_path}/dhikr.db")
+
+        async with file_engine.connect() as conn:
+            result = await conn.exec_driver_sql("PRAGMA journal_mode")
+            assert result.scalar() == "wal"
+
+        await file_engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_upsert_inserts_then_updates(self, tmp_path):
+        """Test that upsert inserts a new row and updates it on conflict"""
+        file_engine = create_engine_for(f"sqlite+aiosqlite:///{tmp_path}/dhikr.db")
+        async with file_engine.begin() as conn:
+            await conn.run_sync(ReminderCache.__table__.create)
+
+        async with AsyncSession(file_engine) as session:
+            row = {"reference": "1:1", "verse_text": "one"}
+            await session.execute(upsert(session, ReminderCache, row, ["reference"]))
+            await session.execute(upsert(
+                session, ReminderCache, {**row, "verse_text": "two"}, ["reference"]
+            ))
+            await session.commit()
+
+            result = await session.execute(select(ReminderCache))
+            rows = result.scalars().all()
+
+        assert len(rows) == 1
+        assert rows[0].verse_text == "two"
+        await file_engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_upsert_increments(self, tmp_path):
+        """Test that increment columns add to the stored value on conflict"""
+        file_engine = create_engine_for(f"sqlite+aiosqlite:///{tmp_path}/dhikr.db")
+        async with file_engine.begin() as conn:
+            await conn.run_sync(AnalyticsDaily.__table__.create)
+
+        key = ["day", "domain", "url_id", "region"]
+        row = {"day": "2026-01-01", "domain": "x.com", "url_id": "u", "region": "Unknown",
+               "category_key": None, "event_count": 2, "duration_seconds": 60}
+        async with AsyncSession(file_engine) as session:
+            for category in (None, "distraction"):
+                await session.execute(upsert(
+                    session, AnalyticsDaily, {**row, "category_key": category}, key,
+                    increment_columns=["event_count", "duration_seconds"]
+                ))
+            await session.commit()
+
+            stored = (await session.execute(select(AnalyticsDaily))).scalar_one()
+
+        assert (stored.event_count, stored.duration_seconds) == (4, 120)
+        assert stored.category_key == "distraction"
+        await file_engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_upsert_do_nothing(self, tmp_path):
+        """Test that an empty update list keeps the existing row"""
+        file_engine = create_engine_for(f"sqlite+aiosqlite:///{tmp_path}/dhikr.db")
+        async with file_engine.begin() as conn:
+            await conn.run_sync(ReminderCache.__table__.create)
+
+        async with AsyncSession(file_engine) as session:
+            row = {"reference": "1:1", "verse_text": "one"}
+            await session.execute(upsert(session, ReminderCache, row, ["reference"]))
+            await session.execute(upsert(
+                session, ReminderCache, {**row, "verse_text": "two"}, ["reference"], []
+            ))
+            await session.commit()
+
+            result = await session.execute(select(ReminderCache.verse_text))
+
+        assert result.scalar_one() == "one"
+        await file_engine.dispose()
+
+    def test_unsupported_dialect_rejected_at_setup(self):
+        """Test that a database without ON CONFLICT fails at engine setup, not on first upsert"""
+        engine = create_async_engine("postgresql+asyncpg://u:p@localhost/db")
+        with patch.object(engine.dialect, "name", "mssql"):
+            with pytest.raises(ValueError, match="Unsupported database dialect 'mssql'"):
+                _check_dialect(engine)
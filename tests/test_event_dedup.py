@@ -0,0 +1,44 @@
+from unittest.mock import patch
+from app.services.event_dedup import WindowedBloomFilter
+
+
+class TestWindowedBloomFilter:
+    """Tests for the time-windowed Bloom filter in front of the event id index"""
+
+    def test_added_ids_are_found(self):
+        """Test that there are no false negatives inside the window"""
+        seen = WindowedBloomFilter(capacity=1000, window=60)
+        for i in range(1000):
+            seen.add(f"event-{i}")
+
+        assert all(f"event-{i}" in seen for i in range(1000))
+
+    def test_false_positive_rate(self):
+        """Test that unseen ids are rarely reported at capacity"""
+        seen = WindowedBloomFilter(capacity=1000, error_rate=0.01, window=60)
+        for i in range(1000):
+            seen.add(f"event-{i}")
+
+        false_positives = sum(f"other-{i}" in seen for i in range(10000))
+        assert false_positives < 300
+
+    def test_ids_expire_after_two_rotations(self):
+        """Test that an id survives one rotation and is gone after the window"""
+        with patch("app.services.event_dedup.time.monotonic", return_value=0.0) as clock:
+            seen = WindowedBloomFilter(capacity=100, window=60)
+            seen.add("retry")
+
+            clock.return_value = 31.0
+            assert "retry" in seen
+
+            clock.return_value = 62.0
+            assert "retry" not in seen
+
+    def test_idle_window_drops_everything(self):
+        """Test that a full idle window clears both generations at once"""
+        with patch("app.services.event_dedup.time.monotonic", return_value=0.0) as clock:
+            seen = WindowedBloomFilter(capacity=100, window=60)
+            seen.add("retry")
+
+            clock.return_value = 100.0
+            assert "retry" not in seen
@@ -0,0 +1,82 @@
+import pytest
+from app.utils.http_cache import cache_control, choose_encoding, etag_matches, weak_etag
+
+
+class TestEtagMatches:
+    """Tests for If-None-Match comparison"""
+
+    def test_exact_match(self):
+        """Test that an identical ETag matches"""
+        assert etag_matches('"abc"', '"abc"')
+
+    def test_weak_comparison(self):
+        """Test that weak and strong forms of a tag match"""
+        assert etag_matches('W/"abc"', '"abc"')
+        assert etag_matches('"abc"', 'W/"abc"')
+
+    def test_list_of_tags(self):
+        """Test that any tag in a list can match"""
+        assert etag_matches('"x", W/"abc" , "y"', 'W/"abc"')
+
+    def test_wildcard(self):
+        """Test that * matches any ETag"""
+        assert etag_matches("*", '"abc"')
+
+    @pytest.mark.parametrize("header", [None, "", '"abd"', 'W/"ab"'])
+    def test_no_match(self, header):
+        """Test missing and different tags"""
+        assert not etag_matches(header, '"abc"')
+
+
+class TestChooseEncoding:
+    """Tests for Accept-Encoding negotiation"""
+
+    def test_missing_header_is_identity(self):
+        """Test that no header means no compression"""
+        assert choose_encoding(None, ["br", "gzip"]) == "identity"
+
+    def test_server_preference_order(self):
+        """Test that the first available accepted encoding wins"""
+        assert choose_encoding("gzip, br", ["br", "gzip"]) == "br"
+
+    def test_unavailable_encoding_skipped(self):
+        """Test that encodings the server lacks are skipped"""
+        assert choose_encoding("br, gzip", ["gzip"]) == "gzip"
+
+    def test_q_zero_refuses(self):
+        """Test that q=0 refuses an encoding"""
+        assert choose_encoding("br;q=0, gzip", ["br", "gzip"]) == "gzip"
+
+    def test_wildcard(self):
+        """Test that * accepts any encoding"""
+        assert choose_encoding("*", ["gzip"]) == "gzip"
+
+    def test_nothing_acceptable(self):
+        """Test that unsupported encodings fall back to identity"""
+        assert choose_encoding("deflate", ["br", "gzip"]) == "identity"
+
+
+class TestCacheControl:
+    """Tests for Cache-Control values"""
+
+    def test_max_age_and_stale_while_revalidate(self):
+        """Test that both directives are emitted"""
+        assert cache_control(300, 86400) == "public, max-age=300, stale-while-revalidate=86400"
+
+    def test_max_age_only(self):
+        """Test that stale-while-revalidate is omitted when zero"""
+        assert cache_control(60) == "public, max-age=60"
+
+    def test_disabled(self):
+        """Test that zero lifetimes force revalidation"""
+        assert cache_control(0, 0) == "no-cache"
+
+
+class TestWeakEtag:
+    """Tests for hashed weak ETags"""
+
+    def test_stable_and_distinct(self):
+        """Test that equal parts give equal tags and different parts differ"""
+        assert weak_etag("reminder", 1, 2, "en") == weak_etag("reminder", 1, 2, "en")
+        assert weak_etag("reminder", 1, 2, "en") != weak_etag("reminder", 1, 3, "en")
+        assert weak_etag("reminder", 1).startswith('W/"reminder-')
@@ -0,0 +1,75 @@
+import os
+import pytest
+from unittest.mock import patch
+from sqlalchemy import select
+from app.database import get_engine, get_sessionmaker
+from app.models import AnalyticsDomain, AnalyticsEvent
+from app.services import interning
+from app.services.interning import InternCache
+from tests.conftest import RoundTripCounter
+
+
+class TestInternCache:
+    """Tests for dictionary id interning during analytics ingest"""
+
+    @pytest.mark.asyncio
+    async def test_id_cached_after_commit(self, client):
+        """Test that a new value is inserted once and cached once committed"""
+        cache = InternCache(AnalyticsDomain)
+        async with get_sessionmaker()() as session:
+            first = await cache.id_for(session, "example.com")
+            assert cache.get("example.com") is None
+            assert await InternCache(AnalyticsDomain).id_for(session, "example.com") == first
+            await session.commit()
+
+        assert cache.get("example.com") == first
+
+    @pytest.mark.asyncio
+    async def test_rolled_back_id_not_cached(self, client):
+        """Test that ids from a rolled back transaction are forgotten"""
+        cache = InternCache(AnalyticsDomain)
+        async with get_sessionmaker()() as session:
+            await cache.id_for(session, "example.com")
+            await session.rollback()
+
+        assert cache.get("example.com") is None
+
+    def test_oldest_entry_evicted(self):
+        """Test that the cache stays within max_size"""
+        cache = InternCache(AnalyticsDomain, max_size=2)
+        for i, name in enumerate(("a.com", "b.com", "c.com")):
+            cache.remember(name, i)
+
+        assert cache.get("a.com") is None
+        assert (cache.get("b.com"), cache.get("c.com")) == (1, 2)
+
+    @pytest.mark.asyncio
+    async def test_warm_ingest_skips_lookups(self, client):
+        """Test that a repeat visit costs no dictionary queries"""
+        event = {"url": "https://x.com/", "domain": "x.com", "duration_seconds": 60}
+        with patch.dict(os.environ, {"SERVER_HMAC_KEY": "test_key"}):
+            await client.post("/analytics/log", json=event)
+            with RoundTripCounter(get_engine()) as counter:
+                await client.post("/analytics/log", json=event)
+
+        # Rule match, event insert and rollup upsert.
+        assert counter.statements == 3
+        assert interning.domains.get("x.com") is not None
+
+    @pytest.mark.asyncio
+    async def test_event_stored_encoded(self, client):
+        """Test that logged events keep the raw hash and dictionary ids"""
+        with patch.dict(os.environ, {"SERVER_HMAC_KEY": "test_key"}):
+            response = await client.post("/analytics/log", json={
+                "url": "https://x.com/", "domain": "x.com", "duration_seconds": 60
+            })
+
+        async with get_sessionmaker()() as session:
+            row = (await session.execute(
+                select(AnalyticsEvent.url_id, AnalyticsDomain.name)
+                .join(AnalyticsDomain, AnalyticsDomain.id == AnalyticsEvent.domain_id)
+            )).one()
+
+        assert row.url_id == bytes.fromhex(response.json()["data"]["url_id"])
+        assert len(row.url_id) == 32
+        assert row.name == "x.com"
@@ -0,0 +1,165 @@
+import gc
+import os
+import signal
+import socket
+import threading
+import time
+import httpx
+import pytest
+from unittest.mock import AsyncMock, patch
+from app import launcher
+from app.services.rule_bundle import rule_bundle
+from app.services.rules_cache import rules_snapshot
+
+
+class TestPreload:
+    """Tests for warming caches in the master before forking"""
+
+    @pytest.mark.asyncio
+    async def test_warm_caches_builds_rule_caches(self):
+        """Test that the /rules snapshot and bundle exist before any request"""
+        rules_snapshot.invalidate()
+        rule_bundle.invalidate()
+
+        with patch.object(launcher, "dispose_engines", wraps=launcher.dispose_engines) as dispose:
+            await launcher.warm_caches()
+
+        assert rules_snapshot.snapshot.version == 0
+        assert rule_bundle.bundle.version == 0
+        dispose.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_upstream_error_does_not_stop_master(self):
+        """Test that an HTTP error while warming is logged and the boot goes on"""
+        failing = AsyncMock(side_effect=httpx.ConnectError("upstream down"))
+        with patch.object(rule_bundle, "get", failing), \
+                patch.object(launcher, "dispose_engines", wraps=launcher.dispose_engines) as dispose:
+            await launcher.warm_caches()
+
+        failing.assert_awaited_once()
+        dispose.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_schema_behind_stops_master(self):
+        """Test that a schema the code can't run on still fails the boot"""
+        with patch.object(launcher, "ensure_schema", AsyncMock(side_effect=RuntimeError("behind"))):
+            with pytest.raises(RuntimeError):
+                await launcher.warm_caches()
+
+    def test_preload_freezes_heap(self):
+        """Test that preloaded objects are moved out of the collected generations"""
+        try:
+            launcher.preload()
+            assert gc.get_freeze_count() > 0
+        finally:
+            gc.unfreeze()
+
+
+class TestSettings:
+    """Tests for launcher defaults"""
+
+    def test_worker_count_from_env(self):
+        """Test that WEB_CONCURRENCY sets the number of workers"""
+        with patch.dict(os.environ, {"WEB_CONCURRENCY": "3"}):
+            assert launcher.worker_count() == 3
+
+    def test_worker_count_defaults_to_cpus(self):
+        """Test that an unset WEB_CONCURRENCY uses one worker per CPU"""
+        with patch.dict(os.environ, {"WEB_CONCURRENCY": ""}), \
+                patch("os.cpu_count", return_value=6):
+            assert launcher.worker_count() == 6
+
+    def test_fallback_without_uvloop_or_httptools(self):
+        """Test that the stdlib loop and h11 are used when the fast ones are missing"""
+        with patch("importlib.util.find_spec", return_value=None):
+            assert launcher.event_loop() == "asyncio"
+            assert launcher.http_protocol() == "h11"
+
+
+def _stub_worker(app, sock, ready_fd):
+    """Stands in for uvicorn: ready at once, then idle until signalled."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        os.write(ready_fd, b"1")
+    except BrokenPipeError:
+        pass    # Spawned without waiting for readiness, like WorkerServer.
+    os.close(ready_fd)
+    while True:
+        time.sleep(0.05)
+
+
+def _wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def master():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    master = launcher.Master(None, sock, workers=2)
+    handlers = {s: signal.getsignal(s) for s in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP)}
+    with patch.object(launcher, "_run_worker", _stub_worker), \
+            patch.object(launcher, "warm_caches", AsyncMock()), \
+            patch.object(launcher, "GRACEFUL_TIMEOUT", 2):
+        yield master
+        master.shutdown()
+    for signum, handler in handlers.items():
+        signal.signal(signum, handler)
+    sock.close()
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+class TestMaster:
+    """Tests for forking, supervising and reloading workers"""
+
+    def test_crashed_worker_restarted_then_shutdown(self, master):
+        """Test that a killed worker is replaced and SIGTERM stops them all"""
+        seen = {}
+
+        def _drive():
+            _wait_for(lambda: len(master.pids) == 2)
+            seen["first"] = set(master.pids)
+            os.kill(next(iter(seen["first"])), signal.SIGKILL)
+            _wait_for(lambda: len(master.pids) == 2 and master.pids != seen["first"])
+            seen["second"] = set(master.pids)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        driver = threading.Thread(target=_drive)
+        driver.start()
+        master.run()
+        driver.join()
+
+        assert len(seen["first"] & seen["second"]) == 1
+        assert master.pids == set()
+        assert not any(_alive(pid) for pid in seen["first"] | seen["second"])
+
+    def test_rolling_reload_replaces_every_worker(self, master):
+        """Test that a reload re-warms, then swaps each worker for a ready one"""
+        old = {master.spawn(wait_ready=True) for _ in range(2)}
+
+        master.rolling_reload()
+
+        launcher.warm_caches.assert_awaited_once()
+        assert len(master.pids) == 2
+        assert master.pids.isdisjoint(old)
+        assert not any(_alive(pid) for pid in old)
+
+    def test_reload_keeps_worker_whose_replacement_fails(self, master):
+        """Test that a replacement that never becomes ready doesn't shrink the pool"""
+        old = master.spawn(wait_ready=True)
+
+        with patch.object(master, "spawn", return_value=None):
+            master.rolling_reload()
+
+        assert master.pids == {old}
+        assert _alive(old)
@@ -0,0 +1,167 @@
+import pytest
+from app.utils import load_shedding
+from app.utils.load_shedding import (
+    CRITICAL, INGEST, NORMAL, AdaptiveLimiter, RouteLimiters, classify
+)
+
+
+@pytest.fixture
+def saturate():
+    """Fill a route's limiter in the app so only critical requests still fit"""
+    saved = {}
+
+    def _saturate(route: str) -> AdaptiveLimiter:
+        limiter = load_shedding.limiters.get(route)
+        saved[route] = limiter.limit, limiter.inflight
+        limiter.limit, limiter.inflight = 10, 8
+        return limiter
+
+    yield _saturate
+    for route, (limit, inflight) in saved.items():
+        load_shedding.limiters.get(route).limit = limit
+        load_shedding.limiters.get(route).inflight = inflight
+
+
+class TestClassify:
+    """Tests for mapping request paths to priority classes"""
+
+    def test_route_classes(self):
+        """Test that ingestion, reads and admin writes land in their classes"""
+        assert classify("/analytics/log") == ("/analytics/log", INGEST)
+        assert classify("/log-trigger") == ("/log-trigger", INGEST)
+        assert classify("/reminder/batch") == ("/reminder", CRITICAL)
+        assert classify("/rules/import") == ("/rules/import", NORMAL)
+        assert classify("/analytics/summary") == ("other", NORMAL)
+
+    def test_prefix_needs_path_boundary(self):
+        """Test that /reminders is not mistaken for /reminder"""
+        assert classify("/reminders")[1] == NORMAL
+
+
+class TestAdaptiveLimiter:
+    """Tests for AIMD limit changes and priority admission"""
+
+    def test_ingest_shed_before_critical(self):
+        """Test that ingestion only gets half the limit"""
+        limiter = AdaptiveLimiter(initial=10)
+        admitted = [limiter.try_acquire(INGEST) for _ in range(8)]
+
+        assert admitted.count(True) == 5
+        assert limiter.try_acquire(NORMAL) is True
+        assert limiter.try_acquire(CRITICAL) is True
+
+    def test_congestion_decreases_limit(self):
+        """Test that a slow sample under load shrinks the limit"""
+        limiter = AdaptiveLimiter(initial=10)
+        limiter.baseline = 0.01
+        limiter.inflight = 8
+
+        limiter.release(0.5)
+
+        assert limiter.limit == pytest.approx(9)
+
+    def test_failure_decreases_limit(self):
+        """Test that an unhandled error counts as congestion"""
+        limiter = AdaptiveLimiter(initial=10)
+        limiter.inflight = 8
+
+        limiter.release(0.001, failed=True)
+
+        assert limiter.limit < 10
+
+    def test_fast_samples_under_load_increase_limit(self):
+        """Test additive increase while requests finish near their baseline"""
+        limiter = AdaptiveLimiter(initial=10)
+        limiter.inflight = 8
+
+        limiter.release(0.01)
+
+        assert limiter.limit == pytest.approx(10.1)
+
+    def test_idle_limiter_unchanged(self):
+        """Test that slow requests at low concurrency leave the limit alone"""
+        limiter = AdaptiveLimiter(initial=10)
+        limiter.baseline = 0.01
+        limiter.inflight = 1
+
+        limiter.release(2.0)
+
+        assert limiter.limit == 10
+
+    def test_limit_bounds(self):
+        """Test that the limit stays within its minimum and maximum"""
+        limiter = AdaptiveLimiter(initial=4, minimum=4, maximum=4.05)
+        limiter.inflight = 4
+        limiter.release(0.01, failed=True)
+        assert limiter.limit == 4
+
+        limiter.inflight = 4
+        limiter._decreased_at = 0
+        limiter.release(0.01)
+        assert limiter.limit == 4.05
+
+
+class TestRouteLimiters:
+    """Tests for keeping one limiter per route"""
+
+    def test_congestion_stays_on_its_route(self):
+        """Test that a slow route only shrinks its own limit"""
+        limiters = RouteLimiters(initial=10)
+        slow = limiters.get("/analytics/log")
+        slow.baseline = 0.01
+        for _ in range(20):
+            slow.inflight = 8
+            slow._decreased_at = 0
+            slow.release(0.5)
+
+        assert slow.limit == load_shedding.MIN_LIMIT
+        assert limiters.get("/log-trigger").limit == 10
+        assert limiters.get("/analytics/log") is slow
+        assert set(limiters.state()) == {"/analytics/log", "/log-trigger"}
+
+
+class TestMiddleware:
+    """Tests for shedding through the app"""
+
+    @pytest.mark.asyncio
+    async def test_ingestion_shed_with_retry_after(self, client, saturate):
+        """Test that analytics writes get a fast 503 when the limit is tight"""
+        saturate("/log-trigger")
+        response = await client.post("/log-trigger", json={
+            "domain": "x.com", "category_key": "distraction", "duration_seconds": 5
+        })
+
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "2"
+        assert response.json() == {"detail": "Server is overloaded, retry later"}
+
+    @pytest.mark.asyncio
+    async def test_reads_still_served(self, client, saturate):
+        """Test that critical routes keep the remaining headroom"""
+        limiter = saturate("/rules")
+        response = await client.get("/rules")
+
+        assert response.status_code == 200
+        assert limiter.inflight == 8
+
+    @pytest.mark.asyncio
+    async def test_overload_does_not_shed_other_routes(self, client, saturate):
+        """Test that a saturated ingestion route leaves the others admitting"""
+        saturate("/analytics/log")
+
+        shed = await client.post("/analytics/log", json={})
+        other = await client.post("/log-trigger", json={
+            "domain": "x.com", "category_key": "distraction", "duration_seconds": 5
+        })
+
+        assert shed.status_code == 503
+        assert other.status_code != 503
+
+    @pytest.mark.asyncio
+    async def test_shed_counted(self, client, saturate):
+        """Test that shed requests show up in /metrics"""
+        saturate("/log-trigger")
+        await client.post("/log-trigger", json={})
+        body = (await client.get("/metrics")).text
+
+        assert 'dhikr_load_shed_total{priority="ingest"}' in body
@@ -0,0 +1,114 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.utils import metrics
+from app.utils.metrics import Counter, Histogram, render, reset_metrics, span
+
+AYAH = {
+    "verse_text": "وَٱلْعَصْرِ",
+    "translations": {"en": "By time"},
+    "audio_url": "",
+    "reference": "103:1-3"
+}
+
+
+@pytest.fixture(autouse=True)
+def _clean_metrics():
+    reset_metrics()
+    yield
+    reset_metrics()
+
+
+def _sample(text: str, prefix: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{prefix} not found in metrics")
+
+
+class TestMetricTypes:
+    """Tests for the histogram and counter text format"""
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that bucket counts accumulate and +Inf equals the count"""
+        histogram = Histogram("h_seconds", "Test.", ("span",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, "x")
+
+        lines = histogram.collect()
+        assert 'h_seconds_bucket{span="x",le="0.1"} 1' in lines
+        assert 'h_seconds_bucket{span="x",le="1.0"} 2' in lines
+        assert 'h_seconds_bucket{span="x",le="+Inf"} 3' in lines
+        assert 'h_seconds_count{span="x"} 3' in lines
+        assert 'h_seconds_sum{span="x"} 5.55' in lines
+
+    def test_counter_escapes_labels(self):
+        """Test that label values are escaped"""
+        counter = Counter("c_total", "Test.", ("name",))
+        counter.inc('a"b')
+
+        assert 'c_total{name="a\\"b"} 1' in counter.collect()
+
+    def test_span_records_when_sampled(self):
+        """Test that spans are timed only for sampled requests"""
+        with span("work"):
+            pass
+
+        token = metrics._sampled.set(False)
+        try:
+            with span("skipped"):
+                pass
+        finally:
+            metrics._sampled.reset(token)
+
+        text = render().decode()
+        assert 'dhikr_span_duration_seconds_count{span="work"} 1' in text
+        assert 'span="skipped"' not in text
+
+
+class TestMetricsEndpoint:
+    """Tests for request instrumentation and /metrics"""
+
+    @pytest.mark.asyncio
+    async def test_request_latency_by_route_template(self, client):
+        """Test that requests are labelled with the route template, not the raw path"""
+        await client.get("/health")
+        await client.get("/no-such-path")
+
+        response = await client.get("/metrics")
+        text = response.text
+
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert _sample(
+            text,
+            'dhikr_http_request_duration_seconds_count{method="GET",route="/health",status="200"}'
+        ) == 1
+        assert 'route="/no-such-path"' not in text
+        assert 'route="unmatched",status="404"' in text
+
+    @pytest.mark.asyncio
+    async def test_reminder_spans_and_cache_results(self, client):
+        """Test that /reminder records rule match, cache and upstream spans"""
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_quran_com",
+            new_callable=AsyncMock,
+            return_value=AYAH
+        ):
+            params = {"domain": "youtube.com", "path": "/shorts"}
+            await client.get("/reminder", params=params)
+            await client.get("/reminder", params=params)
+
+        text = (await client.get("/metrics")).text
+        for name in ("rule_match", "ayah_cache_lookup", "upstream.quran_com", "db_commit"):
+            assert f'dhikr_span_duration_seconds_count{{span="{name}"}}' in text
+        assert _sample(text, 'dhikr_cache_lookups_total{cache="ayah",result="miss"}') == 1
+        assert _sample(text, 'dhikr_cache_lookups_total{cache="ayah",result="fresh"}') == 1
+
+    @pytest.mark.asyncio
+    async def test_sampling_off_keeps_request_histogram(self, client):
+        """Test that a zero sample rate drops spans but still counts requests"""
+        with patch.object(metrics, "SAMPLE_RATE", 0.0):
+            await client.get("/reminder", params={"domain": "example.com"})
+
+        text = render().decode()
+        assert "dhikr_span_duration_seconds_count" not in text
+        assert 'route="/reminder",status="404"' in text
@@ -0,0 +1,278 @@
+import os
+import subprocess
+import sys
+import warnings
+import pytest
+import pytest_asyncio
+from datetime import date
+from sqlalchemy import inspect, select, text
+from sqlalchemy.exc import IntegrityError, SAWarning
+from app.database import Base, create_engine_for
+from app.migrations import LATEST_VERSION, _v1, current_version, ensure_schema, migrate
+from app.models import AnalyticsDomain, AnalyticsEvent, ReminderCache
+
+
+@pytest_asyncio.fixture
+async def file_engine(tmp_path):
+    engine = create_engine_for(f"sqlite+aiosqlite:///{tmp_path}/dhikr.db")
+    yield engine
+    await engine.dispose()
+
+
+async def _table_names(engine) -> set[str]:
+    async with engine.connect() as conn:
+        return set(await conn.run_sync(lambda c: inspect(c).get_table_names()))
+
+
+class TestMigrations:
+    """Tests for versioned schema migrations"""
+
+    @pytest.mark.asyncio
+    async def test_fresh_database_version_zero(self, file_engine):
+        """Test that an empty database reports version 0"""
+        assert await current_version(file_engine) == 0
+
+    @pytest.mark.asyncio
+    async def test_migrate_fresh_database(self, file_engine):
+        """Test that all migrations apply to an empty database"""
+        applied = await migrate(file_engine)
+
+        assert applied == list(range(1, LATEST_VERSION + 1))
+        assert await current_version(file_engine) == LATEST_VERSION
+        assert {"reminder_rules", "reminder_cache", "analytics_events", "requests_log"} <= (
+            await _table_names(file_engine)
+        )
+
+    @pytest.mark.asyncio
+    async def test_migrate_is_idempotent(self, file_engine):
+        """Test that a second run applies nothing"""
+        await migrate(file_engine)
+        assert await migrate(file_engine) == []
+
+    @pytest.mark.asyncio
+    async def test_migrated_schema_matches_models(self, file_engine, tmp_path):
+        """Test that the frozen migrations build the tables the models describe"""
+        await migrate(file_engine)
+        models_engine = create_engine_for(f"sqlite+aiosqlite:///{tmp_path}/models.db")
+        async with models_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        def _shape(conn):
+            # A unique index and a UNIQUE constraint enforce the same thing;
+            # expression indexes can't be reflected on SQLite.
+            inspector = inspect(conn)
+            shape = {}
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", SAWarning)
+                for name in Base.metadata.tables:
+                    columns = {(c["name"], str(c["type"]), c["nullable"])
+                               for c in inspector.get_columns(name)}
+                    keys = {(tuple(i["column_names"]), bool(i["unique"]))
+                            for i in inspector.get_indexes(name)}
+                    keys |= {(tuple(u["column_names"]), True)
+                             for u in inspector.get_unique_constraints(name)}
+                    shape[name] = columns, keys
+            return shape
+
+        async with file_engine.connect() as conn:
+            migrated = await conn.run_sync(_shape)
+        async with models_engine.connect() as conn:
+            expected = await conn.run_sync(_shape)
+        await models_engine.dispose()
+
+        assert migrated == expected
+
+    @pytest.mark.asyncio
+    async def test_adopts_create_all_schema(self, file_engine):
+        """Test that databases created by create_all() are adopted"""
+        async with file_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        await migrate(file_engine)
+        assert await current_version(file_engine) == LATEST_VERSION
+
+    @pytest.mark.asyncio
+    async def test_rule_versions_added_to_v1_schema(self, file_engine):
+        """Test that existing v1 rules gain version 0 and a rules_state row"""
+        async with file_engine.begin() as conn:
+            await conn.run_sync(_v1.create_all)
+            await conn.execute(text(
+                "INSERT INTO reminder_rules (domain_pattern, category_key, reference) "
+                "VALUES ('youtube.com', 'waste', '103:1-3')"
+            ))
+
+        await migrate(file_engine)
+
+        async with file_engine.connect() as conn:
+            rule_version = (await conn.execute(text("SELECT version FROM reminder_rules"))).scalar()
+            state = (await conn.execute(text("SELECT id, version FROM rules_state"))).all()
+
+        assert rule_version == 0
+        assert state == [(1, 0)]
+
+    @pytest.mark.asyncio
+    async def test_cached_translation_moved_to_english(self, file_engine):
+        """Test that v1 cache rows keep their text as the English translation"""
+        async with file_engine.begin() as conn:
+            await conn.run_sync(_v1.create_all)
+            await conn.execute(text(
+                "INSERT INTO reminder_cache (reference, verse_text, translation, lang) "
+                "VALUES ('103:1-3', 'a', 'By time', 'ur')"
+            ))
+
+        await migrate(file_engine)
+
+        async with file_engine.connect() as conn:
+            row = (await conn.execute(select(ReminderCache.translations))).scalar_one()
+            columns = await conn.run_sync(
+                lambda c: {col["name"] for col in inspect(c).get_columns("reminder_cache")}
+            )
+
+        assert row == {"en": "By time"}
+        assert not {"translation", "lang"} & columns
+
+    @pytest.mark.asyncio
+    async def test_analytics_event_ids_unique(self, file_engine):
+        """Test that v1 analytics rows gain a nullable, unique event_id"""
+        async with file_engine.begin() as conn:
+            await conn.run_sync(_v1.create_all)
+
+        await migrate(file_engine)
+
+        insert = text(
+            "INSERT INTO analytics_events (url_id, domain_id, duration_seconds, day, event_id) "
+            "VALUES (X'00', 1, 1, '2026-01-01', :event_id)"
+        )
+        async with file_engine.begin() as conn:
+            await conn.execute(text("INSERT INTO analytics_domains (id, name) VALUES (1, 'x.com')"))
+            await conn.execute(insert, [{"event_id": None}, {"event_id": None}, {"event_id": "a"}])
+        with pytest.raises(IntegrityError):
+            async with file_engine.begin() as conn:
+                await conn.execute(insert, {"event_id": "a"})
+
+    @pytest.mark.asyncio
+    async def test_duplicate_rules_removed_and_key_unique(self, file_engine):
+        """Test that repeated rule keys keep the oldest rule, tombstone the rest and become unique"""
+        async with file_engine.begin() as conn:
+            await conn.run_sync(_v1.create_all)
+            await conn.execute(text(
+                "INSERT INTO reminder_rules (domain_pattern, path_pattern, category_key, reference) "
+                "VALUES ('x.com', NULL, 'waste', '1:1'), ('x.com', NULL, 'haram', '2:2'), "
+                "('x.com', '/a', 'waste', '1:1')"
+            ))
+
+        await migrate(file_engine)
+
+        async with file_engine.connect() as conn:
+            rules = (await conn.execute(text(
+                "SELECT id, path_pattern FROM reminder_rules ORDER BY id"
+            ))).all()
+            tombstones = (await conn.execute(text(
+                "SELECT t.rule_id, t.version, s.version FROM rule_tombstones t, rules_state s"
+            ))).all()
+
+        assert rules == [(1, None), (3, "/a")]
+        assert tombstones == [(2, 1, 1)]
+        with pytest.raises(IntegrityError):
+            async with file_engine.begin() as conn:
+                await conn.execute(text(
+                    "INSERT INTO reminder_rules (domain_pattern, category_key, reference) "
+                    "VALUES ('x.com', 'waste', '3:3')"
+                ))
+
+    @pytest.mark.asyncio
+    async def test_analytics_events_dictionary_encoded(self, file_engine):
+        """Test that v1 analytics rows are rewritten with dictionary ids, raw url ids and dates"""
+        url_id = "ab" * 32
+        async with file_engine.begin() as conn:
+            await conn.run_sync(_v1.create_all)
+            await conn.execute(text(
+                "INSERT INTO analytics_events (url_id, domain, category_key, duration_seconds, region, day) "
+                "VALUES (:url_id, 'x.com', 'waste', 60, 'Unknown', '2026-01-01'), "
+                "(:url_id, 'x.com', NULL, 30, NULL, '2026-01-02'), "
+                "(:url_id, 'y.com', 'waste', 10, 'Unknown', '2026-01-02')"
+            ), {"url_id": url_id})
+
+        await migrate(file_engine)
+
+        async with file_engine.connect() as conn:
+            rows = (await conn.execute(
+                select(AnalyticsEvent.url_id, AnalyticsDomain.name, AnalyticsEvent.category_id,
+                       AnalyticsEvent.region_id, AnalyticsEvent.day)
+                .join(AnalyticsDomain, AnalyticsDomain.id == AnalyticsEvent.domain_id)
+                .order_by(AnalyticsEvent.id)
+            )).all()
+            categories = (await conn.execute(text("SELECT name FROM analytics_categories"))).all()
+
+        assert [row[1] for row in rows] == ["x.com", "x.com", "y.com"]
+        assert {row.url_id for row in rows} == {bytes.fromhex(url_id)}
+        assert rows[0].category_id == rows[2].category_id and rows[1].category_id is None
+        assert rows[1].region_id is None
+        assert rows[1].day == date(2026, 1, 2)
+        assert categories == [("waste",)]
+
+    @pytest.mark.asyncio
+    async def test_activity_rollup_backfilled(self, file_engine):
+        """Test that existing triggers and visits are rolled up per UTC hour"""
+        async with file_engine.begin() as conn:
+            await conn.run_sync(_v1.create_all)
+            await conn.execute(text(
+                "INSERT INTO requests_log (timestamp, domain, category_key, duration_seconds) "
+                "VALUES ('2026-01-01 10:15:00', 'x.com', 'waste', 30), "
+                "('2026-01-01 10:45:00', 'x.com', 'waste', NULL), "
+                "('2026-01-01 13:30:00+03:00', 'x.com', 'waste', 15)"
+            ))
+            await conn.execute(text(
+                "INSERT INTO analytics_events (timestamp, url_id, domain, category_key, duration_seconds, day) "
+                "VALUES ('2026-01-01 10:05:00', '00', 'x.com', 'waste', 600, '2026-01-01'), "
+                "('2026-01-01 11:05:00', '00', 'y.com', NULL, 60, '2026-01-01')"
+            ))
+
+        await migrate(file_engine)
+
+        async with file_engine.connect() as conn:
+            rows = (await conn.execute(text(
+                "SELECT hour, domain, category_key, trigger_count, trigger_seconds, "
+                "visit_count, visit_seconds FROM activity_hourly ORDER BY hour"
+            ))).all()
+
+        assert rows == [
+            ("2026-01-01T10", "x.com", "waste", 3, 45, 1, 600),
+            ("2026-01-01T11", "y.com", "", 0, 0, 1, 60),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_ensure_schema_migrates_when_allowed(self, file_engine):
+        """Test that boot applies pending migrations with auto-migrate on"""
+        await ensure_schema(file_engine, auto_migrate=True)
+        assert await current_version(file_engine) == LATEST_VERSION
+
+    @pytest.mark.asyncio
+    async def test_ensure_schema_refuses_when_behind(self, file_engine):
+        """Test that boot fails fast on an old schema with auto-migrate off"""
+        with pytest.raises(RuntimeError) as exc_info:
+            await ensure_schema(file_engine, auto_migrate=False)
+
+        assert "python -m app.migrations" in str(exc_info.value)
+
+    @pytest.mark.asyncio
+    async def test_ensure_schema_current_is_noop(self, file_engine):
+        """Test that a current schema passes the check without auto-migrate"""
+        await migrate(file_engine)
+        await ensure_schema(file_engine, auto_migrate=False)
+
+
+class TestLazyDatabase:
+    """Tests for deferred engine construction"""
+
+    def test_import_app_without_database_url(self):
+        """Test that importing the app does not need DATABASE_URL"""
+        env = {k: v for k, v in os.environ.items() if k != "DATABASE_URL"}
+        result = subprocess.run(
+            [sys.executable, "-c", "import app.main, app.database as d; assert d._engine is None"],
+            env=env,
+            capture_output=True,
+            text=True
+        )
+
+        assert result.returncode == 0, result.stderr
@@ -0,0 +1,57 @@
+import json
+import pytest
+from unittest.mock import patch
+from app.utils.responses import FastJSONResponse, StaticJSON, dump_json
+
+PAYLOAD = {
+    "status": "success",
+    "data": {"verse_text": "وَٱلْعَصْرِ", "count": 3, "ratio": 0.5, "path": None, "ok": True}
+}
+
+
+class TestDumpJson:
+    """Tests for compact JSON encoding"""
+
+    def test_round_trip(self):
+        """Test that the output decodes to the same payload"""
+        assert json.loads(dump_json(PAYLOAD)) == PAYLOAD
+
+    def test_compact_utf8(self):
+        """Test that output has no whitespace and unescaped UTF-8"""
+        body = dump_json(PAYLOAD)
+        assert b", " not in body and b": " not in body
+        assert "وَٱلْعَصْرِ".encode("utf-8") in body
+
+    def test_fallback_matches_orjson(self):
+        """Test that the stdlib fallback produces the same bytes"""
+        with patch("app.utils.responses.orjson", None):
+            fallback = dump_json(PAYLOAD)
+        assert fallback == dump_json(PAYLOAD)
+
+
+class TestResponses:
+    """Tests for the JSON response helpers"""
+
+    def test_fast_json_response(self):
+        """Test that FastJSONResponse renders with dump_json"""
+        response = FastJSONResponse(PAYLOAD, headers={"ETag": '"x"'})
+        assert response.body == dump_json(PAYLOAD)
+        assert response.media_type == "application/json"
+        assert response.headers["etag"] == '"x"'
+
+    def test_static_json_encoded_once(self):
+        """Test that every response reuses the pre-encoded body"""
+        static = StaticJSON(PAYLOAD, headers={"Cache-Control": "public, max-age=60"})
+        first, second = static.response(), static.response()
+
+        assert first.body is static.body and second.body is static.body
+        assert first.headers["cache-control"] == "public, max-age=60"
+
+    @pytest.mark.asyncio
+    async def test_static_endpoints_serve_same_bytes(self, client):
+        """Test that static endpoints return identical bodies every time"""
+        for path in ("/", "/health", "/privacy"):
+            first = await client.get(path)
+            second = await client.get(path)
+            assert first.content == second.content
+            assert first.headers["content-type"] == "application/json"
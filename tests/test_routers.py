@@ -0,0 +1,700 @@
+import os
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+from sqlalchemy import select
+from app.database import get_engine, get_sessionmaker
+from app.models import ActivityHourly, AnalyticsDaily, ReminderCache
+from app.services import activity_rollup
+from app.services.event_dedup import seen_events
+from app.services.quran_service import wait_for_refreshes
+from tests.conftest import RoundTripCounter
+
+
+AYAH = {
+    "verse_text": "وَٱلْعَصْرِ",
+    "translations": {"en": "By time", "ur": "زمانے کی قسم"},
+    "audio_url": "https://example.com/103.mp3",
+    "reference": "103:1-3"
+}
+
+
+class TestStaticEndpoints:
+    """Tests for root, health and privacy endpoints"""
+
+    @pytest.mark.asyncio
+    async def test_root(self, client):
+        """Test that the root endpoint lists the API endpoints"""
+        response = await client.get("/")
+        assert response.status_code == 200
+        assert response.json()["status"] == "success"
+        assert response.json()["data"]["endpoints"]
+
+    @pytest.mark.asyncio
+    async def test_health(self, client):
+        """Test that the health endpoint reports healthy"""
+        response = await client.get("/health")
+        assert response.status_code == 200
+        assert response.json()["data"] == {"healthy": True}
+
+    @pytest.mark.asyncio
+    async def test_privacy(self, client):
+        """Test that the privacy policy is served"""
+        response = await client.get("/privacy")
+        assert response.status_code == 200
+        assert response.json()["data"]["policy"] == "Dhikr Extension Privacy Policy"
+        assert "max-age=" in response.headers["cache-control"]
+
+
+class TestRulesRouter:
+    """Tests for the /rules endpoint"""
+
+    @pytest.mark.asyncio
+    async def test_lists_rules(self, client):
+        """Test that all seeded rules are returned"""
+        response = await client.get("/rules")
+        body = response.json()
+
+        assert response.status_code == 200
+        assert body["message"] == "Found 2 reminder rules"
+        assert {r["domain_pattern"] for r in body["data"]} == {"youtube.com", "x.com"}
+
+
+class TestReminderRouter:
+    """Tests for the /reminder endpoint"""
+
+    @pytest.mark.asyncio
+    async def test_path_rule_match(self, client):
+        """Test that a domain/path rule returns its ayah"""
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=AYAH
+        ):
+            response = await client.get(
+                "/reminder", params={"domain": "youtube.com", "path": "/shorts"}
+            )
+
+        data = response.json()["data"]
+        assert response.status_code == 200
+        assert data["category"] == "waste"
+        assert data["reference"] == "103:1-3"
+        assert data["translation"] == "By time"
+
+    @pytest.mark.asyncio
+    async def test_domain_rule_matches_any_path(self, client):
+        """Test that a rule without a path matches every path"""
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value={**AYAH, "reference": "29:45"}
+        ):
+            response = await client.get(
+                "/reminder", params={"domain": "x.com", "path": "/home"}
+            )
+
+        assert response.status_code == 200
+        assert response.json()["data"]["category"] == "distraction"
+
+    @pytest.mark.asyncio
+    async def test_second_request_served_from_cache(self, client):
+        """Test that a fetched ayah is cached for later requests"""
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=AYAH
+        ) as fetch:
+            params = {"domain": "youtube.com", "path": "/shorts"}
+            first = await client.get("/reminder", params=params)
+            second = await client.get("/reminder", params=params)
+
+        assert fetch.call_count == 1
+        assert first.json()["data"] == second.json()["data"]
+
+    @pytest.mark.asyncio
+    async def test_languages_share_one_fetch(self, client):
+        """Test that every configured language is served from one upstream fetch"""
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=AYAH
+        ) as fetch:
+            params = {"domain": "youtube.com", "path": "/shorts"}
+            en = await client.get("/reminder", params={**params, "lang": "en"})
+            ur = await client.get("/reminder", params={**params, "lang": "ur"})
+
+        assert fetch.call_count == 1
+        assert en.json()["data"]["translation"] == "By time"
+        assert ur.json()["data"]["translation"] == AYAH["translations"]["ur"]
+
+    @pytest.mark.asyncio
+    async def test_unknown_lang_falls_back_to_default(self, client):
+        """Test that an unconfigured language gets the default translation"""
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=AYAH
+        ):
+            params = {"domain": "youtube.com", "path": "/shorts"}
+            en = await client.get("/reminder", params=params)
+            other = await client.get("/reminder", params={**params, "lang": "xx"})
+
+        assert other.json()["data"]["translation"] == "By time"
+        assert other.headers["etag"] == en.headers["etag"]
+
+    @pytest.mark.asyncio
+    async def test_no_rule_returns_404(self, client):
+        """Test that an unknown domain returns 404"""
+        response = await client.get("/reminder", params={"domain": "example.com"})
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_upstream_failure_returns_502(self, client):
+        """Test that a cold miss with no upstream returns 502"""
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=None
+        ):
+            response = await client.get(
+                "/reminder", params={"domain": "youtube.com", "path": "/shorts"}
+            )
+
+        assert response.status_code == 502
+
+
+class TestReminderCaching:
+    """Tests for /reminder cache headers and conditional requests"""
+
+    @pytest.mark.asyncio
+    async def test_cache_headers(self, client):
+        """Test that reminders carry ETag, Cache-Control and Vary"""
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=AYAH
+        ):
+            response = await client.get(
+                "/reminder", params={"domain": "youtube.com", "path": "/shorts"}
+            )
+
+        assert response.headers["etag"].startswith('W/"reminder-')
+        assert "stale-while-revalidate=" in response.headers["cache-control"]
+        assert "Accept-Encoding" in response.headers["vary"]
+
+    @pytest.mark.asyncio
+    async def test_not_modified(self, client):
+        """Test that a matching If-None-Match returns an empty 304"""
+        params = {"domain": "youtube.com", "path": "/shorts"}
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=AYAH
+        ):
+            first = await client.get("/reminder", params=params)
+            cached = await client.get("/reminder", params=params)
+            again = await client.get(
+                "/reminder", params=params, headers={"If-None-Match": first.headers["etag"]}
+            )
+
+        assert cached.headers["etag"] == first.headers["etag"]
+        assert again.status_code == 304
+        assert again.content == b""
+        assert again.headers["etag"] == first.headers["etag"]
+
+    @pytest.mark.asyncio
+    async def test_etag_varies_by_lang(self, client):
+        """Test that each language gets its own ETag"""
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=AYAH
+        ):
+            en = await client.get("/reminder", params={"domain": "x.com", "lang": "en"})
+            response = await client.get(
+                "/reminder",
+                params={"domain": "x.com", "lang": "ur"},
+                headers={"If-None-Match": en.headers["etag"]}
+            )
+
+        assert response.status_code == 200
+        assert response.headers["etag"] != en.headers["etag"]
+
+    @pytest.mark.asyncio
+    async def test_rule_change_invalidates(self, client):
+        """Test that updating the matched rule changes the ETag"""
+        params = {"domain": "x.com"}
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value={**AYAH, "reference": "29:45"}
+        ):
+            first = await client.get("/reminder", params=params)
+
+            with patch.dict(os.environ, {"ADMIN_API_TOKEN": "secret"}):
+                await client.post(
+                    "/rules/import",
+                    content=b"x.com,,waste,29:45\n",
+                    headers={"X-Admin-Token": "secret"}
+                )
+
+            second = await client.get(
+                "/reminder", params=params, headers={"If-None-Match": first.headers["etag"]}
+            )
+
+        assert second.status_code == 200
+        assert second.json()["data"]["category"] == "waste"
+
+    @pytest.mark.asyncio
+    async def test_uncached_ayah_has_no_etag(self, client):
+        """Test that an ayah served without a cache entry is not validated"""
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=AYAH
+        ), patch(
+            "app.services.quran_service.QuranService._save_to_cache",
+            new_callable=AsyncMock,
+            return_value=None
+        ):
+            response = await client.get(
+                "/reminder", params={"domain": "youtube.com", "path": "/shorts"}
+            )
+
+        assert response.status_code == 200
+        assert "etag" not in response.headers
+
+
+class TestStaleServing:
+    """Tests for serving aged cache entries around upstream failures"""
+
+    @staticmethod
+    async def _cache(reference, age, translation="Old"):
+        async with get_sessionmaker()() as session:
+            session.add(ReminderCache(
+                reference=reference,
+                verse_text=AYAH["verse_text"],
+                translations={"en": translation},
+                audio_url="",
+                last_fetched=datetime.now(timezone.utc) - age
+            ))
+            await session.commit()
+
+    @pytest.mark.asyncio
+    async def test_stale_entry_served_then_refreshed(self, client):
+        """Test that a stale entry is returned at once and refreshed afterwards"""
+        await self._cache("103:1-3", timedelta(days=10))
+        params = {"domain": "youtube.com", "path": "/shorts"}
+
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=AYAH
+        ) as fetch:
+            stale = await client.get("/reminder", params=params)
+            await wait_for_refreshes()
+            fresh = await client.get("/reminder", params=params)
+
+        assert stale.json()["data"]["translation"] == "Old"
+        assert fresh.json()["data"]["translation"] == "By time"
+        assert fresh.headers["etag"] != stale.headers["etag"]
+        assert fetch.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_expired_entry_refetched(self, client):
+        """Test that an entry past the hard TTL is refetched before serving"""
+        await self._cache("103:1-3", timedelta(days=45))
+
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=AYAH
+        ):
+            response = await client.get(
+                "/reminder", params={"domain": "youtube.com", "path": "/shorts"}
+            )
+
+        assert response.json()["data"]["translation"] == "By time"
+
+    @pytest.mark.asyncio
+    async def test_expired_entry_served_during_outage(self, client):
+        """Test that an upstream outage serves the expired entry instead of 502"""
+        await self._cache("103:1-3", timedelta(days=45))
+
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=None
+        ):
+            response = await client.get(
+                "/reminder", params={"domain": "youtube.com", "path": "/shorts"}
+            )
+
+        assert response.status_code == 200
+        assert response.json()["data"]["translation"] == "Old"
+
+    @pytest.mark.asyncio
+    async def test_batch_outage_serves_cached_copies(self, client):
+        """Test that a batch during an outage only fails truly cold references"""
+        await self._cache("103:1-3", timedelta(days=45))
+
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=None
+        ):
+            response = await client.post("/reminder/batch", json={"pages": [
+                {"domain": "youtube.com", "path": "/shorts"},
+                {"domain": "x.com"}
+            ]})
+
+        results = response.json()["data"]
+        assert [r["status"] for r in results] == ["success", "unavailable"]
+        assert results[0]["data"]["translation"] == "Old"
+
+
+class TestReminderBatchRouter:
+    """Tests for the /reminder/batch endpoint"""
+
+    @staticmethod
+    async def _fetch(reference):
+        return {**AYAH, "reference": reference}
+
+    @pytest.mark.asyncio
+    async def test_results_in_input_order(self, client):
+        """Test that each page gets its own result, in request order"""
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            side_effect=self._fetch
+        ):
+            response = await client.post("/reminder/batch", json={"pages": [
+                {"domain": "x.com", "path": "/home"},
+                {"domain": "example.com"},
+                {"domain": "youtube.com", "path": "/shorts"},
+                {"domain": "youtube.com", "path": "/watch"}
+            ]})
+
+        results = response.json()["data"]
+        assert response.status_code == 200
+        assert response.json()["message"] == "Fetched 2 of 4 reminders"
+        assert [r["status"] for r in results] == ["success", "not_found", "success", "not_found"]
+        assert results[0]["data"]["category"] == "distraction"
+        assert results[0]["data"]["reference"] == "29:45"
+        assert results[2]["domain"] == "youtube.com"
+        assert results[2]["data"]["reference"] == "103:1-3"
+
+    @pytest.mark.asyncio
+    async def test_references_fetched_once(self, client):
+        """Test that repeated references are fetched once and then cached"""
+        pages = {"pages": [{"domain": "x.com", "path": f"/{i}"} for i in range(5)]}
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            side_effect=self._fetch
+        ) as fetch:
+            first = await client.post("/reminder/batch", json=pages)
+            second = await client.post("/reminder/batch", json=pages)
+
+        assert fetch.call_count == 1
+        assert first.json()["data"] == second.json()["data"]
+
+    @pytest.mark.asyncio
+    async def test_upstream_failure_per_item(self, client):
+        """Test that an upstream failure only affects its own items"""
+        async def _fetch(reference):
+            return None if reference == "29:45" else {**AYAH, "reference": reference}
+
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            side_effect=_fetch
+        ):
+            response = await client.post("/reminder/batch", json={"pages": [
+                {"domain": "x.com"},
+                {"domain": "youtube.com", "path": "/shorts"}
+            ]})
+
+        results = response.json()["data"]
+        assert [r["status"] for r in results] == ["unavailable", "success"]
+
+    @pytest.mark.asyncio
+    async def test_batch_size_limits(self, client):
+        """Test that empty and oversized batches are rejected"""
+        empty = await client.post("/reminder/batch", json={"pages": []})
+        oversized = await client.post(
+            "/reminder/batch", json={"pages": [{"domain": "x.com"}] * 51}
+        )
+
+        assert empty.status_code == 422
+        assert oversized.status_code == 422
+
+
+class TestAnalyticsRouter:
+    """Tests for the /analytics endpoints"""
+
+    @pytest.mark.asyncio
+    async def test_log_and_summarize(self, client):
+        """Test that logged events show up in the summary"""
+        with patch.dict(os.environ, {"SERVER_HMAC_KEY": "test_key"}):
+            for seconds in (1800, 1800):
+                response = await client.post("/analytics/log", json={
+                    "url": "https://youtube.com/shorts/abc?email=a@b.com",
+                    "title": "Video",
+                    "domain": "youtube.com",
+                    "path": "/shorts",
+                    "duration_seconds": seconds
+                })
+                assert response.status_code == 200
+                assert response.json()["data"]["category"] == "waste"
+                assert len(response.json()["data"]["url_id"]) == 64
+
+        response = await client.get("/analytics/summary", params={"period": "7d"})
+        assert response.status_code == 200
+        assert response.json()["data"] == {"waste": {"count": 2, "hours": 1.0}}
+
+    @pytest.mark.asyncio
+    async def test_unclassified_site(self, client):
+        """Test that unknown domains are summarized as uncategorized"""
+        with patch.dict(os.environ, {"SERVER_HMAC_KEY": "test_key"}):
+            await client.post("/analytics/log", json={
+                "url": "https://example.com/",
+                "domain": "example.com",
+                "duration_seconds": 360
+            })
+
+        response = await client.get("/analytics/summary")
+        assert response.json()["data"] == {"uncategorized": {"count": 1, "hours": 0.1}}
+
+    @pytest.mark.asyncio
+    async def test_retry_with_event_id_logged_once(self, client):
+        """Test that a retried upload with the same event id is not counted twice"""
+        event = {
+            "url": "https://youtube.com/shorts/abc",
+            "domain": "youtube.com",
+            "path": "/shorts",
+            "duration_seconds": 1800,
+            "event_id": "4f9c2a1e-retry"
+        }
+        with patch.dict(os.environ, {"SERVER_HMAC_KEY": "test_key"}):
+            first = await client.post("/analytics/log", json=event)
+            with patch("app.routers.analytics.get_location_from_ip") as geo:
+                second = await client.post("/analytics/log", json=event)
+
+        assert first.json()["data"]["duplicate"] is False
+        assert second.json()["data"]["duplicate"] is True
+        assert second.json()["data"]["url_id"] == first.json()["data"]["url_id"]
+        geo.assert_not_called()
+
+        response = await client.get("/analytics/summary")
+        assert response.json()["data"] == {"waste": {"count": 1, "hours": 0.5}}
+
+    @pytest.mark.asyncio
+    async def test_duplicate_caught_by_unique_index(self, client):
+        """Test that a retry unknown to this worker's filter is still rejected"""
+        event = {"url": "https://x.com/", "domain": "x.com", "duration_seconds": 60,
+                 "event_id": "other-worker"}
+        with patch.dict(os.environ, {"SERVER_HMAC_KEY": "test_key"}):
+            await client.post("/analytics/log", json=event)
+            seen_events.clear()
+            second = await client.post("/analytics/log", json=event)
+
+        assert second.json()["data"]["duplicate"] is True
+        response = await client.get("/analytics/summary")
+        assert response.json()["data"]["distraction"]["count"] == 1
+
+    @pytest.mark.asyncio
+    async def test_filter_false_positive_still_logged(self, client):
+        """Test that an id the filter wrongly reports as seen is logged"""
+        seen_events.add("never-logged")
+        with patch.dict(os.environ, {"SERVER_HMAC_KEY": "test_key"}):
+            response = await client.post("/analytics/log", json={
+                "url": "https://x.com/", "domain": "x.com", "duration_seconds": 60,
+                "event_id": "never-logged"
+            })
+
+        assert response.json()["data"]["duplicate"] is False
+        summary = await client.get("/analytics/summary")
+        assert summary.json()["data"]["distraction"]["count"] == 1
+
+
+    @pytest.mark.asyncio
+    async def test_aggregates_count_like_events(self, client):
+        """Test that pre-aggregated visits are summarized like individual events"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        url = "https://youtube.com/shorts/abc"
+        with patch.dict(os.environ, {"SERVER_HMAC_KEY": "test_key"}):
+            response = await client.post("/analytics/aggregates", json={"aggregates": [
+                {"day": today, "url": url, "domain": "youtube.com", "path": "/shorts",
+                 "count": 3, "total_seconds": 5400},
+                {"day": today, "url": url, "domain": "youtube.com", "path": "/shorts",
+                 "count": 1, "total_seconds": 1800},
+            ]})
+            await client.post("/analytics/log", json={
+                "url": url, "domain": "youtube.com", "path": "/shorts", "duration_seconds": 1800
+            })
+
+        assert response.status_code == 200
+        assert response.json()["data"] == {"rows": 1, "events": 4, "duplicate": False}
+
+        summary = await client.get("/analytics/summary")
+        assert summary.json()["data"] == {"waste": {"count": 5, "hours": 2.5}}
+
+    @pytest.mark.asyncio
+    async def test_aggregates_merge_into_one_row(self, client):
+        """Test that repeated uploads for the same day and URL add up in place"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        upload = {"aggregates": [{"day": today, "url": "https://x.com/home", "domain": "x.com",
+                                  "count": 2, "total_seconds": 120}]}
+        with patch.dict(os.environ, {"SERVER_HMAC_KEY": "test_key"}):
+            await client.post("/analytics/aggregates", json=upload)
+            await client.post("/analytics/aggregates", json=upload)
+
+        async with get_sessionmaker()() as session:
+            rows = (await session.execute(select(AnalyticsDaily))).scalars().all()
+
+        assert len(rows) == 1
+        assert (rows[0].event_count, rows[0].duration_seconds) == (4, 240)
+        assert rows[0].category_key == "distraction"
+
+    @pytest.mark.asyncio
+    async def test_aggregate_batch_retry_counted_once(self, client):
+        """Test that re-sending an upload with the same batch id adds nothing"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        upload = {"batch_id": "upload-1", "aggregates": [
+            {"day": today, "url": "https://x.com/", "domain": "x.com", "count": 2, "total_seconds": 360}
+        ]}
+        with patch.dict(os.environ, {"SERVER_HMAC_KEY": "test_key"}):
+            await client.post("/analytics/aggregates", json=upload)
+            seen_events.clear()
+            retry = await client.post("/analytics/aggregates", json=upload)
+            again = await client.post("/analytics/aggregates", json=upload)
+
+        assert retry.json()["data"]["duplicate"] is True
+        assert again.json()["data"]["duplicate"] is True
+        summary = await client.get("/analytics/summary")
+        assert summary.json()["data"] == {"distraction": {"count": 2, "hours": 0.1}}
+
+    @pytest.mark.asyncio
+    async def test_aggregates_validated(self, client):
+        """Test that empty uploads and zero counts are rejected"""
+        empty = await client.post("/analytics/aggregates", json={"aggregates": []})
+        zero = await client.post("/analytics/aggregates", json={"aggregates": [
+            {"day": "2026-01-01", "url": "https://x.com/", "domain": "x.com",
+             "count": 0, "total_seconds": 0}
+        ]})
+
+        assert empty.status_code == 422
+        assert zero.status_code == 422
+
+
+class TestTriggerStatsRouter:
+    """Tests for /analytics/triggers and the hourly rollup behind it"""
+
+    async def _trigger(self, client, domain="youtube.com", category_key="waste"):
+        await client.post("/log-trigger", json={
+            "domain": domain, "path": "/shorts", "category_key": category_key,
+            "duration_seconds": 60
+        })
+
+    @pytest.mark.asyncio
+    async def test_ratio_by_category(self, client):
+        """Test that triggers and visits land in one rollup row per category"""
+        with patch.dict(os.environ, {"SERVER_HMAC_KEY": "test_key"}):
+            for _ in range(4):
+                await client.post("/analytics/log", json={
+                    "url": "https://youtube.com/shorts/a", "domain": "youtube.com",
+                    "path": "/shorts", "duration_seconds": 900
+                })
+        await self._trigger(client)
+
+        with RoundTripCounter(get_engine()) as counter:
+            response = await client.get("/analytics/triggers")
+
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["groups"] == [{
+            "category": "waste", "triggers": 1, "visits": 4, "trigger_hours": 0.02,
+            "browsing_hours": 1.0, "trigger_ratio": 0.25
+        }]
+        assert data["totals"]["trigger_ratio"] == 0.25
+        assert counter.statements == 1
+
+        async with get_sessionmaker()() as session:
+            rows = (await session.execute(select(ActivityHourly))).scalars().all()
+        assert len(rows) == 1
+
+    @pytest.mark.asyncio
+    async def test_group_by_domain_limited(self, client):
+        """Test that domains are listed busiest first while totals cover all of them"""
+        for domain in ("a.com", "b.com", "b.com"):
+            await self._trigger(client, domain=domain)
+
+        response = await client.get("/analytics/triggers", params={"group_by": "domain", "limit": 1})
+
+        data = response.json()["data"]
+        assert [g["domain"] for g in data["groups"]] == ["b.com"]
+        assert data["groups"][0]["trigger_ratio"] is None
+        assert data["totals"]["triggers"] == 3
+
+    @pytest.mark.asyncio
+    async def test_group_by_hour(self, client):
+        """Test that aggregates count towards the first hour of their day"""
+        today = datetime.now(timezone.utc).date()
+        yesterday = (today - timedelta(days=1)).isoformat()
+        with patch.dict(os.environ, {"SERVER_HMAC_KEY": "test_key"}):
+            await client.post("/analytics/aggregates", json={"aggregates": [
+                {"day": yesterday, "url": "https://x.com/", "domain": "x.com",
+                 "count": 3, "total_seconds": 60}
+            ]})
+        await self._trigger(client, domain="x.com", category_key="distraction")
+
+        response = await client.get("/analytics/triggers", params={"group_by": "hour"})
+
+        hours = response.json()["data"]["groups"]
+        assert hours[0]["hour"] == f"{yesterday}T00"
+        assert (hours[0]["visits"], hours[0]["triggers"]) == (3, 0)
+        assert hours[-1]["hour"] == datetime.now(timezone.utc).strftime("%Y-%m-%dT%H")
+        assert hours[-1]["triggers"] == 1
+
+    @pytest.mark.asyncio
+    async def test_duplicate_event_not_rolled_up(self, client):
+        """Test that a retried event id adds no browsing to the rollup"""
+        event = {"url": "https://x.com/", "domain": "x.com", "duration_seconds": 60,
+                 "event_id": "rollup-retry"}
+        with patch.dict(os.environ, {"SERVER_HMAC_KEY": "test_key"}):
+            await client.post("/analytics/log", json=event)
+            seen_events.clear()
+            await client.post("/analytics/log", json=event)
+
+        response = await client.get("/analytics/triggers")
+        assert response.json()["data"]["totals"]["visits"] == 1
+
+    def test_hour_bucket_is_utc(self):
+        """Test that a non-UTC timestamp lands in its UTC hour"""
+        moment = datetime(2026, 1, 1, 1, 30, tzinfo=timezone(timedelta(hours=3)))
+
+        assert activity_rollup.hour_bucket(moment) == "2025-12-31T22"
+
+    @pytest.mark.asyncio
+    async def test_invalid_parameters(self, client):
+        """Test that unknown groupings and malformed periods are rejected"""
+        bad_group = await client.get("/analytics/triggers", params={"group_by": "region"})
+        bad_period = await client.get("/analytics/triggers", params={"period": "week"})
+
+        assert bad_group.status_code == 400
+        assert bad_period.status_code == 400
+
+
+class TestTriggerLogRouter:
+    """Tests for the /log-trigger endpoint"""
+
+    @pytest.mark.asyncio
+    async def test_log_trigger(self, client):
+        """Test that trigger events are accepted"""
+        response = await client.post("/log-trigger", json={
+            "domain": "youtube.com",
+            "path": "/shorts",
+            "category_key": "waste",
+            "duration_seconds": 60
+        })
+
+        assert response.status_code == 200
+        assert response.json()["data"] == {"domain": "youtube.com", "category": "waste"}
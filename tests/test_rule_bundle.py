@@ -0,0 +1,195 @@
+import gzip
+import os
+import pytest
+from unittest.mock import patch
+from app.services.rule_bundle import (
+    FLAG_EXACT_PATH,
+    MAGIC,
+    RuleBundle,
+    compile_bundle,
+    fnv1a32
+)
+
+RULES = [
+    {"id": 1, "domain_pattern": "youtube.com", "path_pattern": "/shorts", "category_key": "waste", "reference": "103:1-3"},
+    {"id": 2, "domain_pattern": "youtube.com", "path_pattern": None, "category_key": "distraction", "reference": "29:45"},
+    {"id": 3, "domain_pattern": "m.youtube.com", "path_pattern": "/shorts", "category_key": "waste", "reference": "103:1-3"},
+    {"id": 4, "domain_pattern": "instagram.com", "path_pattern": "/reels", "category_key": "gaze", "reference": "24:30"},
+    {"id": 5, "domain_pattern": "x.com", "path_pattern": None, "category_key": "distraction", "reference": "29:45"},
+    {"id": 6, "domain_pattern": "اختبار.com", "path_pattern": "/مسار", "category_key": "waste", "reference": "2:286"},
+]
+
+
+@pytest.fixture
+def bundle():
+    return RuleBundle(compile_bundle(RULES, rules_version=7))
+
+
+class TestFnv1a:
+    """Tests for the bundle hash function"""
+
+    def test_known_vectors(self):
+        """Test FNV-1a 32-bit reference values"""
+        assert fnv1a32(b"") == 0x811C9DC5
+        assert fnv1a32(b"a") == 0xE40C292C
+        assert fnv1a32(b"foobar") == 0xBF9CF968
+
+
+class TestCompileBundle:
+    """Tests for bundle layout"""
+
+    def test_header(self, bundle):
+        """Test magic, flags, version and counts"""
+        assert bytes(bundle.buffer[:4]) == MAGIC
+        assert bundle.rules_version == 7
+        assert bundle.flags & FLAG_EXACT_PATH
+        assert bundle.rule_count == len(RULES)
+
+    def test_sections_aligned(self, bundle):
+        """Test that fixed-size sections start on 4-byte boundaries"""
+        for offset in (bundle._string_index, bundle._nodes, bundle._rules, bundle._bloom):
+            assert offset % 4 == 0
+
+    def test_deterministic(self):
+        """Test that rule order does not change the bundle bytes"""
+        assert compile_bundle(RULES, 1) == compile_bundle(list(reversed(RULES)), 1)
+
+    def test_compact(self):
+        """Test that 10k rules compile well below their JSON size"""
+        rules = [
+            {"id": i, "domain_pattern": f"site{i}.example.com", "path_pattern": None,
+             "category_key": "waste", "reference": "103:1-3"}
+            for i in range(10000)
+        ]
+        data = compile_bundle(rules, 1)
+        assert len(gzip.compress(data)) < 150_000
+
+    def test_empty_rule_set(self):
+        """Test that an empty rule set compiles and matches nothing"""
+        bundle = RuleBundle(compile_bundle([], 0))
+        assert bundle.match("youtube.com", "/shorts") is None
+
+    def test_rejects_other_data(self):
+        """Test that non-bundle bytes are rejected"""
+        with pytest.raises(ValueError):
+            RuleBundle(b"\x00" * 64)
+
+
+class TestRuleBundleMatch:
+    """Tests for the reference matcher"""
+
+    def test_path_rule_wins(self, bundle):
+        """Test that an exact path rule beats the domain-wide rule"""
+        assert bundle.match("youtube.com", "/shorts")["id"] == 1
+
+    def test_domain_rule_fallback(self, bundle):
+        """Test that other paths fall back to the domain-wide rule"""
+        rule = bundle.match("youtube.com", "/watch")
+        assert rule == {
+            "domain_pattern": "youtube.com",
+            "id": 2,
+            "path_pattern": None,
+            "category_key": "distraction",
+            "reference": "29:45"
+        }
+
+    def test_no_path_uses_domain_rule(self, bundle):
+        """Test that a request without a path only matches domain-wide rules"""
+        assert bundle.match("youtube.com")["id"] == 2
+        assert bundle.match("instagram.com") is None
+
+    def test_paths_match_exactly(self, bundle):
+        """Test that path patterns are not prefixes"""
+        assert bundle.match("instagram.com", "/reels")["id"] == 4
+        assert bundle.match("instagram.com", "/reels/abc") is None
+
+    def test_subdomain_is_separate(self, bundle):
+        """Test that subdomains only match their own rules"""
+        assert bundle.match("m.youtube.com", "/shorts")["id"] == 3
+        assert bundle.match("m.youtube.com", "/watch") is None
+        assert bundle.match("www.x.com") is None
+
+    def test_parent_node_without_rules(self, bundle):
+        """Test that a trie node with no rules of its own does not match"""
+        assert bundle.match("com") is None
+
+    def test_unicode(self, bundle):
+        """Test non-ASCII labels and paths"""
+        assert bundle.match("اختبار.com", "/مسار")["id"] == 6
+
+    def test_bloom_filter(self, bundle):
+        """Test that every rule domain passes the Bloom filter"""
+        for rule in RULES:
+            assert bundle.might_contain(rule["domain_pattern"])
+        misses = sum(bundle.might_contain(f"other{i}.org") for i in range(1000))
+        assert misses < 50
+
+    def test_works_on_memoryview(self):
+        """Test matching against a buffer slice without copying"""
+        data = b"padding!" + compile_bundle(RULES, 1)
+        bundle = RuleBundle(memoryview(data)[8:])
+        assert bundle.match("x.com", "/home")["id"] == 5
+
+
+class TestBundleEndpoint:
+    """Tests for GET /rules/bundle"""
+
+    @pytest.mark.asyncio
+    async def test_serves_bundle(self, client):
+        """Test that the bundle matches the seeded rules"""
+        response = await client.get("/rules/bundle")
+        bundle = RuleBundle(response.content)
+
+        assert response.headers["content-type"] == "application/vnd.dhikr.rule-bundle"
+        assert response.headers["x-rules-version"] == "0"
+        assert bundle.match("youtube.com", "/shorts")["category_key"] == "waste"
+        assert bundle.match("x.com", "/home")["reference"] == "29:45"
+
+    @pytest.mark.asyncio
+    async def test_content_hash_etag(self, client):
+        """Test that the ETag is content-derived and answers 304"""
+        plain = {"Accept-Encoding": "identity"}
+        first = await client.get("/rules/bundle", headers=plain)
+        again = await client.get("/rules/bundle", headers={**plain, "If-None-Match": first.headers["etag"]})
+
+        assert again.status_code == 304
+        assert first.headers["x-bundle-sha256"].startswith(first.headers["etag"].strip('"'))
+
+    @pytest.mark.asyncio
+    async def test_rebuilt_after_rule_change(self, client):
+        """Test that a rule change yields a new version and hash"""
+        first = await client.get("/rules/bundle")
+
+        with patch.dict(os.environ, {"ADMIN_API_TOKEN": "secret"}):
+            await client.post(
+                "/rules/import",
+                content=b"new.com,,waste,1:1\n",
+                headers={"X-Admin-Token": "secret"}
+            )
+
+        second = await client.get("/rules/bundle")
+        assert second.headers["x-rules-version"] == "1"
+        assert second.headers["etag"] != first.headers["etag"]
+        assert RuleBundle(second.content).match("new.com") is not None
+
+    @pytest.mark.asyncio
+    async def test_gzip(self, client):
+        """Test that the bundle is served gzip-compressed on request"""
+        response = await client.get("/rules/bundle", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert RuleBundle(response.content).match("x.com") is not None
+
+    @pytest.mark.asyncio
+    async def test_etag_per_encoding(self, client):
+        """Test that the gzip and plain bodies carry different strong ETags"""
+        plain = await client.get("/rules/bundle", headers={"Accept-Encoding": "identity"})
+        gzipped = await client.get("/rules/bundle", headers={"Accept-Encoding": "gzip"})
+
+        assert gzipped.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+        assert not gzipped.headers["etag"].startswith("W/")
+
+        again = await client.get("/rules/bundle", headers={
+            "Accept-Encoding": "gzip", "If-None-Match": plain.headers["etag"]
+        })
+        assert again.status_code == 304
+        assert again.headers["etag"] == gzipped.headers["etag"]
@@ -0,0 +1,244 @@
+import os
+import pytest
+from unittest.mock import patch
+from sqlalchemy import select
+from app.database import get_sessionmaker
+from app.models import ReminderRule
+from app.services.rule_import import (
+    _write_chunk, import_rules, parse_csv, parse_json, validate_rule
+)
+
+
+async def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def _collect(rows):
+    return [row async for row in rows]
+
+
+async def _all_rules() -> dict:
+    async with get_sessionmaker()() as session:
+        result = await session.execute(select(ReminderRule))
+        return {
+            (r.domain_pattern, r.path_pattern): (r.category_key, r.reference)
+            for r in result.scalars()
+        }
+
+
+class TestValidateRule:
+    """Tests for imported rule validation"""
+
+    def test_normalizes_fields(self):
+        """Test that aliases are mapped and values normalized"""
+        rule = validate_rule({"Domain": " YouTube.com. ", "path": "", "category": "waste", "reference": "103:1-3"})
+        assert rule == {
+            "domain_pattern": "youtube.com",
+            "path_pattern": None,
+            "category_key": "waste",
+            "reference": "103:1-3"
+        }
+
+    def test_defaults_fill_missing_fields(self):
+        """Test that defaults supply category and reference"""
+        rule = validate_rule({"domain": "example.com"}, {"category_key": "haram", "reference": "24:30"})
+        assert rule["category_key"] == "haram"
+        assert rule["reference"] == "24:30"
+
+    @pytest.mark.parametrize("row", [
+        {"domain": "not a domain", "category": "waste", "reference": "1:1"},
+        {"domain": "localhost", "category": "waste", "reference": "1:1"},
+        {"domain": "example.com", "path": "shorts", "category": "waste", "reference": "1:1"},
+        {"domain": "example.com", "category": "", "reference": "1:1"},
+        {"domain": "example.com", "category": "waste", "reference": "chapter one"},
+        {"domain": "example.com", "category": "x" * 51, "reference": "1:1"},
+    ])
+    def test_rejects_invalid_rows(self, row):
+        """Test that malformed rows raise ValueError"""
+        with pytest.raises(ValueError):
+            validate_rule(row)
+
+
+class TestParsers:
+    """Tests for streaming CSV and JSON parsing"""
+
+    @pytest.mark.asyncio
+    async def test_csv_with_header(self):
+        """Test CSV with a header row and comment lines"""
+        data = b"domain,path,category,reference\n# comment\na.com,/x,waste,1:1\nb.com,,gaze,24:30\n"
+        rows = await _collect(parse_csv(_chunks(data, 7)))
+        assert rows == [
+            (3, {"domain": "a.com", "path": "/x", "category": "waste", "reference": "1:1"}),
+            (4, {"domain": "b.com", "path": "", "category": "gaze", "reference": "24:30"}),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_headerless_domain_list(self):
+        """Test that a plain domain-per-line blocklist is read positionally"""
+        rows = await _collect(parse_csv(_chunks(b"a.com\r\nb.com", 1)))
+        assert [row["domain_pattern"] for _, row in rows] == ["a.com", "b.com"]
+
+    @pytest.mark.asyncio
+    async def test_json_array_split_across_chunks(self):
+        """Test that array items split over chunk boundaries decode"""
+        data = b'[{"domain": "a.com"}, {"domain": "b.com", "path": "/x"}]'
+        for size in (1, 5, len(data)):
+            rows = await _collect(parse_json(_chunks(data, size)))
+            assert rows == [(1, {"domain": "a.com"}), (2, {"domain": "b.com", "path": "/x"})]
+
+    @pytest.mark.asyncio
+    async def test_ndjson(self):
+        """Test newline-delimited JSON"""
+        rows = await _collect(parse_json(_chunks(b'{"domain": "a.com"}\n{"domain": "b.com"}\n', 4)))
+        assert [row["domain"] for _, row in rows] == ["a.com", "b.com"]
+
+    @pytest.mark.asyncio
+    async def test_json_non_object_rejected(self):
+        """Test that array items must be objects"""
+        with pytest.raises(ValueError):
+            await _collect(parse_json(_chunks(b'["a.com"]', 4)))
+
+    @pytest.mark.asyncio
+    async def test_truncated_json_rejected(self):
+        """Test that a truncated document raises ValueError"""
+        with pytest.raises(ValueError):
+            await _collect(parse_json(_chunks(b'[{"domain": "a.com"', 4)))
+
+
+class TestImportRules:
+    """Tests for chunked rule import"""
+
+    @pytest.mark.asyncio
+    async def test_inserts_updates_and_dedupes(self, client):
+        """Test new, changed, unchanged, duplicate and invalid rows"""
+        data = (
+            b"domain,path,category,reference\n"
+            b"youtube.com,/shorts,haram,24:30\n"
+            b"x.com,,distraction,29:45\n"
+            b"new.com,,waste,1:1\n"
+            b"new.com,,gaze,2:2\n"
+            b"bad domain,,waste,1:1\n"
+        )
+        async with get_sessionmaker()() as session:
+            stats = await import_rules(session, parse_csv(_chunks(data, 16)))
+
+        assert (stats.rows, stats.inserted, stats.updated) == (5, 1, 1)
+        assert (stats.unchanged, stats.duplicates, stats.invalid) == (1, 1, 1)
+        assert stats.errors == [{"line": 6, "error": "Invalid domain: 'bad domain'"}]
+
+        rules = await _all_rules()
+        assert rules[("youtube.com", "/shorts")] == ("haram", "24:30")
+        assert rules[("new.com", None)] == ("waste", "1:1")
+        assert len(rules) == 3
+
+    @pytest.mark.asyncio
+    async def test_concurrently_added_key_merged(self, client):
+        """Test that a key written after the import read the table is updated, not duplicated"""
+        async with get_sessionmaker()() as session:
+            await _write_chunk(session, [
+                {"domain_pattern": "x.com", "path_pattern": None,
+                 "category_key": "haram", "reference": "24:30"}
+            ], [])
+            result = await session.execute(
+                select(ReminderRule.category_key).where(ReminderRule.domain_pattern == "x.com")
+            )
+
+        assert result.scalars().all() == ["haram"]
+
+    @pytest.mark.asyncio
+    async def test_chunks_report_progress(self, client):
+        """Test that each chunk is written and reported"""
+        data = b"".join(f"site{i}.com\n".encode() for i in range(25))
+        progress = []
+
+        async with get_sessionmaker()() as session:
+            stats = await import_rules(
+                session,
+                parse_csv(_chunks(data, 64)),
+                defaults={"category_key": "waste", "reference": "103:1-3"},
+                chunk_size=10,
+                on_progress=lambda s: progress.append(s.inserted)
+            )
+
+        assert stats.chunks == 3
+        assert progress == [10, 20, 25]
+        assert len(await _all_rules()) == 27
+
+    @pytest.mark.asyncio
+    async def test_dry_run_writes_nothing(self, client):
+        """Test that a dry run validates without writing"""
+        async with get_sessionmaker()() as session:
+            stats = await import_rules(
+                session,
+                parse_csv(_chunks(b"new.com,,waste,1:1\n", 64)),
+                dry_run=True
+            )
+
+        assert stats.inserted == 1
+        assert len(await _all_rules()) == 2
+
+
+class TestImportEndpoint:
+    """Tests for POST /rules/import"""
+
+    @pytest.mark.asyncio
+    async def test_disabled_without_admin_token(self, client):
+        """Test that the admin API is off unless ADMIN_API_TOKEN is set"""
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("ADMIN_API_TOKEN", None)
+            response = await client.post("/rules/import", content=b"a.com,,waste,1:1\n")
+        assert response.status_code == 503
+
+    @pytest.mark.asyncio
+    async def test_rejects_wrong_token(self, client):
+        """Test that a wrong admin token is rejected"""
+        with patch.dict(os.environ, {"ADMIN_API_TOKEN": "secret"}):
+            response = await client.post(
+                "/rules/import",
+                content=b"a.com,,waste,1:1\n",
+                headers={"X-Admin-Token": "wrong"}
+            )
+        assert response.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_csv_import(self, client):
+        """Test a CSV upload with default category and reference"""
+        with patch.dict(os.environ, {"ADMIN_API_TOKEN": "secret"}):
+            response = await client.post(
+                "/rules/import",
+                params={"category_key": "haram", "reference": "24:30"},
+                content=b"a.com\nb.com\na.com\n",
+                headers={"X-Admin-Token": "secret", "Content-Type": "text/csv"}
+            )
+
+        data = response.json()["data"]
+        assert response.status_code == 200
+        assert (data["inserted"], data["duplicates"]) == (2, 1)
+        assert (await _all_rules())[("a.com", None)] == ("haram", "24:30")
+
+    @pytest.mark.asyncio
+    async def test_json_import(self, client):
+        """Test a JSON upload detected from the Content-Type"""
+        with patch.dict(os.environ, {"ADMIN_API_TOKEN": "secret"}):
+            response = await client.post(
+                "/rules/import",
+                content=b'[{"domain": "a.com", "category": "waste", "reference": "1:1"}]',
+                headers={"X-Admin-Token": "secret", "Content-Type": "application/json"}
+            )
+
+        assert response.status_code == 200
+        assert response.json()["data"]["inserted"] == 1
+
+    @pytest.mark.asyncio
+    async def test_malformed_json_returns_400(self, client):
+        """Test that malformed JSON is a client error"""
+        with patch.dict(os.environ, {"ADMIN_API_TOKEN": "secret"}):
+            response = await client.post(
+                "/rules/import",
+                params={"format": "json"},
+                content=b'[{"domain": ',
+                headers={"X-Admin-Token": "secret"}
+            )
+
+        assert response.status_code == 400
@@ -0,0 +1,73 @@
+import pytest
+import pytest_asyncio
+from app.database import get_sessionmaker
+from app.models import ReminderRule
+from app.services.rule_matcher import match_rule, match_rules
+
+
+@pytest_asyncio.fixture
+async def db(client):
+    async with get_sessionmaker()() as session:
+        # The domain-wide rule gets the lower id, so ordering by id alone
+        # would pick it over the path rule.
+        session.add(ReminderRule(
+            domain_pattern="reddit.com", path_pattern=None,
+            category_key="distraction", reference="29:45"
+        ))
+        await session.flush()
+        session.add(ReminderRule(
+            domain_pattern="reddit.com", path_pattern="/r/all",
+            category_key="waste", reference="103:1-3"
+        ))
+        await session.commit()
+        yield session
+
+
+class TestMatchRule:
+    """Tests for single page rule matching"""
+
+    @pytest.mark.asyncio
+    async def test_path_rule_beats_domain_rule(self, db):
+        """Test that an exact path rule wins over the domain-wide rule"""
+        rule = await match_rule(db, "reddit.com", "/r/all")
+        assert rule.category_key == "waste"
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_domain_rule(self, db):
+        """Test that other paths use the domain-wide rule"""
+        rule = await match_rule(db, "reddit.com", "/r/python")
+        assert rule.category_key == "distraction"
+
+    @pytest.mark.asyncio
+    async def test_path_only_rules_need_a_path(self, db):
+        """Test that a domain with only path rules needs a matching path"""
+        assert await match_rule(db, "youtube.com") is None
+        assert await match_rule(db, "youtube.com", "/watch") is None
+        assert (await match_rule(db, "youtube.com", "/shorts")).reference == "103:1-3"
+
+
+class TestMatchRules:
+    """Tests for batched rule matching"""
+
+    @pytest.mark.asyncio
+    async def test_matches_single_lookups(self, db):
+        """Test that batch results equal one-by-one matching, in order"""
+        pages = [
+            ("reddit.com", "/r/all"),
+            ("example.com", None),
+            ("reddit.com", None),
+            ("youtube.com", "/shorts"),
+            ("reddit.com", "/r/python"),
+            ("youtube.com", "/watch"),
+            ("x.com", "/home"),
+        ]
+
+        batch = await match_rules(db, pages)
+        single = [await match_rule(db, domain, path) for domain, path in pages]
+
+        assert [r.id if r else None for r in batch] == [r.id if r else None for r in single]
+
+    @pytest.mark.asyncio
+    async def test_empty(self, db):
+        """Test that no pages means no query and no results"""
+        assert await match_rules(db, []) == []
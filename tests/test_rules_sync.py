@@ -0,0 +1,163 @@
+import gzip
+import json
+import os
+import pytest
+from unittest.mock import patch
+from app.services import rules_cache
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture(autouse=True)
+def admin_token():
+    with patch.dict(os.environ, {"ADMIN_API_TOKEN": "secret"}):
+        yield
+
+
+async def _import(client, body: bytes):
+    response = await client.post("/rules/import", content=body, headers=ADMIN)
+    assert response.status_code == 200
+    return response.json()["data"]
+
+
+class TestRulesSnapshot:
+    """Tests for the cached full /rules response"""
+
+    @pytest.mark.asyncio
+    async def test_etag_and_not_modified(self, client):
+        """Test that a matching If-None-Match returns 304"""
+        first = await client.get("/rules")
+        etag = first.headers["etag"]
+
+        second = await client.get("/rules", headers={"If-None-Match": etag})
+
+        assert first.headers["x-rules-version"] == "0"
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["cache-control"] == first.headers["cache-control"]
+
+    @pytest.mark.asyncio
+    async def test_gzip_snapshot(self, client):
+        """Test that the pre-compressed snapshot is served to gzip clients"""
+        response = await client.get("/rules", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert len(response.json()["data"]) == 2
+
+    @pytest.mark.asyncio
+    async def test_identity_snapshot(self, client):
+        """Test that clients without compression get plain JSON"""
+        response = await client.get("/rules", headers={"Accept-Encoding": "identity"})
+
+        assert "content-encoding" not in response.headers
+        assert response.json()["message"] == "Found 2 reminder rules"
+
+    @pytest.mark.asyncio
+    async def test_snapshot_reused_until_version_changes(self, client):
+        """Test that the snapshot is rebuilt only after a rule change"""
+        await client.get("/rules")
+        snapshot = rules_cache.rules_snapshot.snapshot
+
+        await client.get("/rules")
+        assert rules_cache.rules_snapshot.snapshot is snapshot
+
+        await _import(client, b"new.com,,waste,1:1\n")
+        response = await client.get("/rules")
+
+        assert rules_cache.rules_snapshot.snapshot is not snapshot
+        assert response.headers["x-rules-version"] == "1"
+        assert len(response.json()["data"]) == 3
+
+    @pytest.mark.asyncio
+    async def test_old_etag_is_modified_after_change(self, client):
+        """Test that an ETag from an older version no longer matches"""
+        etag = (await client.get("/rules")).headers["etag"]
+        await _import(client, b"new.com,,waste,1:1\n")
+
+        response = await client.get("/rules", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+
+
+class TestRulesDelta:
+    """Tests for ?since_version= delta sync"""
+
+    @pytest.mark.asyncio
+    async def test_no_changes(self, client):
+        """Test that an up-to-date client gets an empty delta"""
+        response = await client.get("/rules", params={"since_version": 0})
+        assert response.json()["data"] == {"version": 0, "changed": [], "deleted": []}
+
+    @pytest.mark.asyncio
+    async def test_added_and_changed_rules(self, client):
+        """Test that only rules changed after the version are returned"""
+        await _import(client, b"new.com,,waste,1:1\n")
+        await _import(client, b"youtube.com,/shorts,haram,24:30\n")
+
+        response = await client.get("/rules", params={"since_version": 1})
+        data = response.json()["data"]
+
+        assert data["version"] == 2
+        assert [r["domain_pattern"] for r in data["changed"]] == ["youtube.com"]
+        assert data["changed"][0]["category_key"] == "haram"
+
+        response = await client.get("/rules", params={"since_version": 0})
+        assert len(response.json()["data"]["changed"]) == 2
+
+    @pytest.mark.asyncio
+    async def test_deleted_rules(self, client):
+        """Test that deletions are reported as tombstones"""
+        rules = (await client.get("/rules")).json()["data"]
+        rule_id = rules[0]["id"]
+
+        response = await client.delete(f"/rules/{rule_id}", headers=ADMIN)
+        assert response.json()["data"] == {"id": rule_id, "version": 1}
+
+        delta = (await client.get("/rules", params={"since_version": 0})).json()["data"]
+        assert delta == {"version": 1, "changed": [], "deleted": [rule_id]}
+        assert len((await client.get("/rules")).json()["data"]) == 1
+
+    @pytest.mark.asyncio
+    async def test_delete_requires_admin(self, client):
+        """Test that deleting a rule needs the admin token"""
+        response = await client.delete("/rules/1")
+        assert response.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_delete_missing_rule(self, client):
+        """Test that deleting an unknown rule returns 404"""
+        response = await client.delete("/rules/999", headers=ADMIN)
+        assert response.status_code == 404
+
+
+class TestRulesPagination:
+    """Tests for cursor pagination"""
+
+    @pytest.mark.asyncio
+    async def test_walk_pages(self, client):
+        """Test that following next_cursor visits every rule once"""
+        await _import(client, b"a.com,,waste,1:1\nb.com,,waste,1:1\nc.com,,waste,1:1\n")
+
+        seen = []
+        params = {"limit": 2}
+        while True:
+            data = (await client.get("/rules", params=params)).json()["data"]
+            seen.extend(r["id"] for r in data["rules"])
+            if data["next_cursor"] is None:
+                break
+            params = {"limit": 2, "cursor": data["next_cursor"]}
+
+        assert len(seen) == 5
+        assert seen == sorted(set(seen))
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor(self, client):
+        """Test that a garbage cursor is rejected"""
+        response = await client.get("/rules", params={"cursor": "not-a-cursor"})
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_limit_bounds(self, client):
+        """Test that oversized pages are rejected"""
+        response = await client.get("/rules", params={"limit": 100000})
+        assert response.status_code == 422
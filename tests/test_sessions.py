@@ -0,0 +1,133 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.database import get_engine, get_sessionmaker
+from app.models import ReminderCache
+from tests.conftest import RoundTripCounter
+
+
+AYAH = {
+    "verse_text": "وَٱلْعَصْرِ",
+    "translations": {"en": "By time"},
+    "audio_url": "",
+    "reference": "103:1-3"
+}
+
+
+class TestRequestRoundTrips:
+    """Tests for per-request database round trips"""
+
+    @pytest.mark.asyncio
+    async def test_rules_single_statement_no_commit(self, client):
+        """Test that a warm /rules only checks the rules version and never commits"""
+        await client.get("/rules")
+
+        with RoundTripCounter(get_engine()) as counter:
+            response = await client.get("/rules")
+
+        assert response.status_code == 200
+        assert len(response.json()["data"]) == 2
+        assert counter.checkouts == 1
+        assert counter.statements == 1
+        assert counter.commits == 0
+
+    @pytest.mark.asyncio
+    async def test_reminder_cache_hit_skips_write_session(self, client):
+        """Test that a cache hit never checks out a write connection"""
+        async with get_sessionmaker()() as session:
+            session.add(ReminderCache(
+                reference="103:1-3",
+                verse_text=AYAH["verse_text"],
+                translations=AYAH["translations"],
+                audio_url=""
+            ))
+            await session.commit()
+
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock
+        ) as fetch:
+            with RoundTripCounter(get_engine()) as counter:
+                response = await client.get(
+                    "/reminder", params={"domain": "youtube.com", "path": "/shorts"}
+                )
+
+        assert response.status_code == 200
+        assert response.json()["data"]["translation"] == "By time"
+        fetch.assert_not_called()
+        assert counter.checkouts == 1
+        assert counter.statements == 2
+        assert counter.commits == 0
+
+    @pytest.mark.asyncio
+    async def test_reminder_cache_miss_single_write(self, client):
+        """Test that a cache miss saves with one insert and one commit"""
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=AYAH
+        ):
+            with RoundTripCounter(get_engine()) as counter:
+                response = await client.get(
+                    "/reminder", params={"domain": "youtube.com", "path": "/shorts"}
+                )
+
+        assert response.status_code == 200
+        assert counter.statements == 3
+        assert counter.commits == 1
+
+    @pytest.mark.asyncio
+    async def test_trigger_log_single_flush(self, client):
+        """Test that logging a trigger is one insert, one rollup upsert and one commit"""
+        with RoundTripCounter(get_engine()) as counter:
+            response = await client.post("/log-trigger", json={
+                "domain": "youtube.com",
+                "path": "/shorts",
+                "category_key": "waste",
+                "duration_seconds": 60
+            })
+
+        assert response.status_code == 200
+        assert counter.checkouts == 1
+        assert counter.statements == 2
+        assert counter.commits == 1
+
+    @pytest.mark.asyncio
+    async def test_missing_rule_no_write_connection(self, client):
+        """Test that a 404 reminder lookup only touches the read session"""
+        with RoundTripCounter(get_engine()) as counter:
+            response = await client.get("/reminder", params={"domain": "example.com"})
+
+        assert response.status_code == 404
+        assert counter.checkouts == 1
+        assert counter.statements == 1
+        assert counter.commits == 0
+
+    @pytest.mark.asyncio
+    async def test_reminder_batch_cold_round_trips(self, client):
+        """Test that a cold batch is one rule query, one cache query and one upsert"""
+        async def _fetch(reference):
+            return {**AYAH, "reference": reference}
+
+        pages = {"pages": [
+            {"domain": "youtube.com", "path": "/shorts"},
+            {"domain": "x.com", "path": "/home"},
+            {"domain": "x.com", "path": "/explore"},
+            {"domain": "example.com"}
+        ]}
+        with patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            side_effect=_fetch
+        ) as fetch:
+            with RoundTripCounter(get_engine()) as counter:
+                response = await client.post("/reminder/batch", json=pages)
+
+        assert response.status_code == 200
+        assert fetch.call_count == 2
+        assert counter.statements == 3
+        assert counter.commits == 1
+
+        with RoundTripCounter(get_engine()) as counter:
+            response = await client.post("/reminder/batch", json=pages)
+
+        assert counter.statements == 2
+        assert counter.commits == 0
@@ -0,0 +1,153 @@
+import os
+import pytest
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, patch
+from app.database import get_engine
+from app.services.shared_cache import SharedCache, Snapshot, build_snapshot
+from tests.conftest import RoundTripCounter
+
+RULES = [
+    {"id": 1, "domain_pattern": "youtube.com", "path_pattern": "/shorts",
+     "category_key": "waste", "reference": "103:1-3"},
+    {"id": 2, "domain_pattern": "x.com", "path_pattern": None,
+     "category_key": "distraction", "reference": "29:45"},
+]
+
+AYAH = {
+    "verse_text": "وَٱلْعَصْرِ",
+    "translations": {"en": "By time"},
+    "audio_url": "",
+    "reference": "103:1-3"
+}
+
+
+@pytest.fixture
+def shared_dir(tmp_path):
+    return str(tmp_path / "shm")
+
+
+@contextmanager
+def _use(cache):
+    with patch("app.services.rule_matcher.shared_cache", cache), \
+            patch("app.services.quran_service.shared_cache", cache):
+        yield cache
+
+
+class TestSnapshotFormat:
+    """Tests for building and reading snapshot buffers"""
+
+    def test_rule_and_ayah_lookup(self):
+        """Test that rules and ayahs are read back from the buffer"""
+        fetched = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        snapshot = Snapshot(build_snapshot(3, 7, RULES, {
+            "103:1-3": {**AYAH, "last_fetched": fetched.isoformat()},
+            "2:255": {**AYAH, "reference": "2:255", "last_fetched": None}
+        }))
+
+        assert snapshot.generation == 3
+        rule = snapshot.match_rule("youtube.com", "/shorts")
+        assert (rule.id, rule.category_key, rule.version) == (1, "waste", 7)
+        assert snapshot.match_rule("x.com", "/home").reference == "29:45"
+        assert snapshot.match_rule("youtube.com", "/watch") is None
+
+        entry, last_fetched = snapshot.ayah("103:1-3")
+        assert entry == AYAH
+        assert last_fetched == fetched
+        assert snapshot.ayah("2:255")[1] is None
+        assert snapshot.ayah("1:1") is None
+
+    def test_rejects_other_buffers(self):
+        """Test that a buffer without the snapshot magic is refused"""
+        with pytest.raises(ValueError):
+            Snapshot(b"\x00" * 64)
+
+
+class TestSharedCache:
+    """Tests for publishing and swapping snapshots between processes"""
+
+    def test_disabled_without_directory(self):
+        """Test that no directory means no snapshot"""
+        assert SharedCache(None).snapshot() is None
+
+    def test_unpublished_directory_has_no_snapshot(self, shared_dir):
+        """Test that readers fall back until something is published"""
+        assert SharedCache(shared_dir).snapshot() is None
+
+    def test_readers_follow_generation(self, shared_dir):
+        """Test that a reader remaps when the publisher bumps the generation"""
+        publisher, reader = SharedCache(shared_dir), SharedCache(shared_dir)
+
+        assert publisher.publish(1, RULES, {}) == 1
+        assert reader.snapshot().match_rule("x.com").category_key == "distraction"
+
+        publisher.publish(2, RULES[:1], {})
+        assert reader.snapshot().generation == 2
+        assert reader.snapshot().match_rule("x.com") is None
+
+    def test_old_generations_removed(self, shared_dir):
+        """Test that only the current and previous snapshot files are kept"""
+        publisher = SharedCache(shared_dir)
+        for version in range(4):
+            publisher.publish(version, RULES, {})
+
+        files = sorted(f for f in os.listdir(shared_dir) if f.startswith("snapshot-"))
+        assert files == ["snapshot-3.bin", "snapshot-4.bin"]
+
+    def test_single_publisher(self, shared_dir):
+        """Test that only one process holds the publisher lock"""
+        first, second = SharedCache(shared_dir), SharedCache(shared_dir)
+
+        assert first.try_become_publisher()
+        assert not second.try_become_publisher()
+
+
+class TestSharedCacheServing:
+    """Tests for serving /reminder from a published snapshot"""
+
+    @pytest.mark.asyncio
+    async def test_publish_from_db_skips_unchanged(self, client, shared_dir):
+        """Test that the publisher only rebuilds when the database changed"""
+        cache = SharedCache(shared_dir)
+
+        assert await cache.publish_from_db() == 1
+        assert await cache.publish_from_db() is None
+        assert cache.snapshot().match_rule("youtube.com", "/shorts").reference == "103:1-3"
+
+    @pytest.mark.asyncio
+    async def test_reminder_served_without_database(self, client, shared_dir):
+        """Test that a rule and ayah in the snapshot need no database round trip"""
+        cache = SharedCache(shared_dir)
+        with _use(cache), patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value=AYAH
+        ) as fetch:
+            params = {"domain": "youtube.com", "path": "/shorts"}
+            await client.get("/reminder", params=params)
+            await cache.publish_from_db()
+
+            with RoundTripCounter(get_engine()) as counter:
+                response = await client.get("/reminder", params=params)
+
+        assert response.status_code == 200
+        assert response.json()["data"]["translation"] == "By time"
+        assert fetch.call_count == 1
+        assert counter.statements == 0
+
+    @pytest.mark.asyncio
+    async def test_missing_ayah_falls_back_to_database(self, client, shared_dir):
+        """Test that ayahs cached after the snapshot are still found"""
+        cache = SharedCache(shared_dir)
+        await cache.publish_from_db()
+
+        with _use(cache), patch(
+            "app.services.quran_service.QuranService._fetch_from_api",
+            new_callable=AsyncMock,
+            return_value={**AYAH, "reference": "29:45"}
+        ) as fetch:
+            first = await client.post("/reminder/batch", json={"pages": [{"domain": "x.com"}]})
+            second = await client.post("/reminder/batch", json={"pages": [{"domain": "x.com"}]})
+
+        assert fetch.call_count == 1
+        assert first.json()["data"] == second.json()["data"]